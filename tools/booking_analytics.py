@@ -0,0 +1,322 @@
+import os
+import csv
+import json
+import time
+import argparse
+from datetime import date, datetime, timedelta
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+from seed_demo_data import connect
+from tracing import add_trace_args, span, start_from_args
+
+# Booking.Status values (Models/Catalog.cs); code 0 is anything else
+STATUSES = ["Confirmed", "CheckedIn", "CheckedOut", "Cancelled"]
+EPOCH = date(1970, 1, 1)
+
+# Every column is made NOT NULL and fixed width in SQL so each binary COPY row has the same size
+COPY_SQL = """
+COPY (
+  SELECT "TenantId",
+         "CheckinDate" - DATE '1970-01-01',
+         GREATEST("CheckoutDate", "CheckinDate" + 1) - DATE '1970-01-01',
+         COALESCE(array_position(%(statuses)s::text[], "Status"), 0),
+         COALESCE(array_position(%(sources)s::text[], "Source"), 0),
+         COALESCE("RoomRate", "TotalRevenue" / NULLIF(GREATEST("CheckoutDate" - "CheckinDate", 1), 0), 0)::float8
+  FROM public."Bookings"
+  WHERE "TenantId" = ANY(%(tenants)s) AND "CheckoutDate" > %(start)s AND "CheckinDate" < %(end)s
+) TO STDOUT WITH (FORMAT binary)
+"""
+
+
+def row_dtype():
+    fields = [("nfields", ">i2")]
+    for name, kind in (("tenant", ">i4"), ("checkin", ">i4"), ("checkout", ">i4"), ("status", ">i4"), ("source", ">i4"), ("rate", ">f8")):
+        fields += [(name + "_len", ">i4"), (name, kind)]
+    return np.dtype(fields)
+
+
+class BinaryRows:
+    """File-like sink for COPY ... TO STDOUT (FORMAT binary) that decodes fixed-width rows into compact arrays as they stream in."""
+
+    def __init__(self, flush_bytes=8 << 20):
+        self.dtype = row_dtype()
+        self.buf = bytearray()
+        self.header = False
+        self.flush_bytes = flush_bytes
+        self.parts = {k: [] for k in ("tenant", "checkin", "checkout", "status", "source", "rate")}
+        self.rows = 0
+
+    def write(self, data):
+        self.buf += data
+        if len(self.buf) >= self.flush_bytes:
+            self.decode()
+
+    def decode(self):
+        if not self.header:
+            if len(self.buf) < 19:
+                return
+            ext = int.from_bytes(self.buf[15:19], "big")
+            del self.buf[:19 + ext]
+            self.header = True
+        n = len(self.buf) // self.dtype.itemsize
+        if not n:
+            return
+        rows = np.frombuffer(bytes(self.buf[:n * self.dtype.itemsize]), self.dtype)
+        del self.buf[:n * self.dtype.itemsize]
+        if (rows["nfields"] != 6).any():
+            raise ValueError("unexpected field count in COPY stream")
+        self.parts["tenant"].append(rows["tenant"].astype(np.int32))
+        self.parts["checkin"].append(rows["checkin"].astype(np.int32))
+        self.parts["checkout"].append(rows["checkout"].astype(np.int32))
+        self.parts["status"].append(rows["status"].astype(np.int8))
+        self.parts["source"].append(rows["source"].astype(np.int16))
+        self.parts["rate"].append(rows["rate"].astype(np.float64))
+        self.rows += n
+
+    def arrays(self):
+        self.decode()
+        # Only the 2-byte trailer may remain
+        if len(self.buf) > 2:
+            raise ValueError(f"{len(self.buf)} undecoded bytes left in COPY stream")
+        return {k: (np.concatenate(v) if v else np.zeros(0, dtype=np.int32)) for k, v in self.parts.items()}
+
+
+def load_bookings(conn, tenants, start, end):
+    with conn.cursor() as cur:
+        cur.execute('SELECT DISTINCT "Source" FROM public."Bookings" WHERE "TenantId" = ANY(%s) ORDER BY 1', [tenants])
+        sources = [r[0] for r in cur.fetchall() if r[0] is not None]
+        sql = cur.mogrify(COPY_SQL, {"statuses": STATUSES, "sources": sources, "tenants": tenants, "start": start, "end": end}).decode()
+        sink = BinaryRows()
+        cur.copy_expert(sql, sink)
+    conn.rollback()
+    return sink.arrays(), ["(other)"] + sources
+
+
+def room_counts(conn, tenants, default_rooms):
+    """Sellable rooms per tenant the way GetHotelPerformance does: HotelInfos.NumberOfRooms, else distinct RoomNumbers."""
+    with conn.cursor() as cur:
+        cur.execute(
+            'SELECT t, COALESCE((SELECT h."NumberOfRooms" FROM public."HotelInfos" h WHERE h."TenantId" = t ORDER BY h."Id" LIMIT 1), '
+            '(SELECT NULLIF(count(DISTINCT b."RoomNumber"), 0) FROM public."Bookings" b WHERE b."TenantId" = t AND COALESCE(b."RoomNumber", \'\') <> \'\'), %s) '
+            'FROM unnest(%s::int[]) t', [default_rooms, tenants])
+        out = {r[0]: r[1] for r in cur.fetchall()}
+    conn.rollback()
+    return out
+
+
+def status_mask(status, statuses):
+    codes = [STATUSES.index(s) + 1 for s in statuses]
+    return np.isin(status, codes)
+
+
+def rollup(b, tenants, rooms, start, days, statuses, n_sources):
+    """Daily per-tenant series over [start, start+days) in a handful of bincounts.
+
+    Each stay adds +1 (and +rate) at its first night and -1 (-rate) at checkout; a cumulative sum
+    along the day axis turns those edges into occupied rooms and room revenue for every night.
+    """
+    keep = status_mask(b["status"], statuses)
+    t_index = {t: i for i, t in enumerate(tenants)}
+    lookup = np.full(max(tenants) + 1, -1, dtype=np.int64)
+    lookup[list(t_index)] = list(t_index.values())
+    tid = lookup[b["tenant"][keep]]
+    s0 = (start - EPOCH).days
+    ci = b["checkin"][keep].astype(np.int64) - s0
+    co = b["checkout"][keep].astype(np.int64) - s0
+    rate = b["rate"][keep]
+    width = days + 1
+    size = len(tenants) * width
+    lo = tid * width + np.clip(ci, 0, days)
+    hi = tid * width + np.clip(co, 0, days)
+
+    edges = np.bincount(lo, minlength=size) - np.bincount(hi, minlength=size)
+    occupied = np.cumsum(edges.reshape(len(tenants), width), axis=1)[:, :days]
+    money = np.bincount(lo, weights=rate, minlength=size) - np.bincount(hi, weights=rate, minlength=size)
+    revenue = np.cumsum(money.reshape(len(tenants), width), axis=1)[:, :days]
+
+    def per_day(day):
+        inside = (day >= 0) & (day < days)
+        return np.bincount(tid[inside] * days + day[inside], minlength=len(tenants) * days).reshape(len(tenants), days)
+
+    nights = np.clip(co, 0, days) - np.clip(ci, 0, days)
+    mix = np.bincount(tid * n_sources + b["source"][keep], weights=nights, minlength=len(tenants) * n_sources).reshape(len(tenants), n_sources)
+    capacity = np.array([rooms.get(t) or 0 for t in tenants], dtype=np.float64)[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        occupancy = np.where(capacity > 0, occupied / capacity, np.nan)
+        adr = np.where(occupied > 0, revenue / occupied, 0.0)
+        revpar = np.where(capacity > 0, revenue / capacity, np.nan)
+    return {"occupied": occupied, "revenue": revenue, "arrivals": per_day(ci), "departures": per_day(co),
+            "occupancy": occupancy, "adr": adr, "revpar": revpar, "capacity": capacity[:, 0], "source_nights": mix}
+
+
+def verify(conn, result, tenants, start, days, statuses, samples, seed):
+    """Recompute occupied rooms and room revenue in SQL for sampled nights and compare with the arrays.
+
+    There is nothing precomputed to check against: AnalyticsRollupWorker only rolls up UsageDaily
+    (message and token counts), and no table holds occupancy or revenue."""
+    rng = np.random.default_rng(seed)
+    picks = sorted(set(rng.integers(0, days, size=min(samples, days)).tolist()))
+    mismatches = 0
+    with conn.cursor() as cur:
+        for d in picks:
+            night = start + timedelta(days=int(d))
+            cur.execute(
+                'SELECT "TenantId", count(*), COALESCE(sum(COALESCE("RoomRate", "TotalRevenue" / NULLIF(GREATEST("CheckoutDate" - "CheckinDate", 1), 0), 0)), 0) '
+                'FROM public."Bookings" WHERE "TenantId" = ANY(%s) AND "Status" = ANY(%s) '
+                'AND "CheckinDate" <= %s AND GREATEST("CheckoutDate", "CheckinDate" + 1) > %s GROUP BY 1',
+                [tenants, list(statuses), night, night])
+            sql = {r[0]: (r[1], float(r[2])) for r in cur.fetchall()}
+            for i, t in enumerate(tenants):
+                count, money = sql.get(t, (0, 0.0))
+                if count != result["occupied"][i, d] or abs(money - result["revenue"][i, d]) > 0.01 * max(1.0, abs(money)):
+                    mismatches += 1
+                    print(f"  MISMATCH tenant {t} {night}: sql rooms={count} revenue={money:.2f}, "
+                          f"engine rooms={result['occupied'][i, d]} revenue={result['revenue'][i, d]:.2f}")
+    conn.rollback()
+    print(f"Verified {len(picks)} sampled nights x {len(tenants)} tenants against SQL: {mismatches} mismatches")
+    return mismatches
+
+
+def api_today(conn, result, tenants, start, days):
+    """Occupancy as GetHotelPerformance reports it today (CheckedIn only) beside the engine's CheckedIn-only figure."""
+    today = datetime.utcnow().date()
+    d = (today - start).days
+    if not 0 <= d < days:
+        return
+    with conn.cursor() as cur:
+        cur.execute('SELECT "TenantId", count(*) FROM public."Bookings" WHERE "TenantId" = ANY(%s) AND "CheckinDate" <= %s '
+                    'AND "CheckoutDate" > %s AND "Status" = %s GROUP BY 1', [tenants, today, today, "CheckedIn"])
+        api = dict(cur.fetchall())
+    conn.rollback()
+    print(f"Today ({today}), CheckedIn only, as /api/analytics/hotel-performance computes it:")
+    for i, t in enumerate(tenants):
+        print(f"  tenant {t}: api {api.get(t, 0)} rooms, engine {result['occupied'][i, d]} rooms of {result['capacity'][i]:.0f}")
+
+
+def synthetic(n, tenants, start, days, seed):
+    rng = np.random.default_rng(seed)
+    checkin = (start - EPOCH).days + rng.integers(-14, days, size=n).astype(np.int32)
+    return {
+        "tenant": rng.choice(np.array(tenants, dtype=np.int32), size=n),
+        "checkin": checkin,
+        "checkout": checkin + np.minimum(rng.geometric(0.35, size=n), 21).astype(np.int32),
+        "status": rng.choice(np.array([1, 2, 3, 4], dtype=np.int8), size=n, p=[0.2, 0.1, 0.62, 0.08]),
+        "source": rng.integers(0, 4, size=n).astype(np.int16),
+        "rate": rng.normal(1500, 300, size=n).clip(300),
+    }
+
+
+def print_summary(result, tenants, sources, start, days):
+    print(f"{'tenant':>8} {'rooms':>6} {'occ%':>6} {'ADR':>10} {'RevPAR':>10} {'room nights':>12} {'revenue':>14} {'peak night':>12}")
+    for i, t in enumerate(tenants):
+        nights = int(result["occupied"][i].sum())
+        revenue = float(result["revenue"][i].sum())
+        cap = result["capacity"][i]
+        occ = 100.0 * nights / (cap * days) if cap else float("nan")
+        adr = revenue / nights if nights else 0.0
+        revpar = revenue / (cap * days) if cap else float("nan")
+        peak = start + timedelta(days=int(result["occupied"][i].argmax()))
+        print(f"{t:>8} {cap:>6.0f} {occ:>6.1f} {adr:>10.2f} {revpar:>10.2f} {nights:>12} {revenue:>14.2f} {peak.isoformat():>12}")
+        mix = result["source_nights"][i]
+        if mix.sum():
+            print("         mix: " + ", ".join(f"{sources[k]} {100 * mix[k] / mix.sum():.0f}%" for k in np.argsort(-mix) if mix[k]))
+
+
+def write_csv(path, result, tenants, start, days):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["TenantId", "Date", "RoomsAvailable", "RoomsOccupied", "Arrivals", "Departures", "RoomRevenue", "Occupancy", "ADR", "RevPAR"])
+        for i, t in enumerate(tenants):
+            for d in range(days):
+                w.writerow([t, (start + timedelta(days=d)).isoformat(), int(result["capacity"][i]), int(result["occupied"][i, d]),
+                            int(result["arrivals"][i, d]), int(result["departures"][i, d]), round(float(result["revenue"][i, d]), 2),
+                            round(float(result["occupancy"][i, d]), 4), round(float(result["adr"][i, d]), 2), round(float(result["revpar"][i, d]), 2)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorised daily occupancy, arrivals/departures, ADR and RevPAR from Bookings")
+    parser.add_argument("--conn", default=os.environ.get("STAYBOT_CONN"), help="PostgreSQL connection string (or set STAYBOT_CONN)")
+    parser.add_argument("--tenant-ids", default="1", help="Comma-separated tenants, or 'all'")
+    parser.add_argument("--start", help="First night (YYYY-MM-DD); default 365 days ago")
+    parser.add_argument("--days", type=int, default=365 + 30)
+    parser.add_argument("--statuses", default="Confirmed,CheckedIn,CheckedOut", help="Booking statuses that count as sold (default: on the books)")
+    parser.add_argument("--default-rooms", type=int, default=50, help="Capacity when neither HotelInfos.NumberOfRooms nor RoomNumbers are known (API default)")
+    parser.add_argument("--verify", type=int, default=10, help="Nights to recompute in SQL as a cross-check (0 to skip)")
+    parser.add_argument("--csv", help="Write the per-tenant daily series here")
+    parser.add_argument("--json", help="Write per-tenant totals here")
+    parser.add_argument("--bench", type=int, help="Skip the database: time the engine on this many synthetic bookings")
+    parser.add_argument("--seed", type=int, default=1)
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    if not np:
+        raise SystemExit("numpy not installed. Run: python -m pip install --user numpy")
+    start = date.fromisoformat(args.start) if args.start else datetime.utcnow().date() - timedelta(days=365)
+    statuses = [s.strip() for s in args.statuses.split(",") if s.strip()]
+    unknown = [s for s in statuses if s not in STATUSES]
+    if unknown:
+        raise SystemExit(f"Unknown status {unknown}; expected {STATUSES}")
+
+    if args.bench:
+        tenants = list(range(1, 21))
+        t0 = time.perf_counter()
+        b = synthetic(args.bench, tenants, start, args.days, args.seed)
+        t1 = time.perf_counter()
+        # Size the synthetic hotels for roughly 75% occupancy (mean stay ~2.8 nights)
+        rooms = max(1, round(args.bench / len(tenants) * 2.8 / (args.days + 14) / 0.75))
+        result = rollup(b, tenants, {t: rooms for t in tenants}, start, args.days, statuses, 5)
+        t2 = time.perf_counter()
+        print(f"{args.bench:,} bookings x {len(tenants)} tenants x {args.days} nights: generate {t1 - t0:.2f}s, rollup {t2 - t1:.2f}s "
+              f"({args.bench / (t2 - t1) / 1e6:.1f}M bookings/s)")
+        print_summary(result, tenants[:3], ["(other)", "WEB", "OTA", "DIRECT", "SEED"], start, args.days)
+        return
+
+    if not args.conn:
+        raise SystemExit("Missing --conn or STAYBOT_CONN")
+    conn = connect(args.conn)
+    try:
+        if args.tenant_ids == "all":
+            with conn.cursor() as cur:
+                cur.execute('SELECT DISTINCT "TenantId" FROM public."Bookings" ORDER BY 1')
+                tenants = [r[0] for r in cur.fetchall()]
+        else:
+            tenants = [int(t) for t in args.tenant_ids.split(",")]
+        end = start + timedelta(days=args.days)
+        t0 = time.perf_counter()
+        with span("load_bookings", "analytics"):
+            b, sources = load_bookings(conn, tenants, start, end)
+            rooms = room_counts(conn, tenants, args.default_rooms)
+        t1 = time.perf_counter()
+        with span("rollup", "analytics", bookings=int(len(b["tenant"]))):
+            result = rollup(b, tenants, rooms, start, args.days, statuses, len(sources))
+        t2 = time.perf_counter()
+        print(f"Loaded {len(b['tenant']):,} bookings in {t1 - t0:.2f}s, rolled up {len(tenants)} tenants x {args.days} nights in {t2 - t1:.2f}s")
+        print_summary(result, tenants, sources, start, args.days)
+        if args.verify:
+            with span("verify", "analytics"):
+                verify(conn, result, tenants, start, args.days, statuses, args.verify, args.seed)
+                checked_in = rollup(b, tenants, rooms, start, args.days, ["CheckedIn"], len(sources))
+                api_today(conn, checked_in, tenants, start, args.days)
+    finally:
+        conn.close()
+
+    if args.csv:
+        write_csv(args.csv, result, tenants, start, args.days)
+        print(f"Wrote {args.csv}")
+    if args.json:
+        totals = {str(t): {"rooms": float(result["capacity"][i]), "room_nights": int(result["occupied"][i].sum()),
+                           "revenue": round(float(result["revenue"][i].sum()), 2),
+                           "arrivals": int(result["arrivals"][i].sum()), "departures": int(result["departures"][i].sum())}
+                  for i, t in enumerate(tenants)}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"start": start.isoformat(), "days": args.days, "statuses": statuses, "tenants": totals}, f, indent=2, sort_keys=True)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
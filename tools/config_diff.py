@@ -0,0 +1,240 @@
+import os
+import json
+import argparse
+
+from seed_demo_data import connect
+from tracing import add_trace_args, span, start_from_args
+
+# The configuration tables prefill_from_db (generate_tenant_onboarding_excel) reads, keyed by the
+# columns that identify a row across environments (Ids differ between databases).
+# refs replace a foreign-key Id with the referenced row's natural key so moves are still seen.
+TABLES = {
+    "Tenants": {"filter": "Id", "key": []},
+    "WhatsAppNumbers": {"key": ["PhoneNumberId"]},
+    "HotelInfos": {"key": []},
+    "TenantSettings": {"key": []},
+    "TenantDepartments": {"key": ["DepartmentName"]},
+    "RequestItems": {"key": ["Name"]},
+    "MenuCategories": {"key": ["Name"]},
+    "MenuItems": {"key": ["Name"], "refs": {"MenuCategoryId": ("MenuCategories", "Name")}},
+    "MenuSpecials": {"key": ["Title"], "refs": {"MenuItemId": ("MenuItems", "Name")}},
+    "BusinessInfo": {"key": ["Category", "Title"]},
+    "InformationItems": {"key": ["Question"]},
+    "IntentSettings": {"key": ["IntentName"]},
+    "PropertyDirections": {"key": ["FacilityName"]},
+    "WelcomeMessages": {"key": ["MessageType"]},
+}
+
+# Per-environment values that would make every tenant differ
+IGNORED = ["Id", "TenantId", "CreatedAt", "UpdatedAt", "PageAccessToken", "AccessToken", "WebhookVerifyToken"]
+BUCKET_CHARS = 1
+
+
+def rows_cte(table, ignored):
+    """CTE yielding (k, h, j): natural key with an ordinal for duplicates, md5 of the row JSON, and the JSON itself."""
+    spec = TABLES[table]
+    filter_col = spec.get("filter", "TenantId")
+    keys = spec["key"]
+    key_expr = "concat_ws('|', " + ", ".join(f't."{c}"::text' for c in keys) + ")" if keys else "''"
+    partition = ", ".join(f't."{c}"' for c in keys) or "1"
+    refs = spec.get("refs", {})
+    drop = list(ignored) + list(refs)
+    json_expr = "(to_jsonb(t) - " + "ARRAY[" + ", ".join("'" + c.replace("'", "''") + "'" for c in drop) + "]::text[])"
+    for col, (ref_table, ref_col) in refs.items():
+        name = col[:-2] if col.endswith("Id") else col
+        json_expr += f" || jsonb_build_object('{name}', (SELECT r.\"{ref_col}\" FROM public.\"{ref_table}\" r WHERE r.\"Id\" = t.\"{col}\"))"
+    return (
+        f"WITH rows AS (SELECT {key_expr} || '#' || row_number() OVER (PARTITION BY {partition} ORDER BY t.\"Id\") AS k, "
+        f"{json_expr} AS j FROM public.\"{table}\" t WHERE t.\"{filter_col}\" = %(tenant)s), "
+        "leaves AS (SELECT k, md5(j::text) AS h, j FROM rows)"
+    )
+
+
+def table_exists(conn, table):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", [f'public."{table}"'])
+        return cur.fetchone()[0]
+
+
+class Side:
+    """One database; every method returns hashes computed server-side and counts the bytes that crossed the wire."""
+
+    def __init__(self, label, conn_str, ignored):
+        self.label = label
+        self.conn = connect(conn_str)
+        self.ignored = ignored
+        self.tables = [t for t in TABLES if table_exists(self.conn, t)]
+        self.received = 0
+
+    def fetch(self, sql, params):
+        with self.conn.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+        self.conn.rollback()
+        self.received += sum(len(str(v)) for r in rows for v in r)
+        return rows
+
+    def tenant_id(self, slug_or_id):
+        if str(slug_or_id).isdigit():
+            return int(slug_or_id)
+        rows = self.fetch('SELECT "Id" FROM public."Tenants" WHERE "Slug" = %s', [slug_or_id])
+        if not rows:
+            raise SystemExit(f"{self.label}: no tenant with slug {slug_or_id}")
+        return rows[0][0]
+
+    def slugs(self):
+        return {r[0]: r[1] for r in self.fetch('SELECT "Slug", "Id" FROM public."Tenants"', [])}
+
+    def table_root_sql(self, table):
+        return (f"SELECT '{table}' AS tbl, md5(COALESCE(string_agg(k || ':' || h, E'\\n' ORDER BY k), '')) AS root, count(*) AS n "
+                f"FROM ({rows_cte(table, self.ignored)} SELECT k, h FROM leaves) x")
+
+    def tenant_root(self, tenant):
+        # One round trip and one hash per tenant: the table roots are folded on the server too
+        union = " UNION ALL ".join(f"SELECT * FROM ({self.table_root_sql(t)}) r{i}" for i, t in enumerate(self.tables))
+        return self.fetch(f"SELECT md5(string_agg(tbl || ':' || root, E'\\n' ORDER BY tbl)) FROM ({union}) roots", {"tenant": tenant})[0][0]
+
+    def table_roots(self, tenant):
+        union = " UNION ALL ".join(f"SELECT * FROM ({self.table_root_sql(t)}) r{i}" for i, t in enumerate(self.tables))
+        return {r[0]: (r[1], r[2]) for r in self.fetch(union, {"tenant": tenant})}
+
+    def bucket_roots(self, tenant, table):
+        if table not in self.tables:
+            return {}
+        sql = (f"{rows_cte(table, self.ignored)} SELECT substr(md5(k), 1, {BUCKET_CHARS}) AS b, "
+               "md5(string_agg(k || ':' || h, E'\\n' ORDER BY k)) FROM leaves GROUP BY 1")
+        return dict(self.fetch(sql, {"tenant": tenant}))
+
+    def leaves(self, tenant, table, buckets):
+        if table not in self.tables:
+            return {}
+        sql = f"{rows_cte(table, self.ignored)} SELECT k, h FROM leaves WHERE substr(md5(k), 1, {BUCKET_CHARS}) = ANY(%(buckets)s)"
+        return dict(self.fetch(sql, {"tenant": tenant, "buckets": list(buckets)}))
+
+    def rows(self, tenant, table, keys):
+        if not keys or table not in self.tables:
+            return {}
+        sql = f"{rows_cte(table, self.ignored)} SELECT k, j FROM leaves WHERE k = ANY(%(keys)s)"
+        return dict(self.fetch(sql, {"tenant": tenant, "keys": list(keys)}))
+
+    def close(self):
+        self.conn.close()
+
+
+def column_changes(a, b):
+    return {c: [a.get(c), b.get(c)] for c in sorted(set(a) | set(b)) if a.get(c) != b.get(c)}
+
+
+def diff_tenant(left, right, lt, rt):
+    """Descend the hash tree only where roots differ; returns {table: {added, removed, changed}} and level stats."""
+    stats = {"tables_compared": 0, "buckets_compared": 0, "leaves_compared": 0, "rows_pulled": 0}
+    with span("tenant_root", "merkle"):
+        if left.tenant_root(lt) == right.tenant_root(rt):
+            return {}, stats
+    changes = {}
+    with span("table_roots", "merkle"):
+        lroots, rroots = left.table_roots(lt), right.table_roots(rt)
+    for table in TABLES:
+        if table not in lroots and table not in rroots:
+            continue
+        stats["tables_compared"] += 1
+        if lroots.get(table, (None,))[0] == rroots.get(table, (None,))[0]:
+            continue
+        with span(table, "merkle"):
+            lb, rb = left.bucket_roots(lt, table), right.bucket_roots(rt, table)
+            stats["buckets_compared"] += len(set(lb) | set(rb))
+            buckets = [b for b in set(lb) | set(rb) if lb.get(b) != rb.get(b)]
+            ll, rl = left.leaves(lt, table, buckets), right.leaves(rt, table, buckets)
+            stats["leaves_compared"] += len(set(ll) | set(rl))
+            keys = [k for k in set(ll) | set(rl) if ll.get(k) != rl.get(k)]
+            lrows, rrows = left.rows(lt, table, [k for k in keys if k in ll]), right.rows(rt, table, [k for k in keys if k in rl])
+            stats["rows_pulled"] += len(lrows) + len(rrows)
+        entry = {
+            "added": {k: rrows[k] for k in sorted(rrows) if k not in lrows},
+            "removed": {k: lrows[k] for k in sorted(lrows) if k not in rrows},
+            "changed": {k: column_changes(lrows[k], rrows[k]) for k in sorted(lrows) if k in rrows},
+        }
+        changes[table] = {kind: v for kind, v in entry.items() if v}
+    return changes, stats
+
+
+def print_changes(label, changes):
+    if not changes:
+        print(f"{label}: identical")
+        return
+    print(f"{label}:")
+    for table, entry in changes.items():
+        for key, row in entry.get("added", {}).items():
+            print(f"  + {table} [{key}]")
+        for key, row in entry.get("removed", {}).items():
+            print(f"  - {table} [{key}]")
+        for key, cols in entry.get("changed", {}).items():
+            print(f"  ~ {table} [{key}]")
+            for col, (a, b) in cols.items():
+                print(f"      {col}: {json.dumps(a, ensure_ascii=False)[:80]} -> {json.dumps(b, ensure_ascii=False)[:80]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare tenant configuration between two databases by exchanging Merkle hashes, pulling only differing rows")
+    parser.add_argument("command", choices=["diff", "roots"])
+    parser.add_argument("--left", default=os.environ.get("STAYBOT_CONN"), help="Source database (or set STAYBOT_CONN), e.g. staging")
+    parser.add_argument("--right", help="Target database, e.g. production")
+    parser.add_argument("--tenant", action="append", default=[], help="Slug or Id (same on both sides) or LEFT=RIGHT; repeatable; default: every slug on either side")
+    parser.add_argument("--ignore", default="", help="Extra comma-separated columns to leave out of the row hashes")
+    parser.add_argument("--json", help="Write the change set here")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    if not args.left:
+        raise SystemExit("Missing --left or STAYBOT_CONN")
+    ignored = IGNORED + [c.strip() for c in args.ignore.split(",") if c.strip()]
+    left = Side("left", args.left, ignored)
+    if args.command == "roots":
+        try:
+            tenants = args.tenant or sorted(left.slugs())
+            out = {}
+            for t in tenants:
+                tid = left.tenant_id(t)
+                out[str(t)] = {"root": left.tenant_root(tid), "tables": {k: v[0] for k, v in sorted(left.table_roots(tid).items())}}
+            print(json.dumps(out, indent=2, sort_keys=True))
+        finally:
+            left.close()
+        return
+
+    if not args.right:
+        raise SystemExit("diff needs --right")
+    right = Side("right", args.right, ignored)
+    result, totals = {}, {"tables_compared": 0, "buckets_compared": 0, "leaves_compared": 0, "rows_pulled": 0}
+    try:
+        if args.tenant:
+            pairs = [tuple(t.split("=", 1)) if "=" in t else (t, t) for t in args.tenant]
+        else:
+            ls, rs = left.slugs(), right.slugs()
+            pairs = [(s, s) for s in sorted(set(ls) & set(rs))]
+            for s in sorted(set(ls) - set(rs)):
+                print(f"Tenant {s} only on left")
+            for s in sorted(set(rs) - set(ls)):
+                print(f"Tenant {s} only on right")
+        for lt, rt in pairs:
+            label = lt if lt == rt else f"{lt}={rt}"
+            changes, stats = diff_tenant(left, right, left.tenant_id(lt), right.tenant_id(rt))
+            for k, v in stats.items():
+                totals[k] += v
+            result[label] = changes
+            print_changes(f"Tenant {label}", changes)
+    finally:
+        left.close()
+        right.close()
+
+    print(f"\nCompared {len(result)} tenant(s): {totals['tables_compared']} table roots, {totals['buckets_compared']} bucket roots, "
+          f"{totals['leaves_compared']} row hashes; pulled {totals['rows_pulled']} rows. "
+          f"Received {left.received / 1024:.1f} KB from left, {right.received / 1024:.1f} KB from right")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, sort_keys=True, ensure_ascii=False, default=str)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import time
+import uuid
+import glob
+import shlex
+import hashlib
+import argparse
+import subprocess
+from datetime import datetime, timedelta, timezone
+
+from seed_demo_data import connect, required_defaults
+from tracing import add_trace_args, start_from_args
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOOLS = os.path.join(ROOT, "tools")
+MIGRATIONS = os.path.join(ROOT, "apps", "api", "Migrations")
+TEMPLATE_PREFIX = "staybot_tpl_"
+CLONE_PREFIX = "staybot_test_"
+EXTENSIONS = ["vector", "pg_trgm"]
+DEFAULT_MIGRATE = "dotnet ef database update --project " + shlex.quote(os.path.join(ROOT, "apps", "api")) + " --connection {npgsql}"
+
+
+def fixture_hash(seed_args, extra_paths=()):
+    """Content hash of the migrations, the seed scripts and their arguments; a template is reused while this is unchanged."""
+    paths = sorted(glob.glob(os.path.join(MIGRATIONS, "**", "*.cs"), recursive=True))
+    paths += [os.path.join(TOOLS, "seed_demo_data.py"), os.path.join(TOOLS, "seed_admin_user.py")]
+    paths += sorted(p for pattern in extra_paths for p in glob.glob(pattern, recursive=True))
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.relpath(path, ROOT).replace(os.sep, "/").encode())
+        with open(path, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    digest.update(json.dumps(seed_args, sort_keys=True).encode())
+    return digest.hexdigest()[:16], len(paths)
+
+
+class Server:
+    """Admin connection (autocommit) to the maintenance database of the server --conn points at."""
+
+    def __init__(self, conn_str, maintenance_db):
+        probe = connect(conn_str)
+        self.params = {k: v for k, v in probe.get_dsn_parameters().items() if k in ("host", "port", "user", "sslmode")}
+        self.password = probe.info.password if hasattr(probe, "info") else None
+        probe.close()
+        self.conn = connect(self.dsn(maintenance_db))
+        self.conn.autocommit = True
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT current_setting('server_version_num')::int")
+            self.version = cur.fetchone()[0]
+
+    def dsn(self, dbname):
+        parts = dict(self.params, dbname=dbname)
+        if self.password:
+            parts["password"] = self.password
+        return " ".join(f"{k}={v}" for k, v in parts.items())
+
+    def npgsql(self, dbname):
+        parts = [f"Host={self.params.get('host', 'localhost')}", f"Port={self.params.get('port', '5432')}",
+                 f"Database={dbname}", f"Username={self.params.get('user', 'postgres')}"]
+        if self.password:
+            parts.append(f"Password={self.password}")
+        return ";".join(parts)
+
+    def execute(self, sql, params=None):
+        with self.conn.cursor() as cur:
+            cur.execute(sql, params or [])
+            return cur.fetchall() if cur.description else None
+
+    def exists(self, dbname):
+        return bool(self.execute("SELECT 1 FROM pg_database WHERE datname = %s", [dbname]))
+
+    def drop(self, dbname):
+        if self.version >= 130000:
+            self.execute(f'DROP DATABASE IF EXISTS "{dbname}" WITH (FORCE)')
+            return
+        self.execute("SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE datname = %s AND pid <> pg_backend_pid()", [dbname])
+        self.execute(f'DROP DATABASE IF EXISTS "{dbname}"')
+
+    def tag(self, dbname, **info):
+        info["created"] = datetime.now(timezone.utc).isoformat()
+        self.execute(f'COMMENT ON DATABASE "{dbname}" IS %s', [json.dumps(info, sort_keys=True)])
+
+    def databases(self, prefix):
+        rows = self.execute(
+            "SELECT d.datname, pg_database_size(d.oid), shobj_description(d.oid, 'pg_database'), "
+            "(SELECT count(*) FROM pg_stat_activity a WHERE a.datname = d.datname) "
+            "FROM pg_database d WHERE d.datname LIKE %s ORDER BY 1", [prefix + "%"])
+        out = []
+        for name, size, comment, backends in rows:
+            try:
+                info = json.loads(comment or "{}")
+            except ValueError:
+                info = {}
+            out.append({"name": name, "bytes": size, "backends": backends, **info})
+        return out
+
+
+def run_step(label, argv, env=None):
+    started = time.perf_counter()
+    print(f"[template] {label}: {' '.join(argv) if isinstance(argv, list) else argv}")
+    result = subprocess.run(argv, env=env, shell=isinstance(argv, str))
+    if result.returncode != 0:
+        raise SystemExit(f"{label} failed (exit {result.returncode})")
+    print(f"[template] {label} done in {time.perf_counter() - started:.1f}s")
+
+
+def seed_tenants(dsn, tenant_ids, tz):
+    """Tenants rows for the seed steps to hang off: no migration inserts one, and every seeded table has FK_*_Tenants_TenantId."""
+    given = ["Id", "Name", "Slug", "Timezone", "Plan", "ThemePrimary", "Status", "RetentionDays"]
+    db = connect(dsn)
+    try:
+        extra = required_defaults(db, "Tenants", given)
+        cols = ", ".join(f'"{c}"' for c in given + list(extra))
+        marks = ", ".join(["%s"] * (len(given) + len(extra)))
+        with db.cursor() as cur:
+            for tenant_id in tenant_ids:
+                cur.execute(f'INSERT INTO public."Tenants" ({cols}) OVERRIDING SYSTEM VALUE VALUES ({marks}) ON CONFLICT ("Id") DO NOTHING',
+                            [tenant_id, f"Demo Hotel {tenant_id}", f"demo-{tenant_id}", tz, "Basic", "#007bff", "Active", 30] + list(extra.values()))
+            # Explicit Ids bypass the identity sequence; keep it ahead of them for tenants the tests create
+            cur.execute("SELECT setval(pg_get_serial_sequence('public.\"Tenants\"', 'Id'), (SELECT max(\"Id\") FROM public.\"Tenants\"))")
+        db.commit()
+    finally:
+        db.close()
+    print(f"[template] tenants: {', '.join(map(str, tenant_ids))} ({tz})")
+
+
+def build_template(server, digest, args):
+    """Migrate and seed into <template>_build, then rename and freeze it. Serialised per hash by an advisory lock."""
+    name = TEMPLATE_PREFIX + digest
+    lock_key = int(digest[:15], 16)
+    server.execute("SELECT pg_advisory_lock(%s)", [lock_key])
+    try:
+        if server.exists(name) and not args.rebuild:
+            return name, False
+        building = name + "_build"
+        server.drop(building)
+        started = time.perf_counter()
+        server.execute(f'CREATE DATABASE "{building}"')
+        db = connect(server.dsn(building))
+        db.autocommit = True
+        with db.cursor() as cur:
+            for ext in EXTENSIONS:
+                try:
+                    cur.execute(f"CREATE EXTENSION IF NOT EXISTS {ext}")
+                except Exception as e:
+                    print(f"[template] extension {ext} unavailable: {e}".strip())
+        db.close()
+        try:
+            migrate = args.migrate_cmd.format(npgsql=shlex.quote(server.npgsql(building)), dsn=shlex.quote(server.dsn(building)))
+            run_step("migrate", migrate)
+            seed_tenants(server.dsn(building), args.tenant_ids, args.tenant_timezone)
+            env = dict(os.environ, STAYBOT_CONN=server.dsn(building))
+            for tenant_id in args.tenant_ids:
+                run_step("seed_demo_data", [sys.executable, os.path.join(TOOLS, "seed_demo_data.py"), "--tenant-id", str(tenant_id)] + args.seed_args, env)
+                run_step("seed_admin_user", [sys.executable, os.path.join(TOOLS, "seed_admin_user.py"), "--tenant-id", str(tenant_id)], env)
+        except BaseException:
+            server.drop(building)
+            raise
+        if server.exists(name):
+            server.execute(f'ALTER DATABASE "{name}" WITH IS_TEMPLATE false')
+            server.drop(name)
+        server.execute(f'ALTER DATABASE "{building}" RENAME TO "{name}"')
+        # Connections to a template block CREATE DATABASE ... TEMPLATE, so nobody is allowed in once it is frozen
+        server.execute(f'ALTER DATABASE "{name}" WITH IS_TEMPLATE true ALLOW_CONNECTIONS false')
+        server.tag(name, hash=digest, build_seconds=round(time.perf_counter() - started, 1), tenants=args.tenant_ids, seed_args=args.seed_args)
+        return name, True
+    finally:
+        server.execute("SELECT pg_advisory_unlock(%s)", [lock_key])
+
+
+def clone(server, template, digest, worker=None):
+    suffix = worker or uuid.uuid4().hex[:8]
+    name = f"{CLONE_PREFIX}{digest[:8]}_{suffix}"[:63]
+    server.drop(name)
+    strategy = " STRATEGY FILE_COPY" if server.version >= 150000 else ""
+    started = time.perf_counter()
+    server.execute(f'CREATE DATABASE "{name}" TEMPLATE "{template}"{strategy}')
+    elapsed = time.perf_counter() - started
+    server.tag(name, hash=digest, template=template, pid=os.getpid())
+    return name, elapsed
+
+
+def clone_env(server, name):
+    npgsql = server.npgsql(name)
+    return {"STAYBOT_CONN": server.dsn(name), "ConnectionStrings__Azure": npgsql, "ConnectionStrings__Default": npgsql}
+
+
+def gc(server, digest, max_age_hours, keep_templates):
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+    dropped = []
+    for db in server.databases(CLONE_PREFIX):
+        created = datetime.fromisoformat(db["created"]) if db.get("created") else None
+        if db["backends"] == 0 and (created is None or created < cutoff):
+            server.drop(db["name"])
+            dropped.append(db["name"])
+    templates = [t for t in server.databases(TEMPLATE_PREFIX) if t.get("hash") != digest and not t["name"].endswith("_build")]
+    templates.sort(key=lambda t: t.get("created", ""), reverse=True)
+    for t in templates[keep_templates:]:
+        server.execute(f'ALTER DATABASE "{t["name"]}" WITH IS_TEMPLATE false')
+        server.drop(t["name"])
+        dropped.append(t["name"])
+    return dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed once into a template database and hand out CREATE DATABASE ... TEMPLATE clones")
+    parser.add_argument("command", choices=["hash", "template", "clone", "run", "drop", "gc", "status"])
+    parser.add_argument("names", nargs="*", help="drop: clone database names")
+    parser.add_argument("--conn", default=os.environ.get("STAYBOT_CONN"), help="Any database on the target server (or set STAYBOT_CONN); clones are created beside it")
+    parser.add_argument("--maintenance-db", default="postgres")
+    parser.add_argument("--tenant-ids", type=lambda s: [int(x) for x in s.split(",")], default=[1])
+    parser.add_argument("--tenant-timezone", default="Africa/Johannesburg", help="Timezone of the Tenants rows created for --tenant-ids (part of the hash)")
+    parser.add_argument("--seed-args", type=shlex.split, default=[], help="Extra seed_demo_data arguments, e.g. \"--history-months 2\" (part of the hash)")
+    parser.add_argument("--hash-path", action="append", default=[], help="Additional glob whose contents invalidate the template")
+    parser.add_argument("--migrate-cmd", default=DEFAULT_MIGRATE, help="Schema step; {npgsql} and {dsn} are replaced with the build database connection")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the template even if the hash matches")
+    parser.add_argument("--workers", type=int, default=1, help="clone: number of clones to create")
+    parser.add_argument("--worker", default=os.environ.get("PYTEST_XDIST_WORKER"), help="clone: stable suffix instead of a random one")
+    parser.add_argument("--keep", action="store_true", help="run: keep the clone afterwards")
+    parser.add_argument("--max-age-hours", type=float, default=6.0, help="gc: drop idle clones older than this")
+    parser.add_argument("--keep-templates", type=int, default=1, help="gc: stale templates to keep besides the current one")
+    argv = sys.argv[1:]
+    # run: everything after "--" is the command, executed with the clone's STAYBOT_CONN/ConnectionStrings__*
+    command = argv[argv.index("--") + 1:] if "--" in argv else []
+    add_trace_args(parser)
+    args = parser.parse_args(argv[:argv.index("--")] if "--" in argv else argv)
+    start_from_args(args)
+
+    digest, files = fixture_hash({"tenants": args.tenant_ids, "timezone": args.tenant_timezone, "seed_args": args.seed_args}, args.hash_path)
+    if args.command == "hash":
+        print(f"{digest} ({files} files)")
+        return
+    if not args.conn:
+        raise SystemExit("Missing --conn or STAYBOT_CONN")
+
+    server = Server(args.conn, args.maintenance_db)
+    try:
+        if args.command == "status":
+            print(f"Current hash {digest} -> {TEMPLATE_PREFIX}{digest}")
+            for db in server.databases(TEMPLATE_PREFIX) + server.databases(CLONE_PREFIX):
+                mark = "*" if db.get("hash") == digest else " "
+                print(f"{mark} {db['name']:40} {db['bytes'] / 1e6:>9.1f} MB  backends={db['backends']}  created={db.get('created', '?')}")
+            return
+        if args.command == "drop":
+            for name in args.names:
+                if not name.startswith(CLONE_PREFIX):
+                    raise SystemExit(f"Refusing to drop {name}: not a {CLONE_PREFIX}* clone")
+                server.drop(name)
+                print(f"Dropped {name}")
+            return
+        if args.command == "gc":
+            dropped = gc(server, digest, args.max_age_hours, args.keep_templates)
+            print("Dropped: " + (", ".join(dropped) if dropped else "nothing"))
+            return
+
+        template, built = build_template(server, digest, args)
+        print(f"Template {template} ({'built' if built else 'up to date'})")
+        if args.command == "template":
+            return
+        if args.command == "clone":
+            for i in range(args.workers):
+                worker = f"{args.worker}_{i}" if args.worker and args.workers > 1 else args.worker
+                name, elapsed = clone(server, template, digest, worker)
+                env = clone_env(server, name)
+                print(f"Clone {name} in {elapsed * 1000:.0f} ms")
+                for key, value in env.items():
+                    print(f"  {key}={value}")
+            return
+
+        if not command:
+            raise SystemExit("run needs a command, e.g. db_fixtures.py run -- bash run_tests.sh")
+        name, elapsed = clone(server, template, digest, args.worker)
+        print(f"Clone {name} in {elapsed * 1000:.0f} ms")
+        try:
+            code = subprocess.call(command, env=dict(os.environ, **clone_env(server, name)))
+        finally:
+            if not args.keep:
+                server.drop(name)
+        raise SystemExit(code)
+    finally:
+        server.conn.close()
+
+
+if __name__ == "__main__":
+    main()
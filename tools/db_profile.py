@@ -0,0 +1,265 @@
+import os
+import json
+import argparse
+from datetime import datetime
+from decimal import Decimal
+
+from seed_demo_data import connect
+from tracing import add_trace_args, start_from_args
+
+# Tables seed_demo_data, the onboarding workbook prefill and the load/retention tools read or write.
+# Every other public table with a "TenantId" column is profiled too unless --tables narrows it.
+CORE_TABLES = [
+    "Bookings", "BusinessInfo", "Conversations", "InformationItems", "IntentSettings", "KnowledgeBaseChunks",
+    "MenuItems", "Messages", "PropertyDirections", "RequestItems", "StaffTasks", "TenantDepartments", "WelcomeMessages",
+]
+
+# Partitions roll up into their partitioned parent (the only name tenant_tables returns for them), so a
+# partitioned table reports the sum of its partitions; a plain table is its own root.
+TABLE_STATS_SQL = """
+SELECT r.relname, sum(s.n_live_tup), sum(s.n_dead_tup), sum(s.seq_scan), sum(s.seq_tup_read), sum(s.idx_scan), sum(s.idx_tup_fetch),
+       sum(s.n_tup_ins), sum(s.n_tup_upd), sum(s.n_tup_del), sum(s.n_tup_hot_upd), sum(s.n_mod_since_analyze),
+       max(s.last_autovacuum), max(s.last_vacuum), max(s.last_autoanalyze), sum(s.autovacuum_count),
+       sum(io.heap_blks_read), sum(io.heap_blks_hit), sum(io.idx_blks_read), sum(io.idx_blks_hit), sum(io.toast_blks_read), sum(io.toast_blks_hit),
+       sum(pg_relation_size(s.relid)), sum(pg_indexes_size(s.relid)), sum(pg_total_relation_size(s.relid)),
+       current_setting('block_size')::int,
+       min(COALESCE((SELECT substring(opt FROM 'fillfactor=(\\d+)')::int FROM unnest(c.reloptions) opt WHERE opt LIKE 'fillfactor=%%'), 100))
+FROM pg_stat_user_tables s
+JOIN pg_statio_user_tables io ON io.relid = s.relid
+JOIN pg_class c ON c.oid = s.relid
+JOIN pg_class r ON r.oid = COALESCE(pg_partition_root(s.relid), s.relid)
+WHERE s.schemaname = 'public' AND r.relname = ANY(%s) AND c.relkind = 'r'
+GROUP BY r.relname
+"""
+
+TABLE_STATS_COLS = [
+    "table", "live_rows", "dead_rows", "seq_scan", "seq_tup_read", "idx_scan", "idx_tup_fetch",
+    "inserts", "updates", "deletes", "hot_updates", "mod_since_analyze",
+    "last_autovacuum", "last_vacuum", "last_autoanalyze", "autovacuum_count",
+    "heap_blks_read", "heap_blks_hit", "idx_blks_read", "idx_blks_hit", "toast_blks_read", "toast_blks_hit",
+    "heap_bytes", "index_bytes", "total_bytes", "block_size", "fillfactor",
+]
+
+# Average row width from the planner's column statistics; 24 bytes tuple header + 4 byte line pointer
+ROW_WIDTH_SQL = """
+SELECT r.relname, avg(w.width)::int + 28
+FROM (SELECT format('public.%%I', tablename)::regclass AS rel, sum(avg_width) AS width
+      FROM pg_stats WHERE schemaname = 'public' AND NOT inherited GROUP BY tablename) w
+JOIN pg_class r ON r.oid = COALESCE(pg_partition_root(w.rel), w.rel)
+WHERE r.relname = ANY(%s) GROUP BY r.relname
+"""
+
+INDEX_SQL = """
+SELECT r.relname, s.indexrelname, s.idx_scan, s.idx_tup_read, s.idx_tup_fetch, pg_relation_size(s.indexrelid),
+       io.idx_blks_read, io.idx_blks_hit, i.indisunique, i.indisprimary
+FROM pg_stat_user_indexes s
+JOIN pg_statio_user_indexes io ON io.indexrelid = s.indexrelid
+JOIN pg_index i ON i.indexrelid = s.indexrelid
+JOIN pg_class r ON r.oid = COALESCE(pg_partition_root(s.relid), s.relid)
+WHERE s.schemaname = 'public' AND r.relname = ANY(%s)
+"""
+
+
+def plain(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def ratio(hit, read):
+    total = (hit or 0) + (read or 0)
+    return round(hit / total, 4) if total else None
+
+
+# One entry per logical table once partition_migrate has run: partitions are read through their parent,
+# <name>_legacy is dropped once <name> is a view over <name>_p, and <name>_p while <name> is still the
+# live table (mid-backfill). Otherwise every Messages/Bookings row would be counted or archived 2-3 times.
+TENANT_TABLES_SQL = """
+SELECT c.relname, bool_or(a.attname = 'CreatedAt')
+FROM pg_class c
+JOIN pg_namespace n ON n.oid = c.relnamespace
+JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+  AND NOT EXISTS (SELECT 1 FROM pg_class v WHERE v.relnamespace = c.relnamespace AND v.relkind = 'v' AND c.relname = v.relname || '_legacy')
+  AND NOT EXISTS (SELECT 1 FROM pg_class r WHERE r.relnamespace = c.relnamespace AND r.relkind = 'r' AND c.relname = r.relname || '_p')
+GROUP BY c.relname HAVING bool_or(a.attname = 'TenantId') ORDER BY 1
+"""
+
+
+def tenant_tables(conn, only=None):
+    """Public tables with a TenantId column, and whether they carry CreatedAt for a recent-rows count.
+
+    A swapped table appears under its storage name (Messages_p); --tables may name either."""
+    with conn.cursor() as cur:
+        cur.execute(TENANT_TABLES_SQL)
+        rows = {r[0]: r[1] for r in cur.fetchall()}
+    if only:
+        rows = {t: v for t, v in rows.items() if t in only or (t.endswith("_p") and t[:-2] in only)}
+    return rows
+
+
+def table_stats(conn, tables):
+    with conn.cursor() as cur:
+        cur.execute(TABLE_STATS_SQL, [tables])
+        stats = {r[0]: dict(zip(TABLE_STATS_COLS, map(plain, r))) for r in cur.fetchall()}
+        cur.execute(ROW_WIDTH_SQL, [tables])
+        widths = {r[0]: r[1] for r in cur.fetchall()}
+    for name, s in stats.items():
+        s["heap_hit_ratio"] = ratio(s["heap_blks_hit"], s["heap_blks_read"])
+        s["idx_hit_ratio"] = ratio(s["idx_blks_hit"], s["idx_blks_read"])
+        s["dead_ratio"] = round(s["dead_rows"] / (s["live_rows"] + s["dead_rows"]), 4) if s["live_rows"] + s["dead_rows"] else 0.0
+        s["seq_scan_share"] = round(s["seq_scan"] / (s["seq_scan"] + (s["idx_scan"] or 0)), 4) if s["seq_scan"] + (s["idx_scan"] or 0) else 0.0
+        # Estimated bloat: heap size beyond what live rows need at the table's fillfactor. Rough (no
+        # alignment padding, TOAST ignored) but cheap and good enough to rank tables.
+        width = widths.get(name)
+        if width:
+            per_page = max(int((s["block_size"] - 24) * s["fillfactor"] / 100 // width), 1)
+            expected = -(-s["live_rows"] // per_page) * s["block_size"]
+            s["est_bloat_bytes"] = max(s["heap_bytes"] - expected, 0)
+            s["est_bloat_ratio"] = round(s["est_bloat_bytes"] / s["heap_bytes"], 4) if s["heap_bytes"] else 0.0
+        else:
+            s["est_bloat_bytes"] = s["est_bloat_ratio"] = None
+    return stats
+
+
+def index_stats(conn, tables):
+    out = {}
+    with conn.cursor() as cur:
+        cur.execute(INDEX_SQL, [tables])
+        for table, index, scans, tup_read, tup_fetch, size, blks_read, blks_hit, unique, primary in cur.fetchall():
+            out.setdefault(table, {})[index] = {
+                "scans": scans, "tup_read": tup_read, "tup_fetch": tup_fetch, "bytes": size,
+                "hit_ratio": ratio(blks_hit, blks_read), "unique": unique, "primary": primary,
+                "unused": scans == 0 and not unique and not primary,
+            }
+    return out
+
+
+def tenant_counts(conn, tables, recent_days):
+    """Rows per TenantId with one grouped query per table, plus rows created in the last recent_days where possible."""
+    out = {}
+    with conn.cursor() as cur:
+        for table, has_created in tables.items():
+            recent = f", count(*) FILTER (WHERE \"CreatedAt\" >= now() - interval '{int(recent_days)} days')" if has_created else ""
+            cur.execute(f'SELECT "TenantId", count(*){recent} FROM public."{table}" GROUP BY 1 ORDER BY 1')
+            out[table] = {str(r[0]): {"rows": r[1], **({"recent": r[2]} if has_created else {})} for r in cur.fetchall()}
+    conn.rollback()
+    return out
+
+
+def snapshot(conn, only=None, recent_days=1, skip_counts=False):
+    tables = tenant_tables(conn, only)
+    names = sorted(tables)
+    with conn.cursor() as cur:
+        cur.execute("SELECT current_database(), version(), pg_database_size(current_database()), now()")
+        db, version, db_bytes, taken = cur.fetchone()
+        cur.execute("SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()")
+        stats_reset = cur.fetchone()[0]
+    report = {
+        "taken_at": plain(taken), "database": db, "server": version.split(",")[0], "database_bytes": db_bytes,
+        "stats_reset": plain(stats_reset), "recent_days": recent_days,
+        "tables": table_stats(conn, names),
+        "indexes": index_stats(conn, names),
+        "tenants": {} if skip_counts else tenant_counts(conn, tables, recent_days),
+    }
+    conn.rollback()
+    return report
+
+
+def print_summary(report, top):
+    tables = sorted(report["tables"].values(), key=lambda s: -s["total_bytes"])
+    print(f"{'table':28} {'live rows':>12} {'dead%':>6} {'total MB':>9} {'bloat%':>7} {'seq%':>6} {'heap hit':>8}")
+    for s in tables[:top]:
+        bloat = f"{100 * s['est_bloat_ratio']:.0f}%" if s["est_bloat_ratio"] is not None else "-"
+        hit = f"{s['heap_hit_ratio']:.3f}" if s["heap_hit_ratio"] is not None else "-"
+        print(f"{s['table']:28} {s['live_rows']:>12} {100 * s['dead_ratio']:>5.1f}% {s['total_bytes'] / 1e6:>9.1f} {bloat:>7} "
+              f"{100 * s['seq_scan_share']:>5.0f}% {hit:>8}")
+    unused = [(t, i, v["bytes"]) for t, idx in report["indexes"].items() for i, v in idx.items() if v["unused"]]
+    if unused:
+        print("\nUnused indexes (0 scans since stats reset):")
+        for t, i, b in sorted(unused, key=lambda x: -x[2])[:top]:
+            print(f"  {t}.{i} ({b / 1e6:.1f} MB)")
+    if report["tenants"]:
+        print("\nLargest tenant per table:")
+        for table, per in sorted(report["tenants"].items()):
+            total = sum(v["rows"] for v in per.values())
+            if not total:
+                continue
+            tenant, v = max(per.items(), key=lambda kv: kv[1]["rows"])
+            print(f"  {table:28} tenant {tenant:>5}: {v['rows']:>10} rows ({100 * v['rows'] / total:.0f}% of {total})")
+
+
+def diff(old, new, growth_pct, min_rows):
+    """Table size/row changes and tenants whose rows grew more than growth_pct between two snapshots."""
+    print(f"{old['taken_at']} -> {new['taken_at']}")
+    print(f"{'table':28} {'rows before':>12} {'rows after':>12} {'Δ rows':>10} {'Δ MB':>8} {'Δ dead':>9}")
+    for table in sorted(set(old["tables"]) | set(new["tables"])):
+        a, b = old["tables"].get(table, {}), new["tables"].get(table, {})
+        d_rows = b.get("live_rows", 0) - a.get("live_rows", 0)
+        d_bytes = b.get("total_bytes", 0) - a.get("total_bytes", 0)
+        d_dead = b.get("dead_rows", 0) - a.get("dead_rows", 0)
+        if d_rows or d_bytes or d_dead:
+            print(f"{table:28} {a.get('live_rows', 0):>12} {b.get('live_rows', 0):>12} {d_rows:>+10} {d_bytes / 1e6:>+8.1f} {d_dead:>+9}")
+    flagged = []
+    for table, per in new.get("tenants", {}).items():
+        before = old.get("tenants", {}).get(table, {})
+        for tenant, v in per.items():
+            prev = before.get(tenant, {}).get("rows", 0)
+            grown = v["rows"] - prev
+            if grown >= min_rows and (not prev or 100.0 * grown / prev >= growth_pct):
+                flagged.append((table, tenant, prev, v["rows"]))
+    if flagged:
+        print(f"\nTenants growing >= {growth_pct:.0f}% (and >= {min_rows} rows):")
+        for table, tenant, prev, now in sorted(flagged, key=lambda f: -(f[3] - f[2])):
+            print(f"  {table:28} tenant {tenant:>5}: {prev} -> {now} (+{now - prev})")
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot table/index statistics, bloat estimates and per-tenant row counts as diffable JSON")
+    parser.add_argument("command", choices=["snapshot", "diff"])
+    parser.add_argument("files", nargs="*", help="diff: OLD.json NEW.json")
+    parser.add_argument("--conn", default=os.environ.get("STAYBOT_CONN"), help="PostgreSQL connection string (or set STAYBOT_CONN)")
+    parser.add_argument("--tables", help="Comma-separated subset; 'core' for the tables the tools/ scripts use (default: every TenantId table)")
+    parser.add_argument("--recent-days", type=int, default=1, help="Window for the per-tenant recent-rows count")
+    parser.add_argument("--no-tenant-counts", action="store_true", help="Skip the grouped count queries (they scan each table)")
+    parser.add_argument("--out", help="Write the snapshot here (default: db_profile_<timestamp>.json in the current directory)")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--growth-pct", type=float, default=50.0, help="diff: flag tenants growing at least this much")
+    parser.add_argument("--min-rows", type=int, default=1000, help="diff: ignore tenants that grew by fewer rows")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    if args.command == "diff":
+        if len(args.files) != 2:
+            raise SystemExit("diff needs OLD.json NEW.json")
+        reports = []
+        for path in args.files:
+            with open(path, "r", encoding="utf-8") as f:
+                reports.append(json.load(f))
+        diff(reports[0], reports[1], args.growth_pct, args.min_rows)
+        return
+
+    if not args.conn:
+        raise SystemExit("Missing --conn or STAYBOT_CONN")
+    only = None
+    if args.tables:
+        only = set(CORE_TABLES) if args.tables == "core" else {t.strip() for t in args.tables.split(",") if t.strip()}
+    conn = connect(args.conn)
+    try:
+        report = snapshot(conn, only, args.recent_days, args.no_tenant_counts)
+    finally:
+        conn.close()
+    out = args.out or f"db_profile_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        # Sorted keys and one value per line keep successive snapshots readable under `git diff`/`diff -u`
+        json.dump(report, f, indent=1, sort_keys=True)
+    print_summary(report, args.top)
+    print(f"\nSnapshot written: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+import os
+import re
+import csv
+import json
+import time
+import random
+import argparse
+
+from loadstats import Histogram
+from seed_demo_data import connect
+from seed_embeddings import HashedNgramEmbedder, paraphrase
+from tracing import add_trace_args, start_from_args
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+try:
+    import openpyxl
+except Exception:
+    openpyxl = None
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = set("a an the is are do does i we you my our your can could to of in on at for and or be it there what when where how".split())
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if t not in STOPWORDS]
+
+
+def parse_keywords(value):
+    if isinstance(value, (list, tuple)):
+        return [str(v) for v in value]
+    return [k.strip() for k in str(value or "").split(",") if k.strip()]
+
+
+def load_items_db(conn_str, tenant_id):
+    conn = connect(conn_str)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                'SELECT "Id","Question","Answer","Category","Keywords","Priority","IsTimeRelevant","RelevantHourStart","RelevantHourEnd" '
+                'FROM public."InformationItems" WHERE "TenantId"=%s AND "IsActive"', [tenant_id])
+            return [{
+                "id": r[0], "question": r[1] or "", "answer": r[2] or "", "category": r[3] or "", "keywords": parse_keywords(r[4]),
+                "priority": r[5] or 0, "time_relevant": bool(r[6]), "hour_start": r[7], "hour_end": r[8],
+            } for r in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def load_items_xlsx(path):
+    """Rows of the onboarding workbook's "FAQ Knowledge" sheet (row 1 headers, row 2 hints), and whether ids are real.
+
+    Columns are matched by header. The workbook template has no Id column, so items are numbered by row
+    unless one is present; only then do ids line up with InformationItems."Id" and pgvector's sources."""
+    if not openpyxl:
+        raise SystemExit("openpyxl not installed. Run: python -m pip install --user openpyxl")
+    ws = openpyxl.load_workbook(path, read_only=True, data_only=True)["FAQ Knowledge"]
+    rows = ws.iter_rows(values_only=True)
+    headers = [str(h or "").strip() for h in next(rows, ())]
+    next(rows, None)
+    has_ids = "Id" in headers
+    items = []
+    for i, row in enumerate(rows):
+        r = dict(zip(headers, row))
+        question, start, end = r.get("Question"), r.get("RelevantHourStart"), r.get("RelevantHourEnd")
+        if not question or str(r.get("IsActive")).upper() in ("FALSE", "0", "NO"):
+            continue
+        if has_ids and r["Id"] in (None, ""):
+            raise SystemExit(f"{path}: FAQ Knowledge row {i + 3} has no Id")
+        items.append({
+            "id": int(r["Id"]) if has_ids else i + 1, "question": str(question), "answer": str(r.get("Answer") or ""),
+            "category": str(r.get("Category") or ""), "keywords": parse_keywords(r.get("Keywords")), "priority": int(r.get("Priority") or 0),
+            "time_relevant": str(r.get("IsTimeRelevant")).upper() in ("TRUE", "1", "YES"),
+            "hour_start": int(start) if start not in (None, "") else None, "hour_end": int(end) if end not in (None, "") else None,
+        })
+    return items, has_ids
+
+
+def in_window(item, hour):
+    if not item["time_relevant"] or hour is None or item["hour_start"] is None or item["hour_end"] is None:
+        return True
+    start, end = item["hour_start"], item["hour_end"]
+    # Windows like 22-6 wrap past midnight
+    return start <= hour < end if start <= end else hour >= start or hour < end
+
+
+class FaqIndex:
+    """In-process retrieval over one tenant's InformationItems.
+
+    Builds an inverted keyword index (term -> item ids), BM25 postings as NumPy arrays, and a
+    normalised embedding matrix so cosine scores for a query are a single mat-vec.
+    """
+
+    def __init__(self, items, embedder=None, k1=1.2, b=0.75):
+        self.items = items
+        self.n = len(items)
+        docs = [tokenize(f"{it['question']} {it['question']} {it['answer']} {it['category']} {' '.join(it['keywords'])}") for it in items]
+        lengths = np.array([len(d) for d in docs], dtype=np.float32)
+        avg = float(lengths.mean()) if self.n else 1.0
+        self.postings = {}
+        self.keyword_index = {}
+        for i, (it, doc) in enumerate(zip(items, docs)):
+            tf = {}
+            for t in doc:
+                tf[t] = tf.get(t, 0) + 1
+            for t, c in tf.items():
+                self.postings.setdefault(t, ([], []))
+                self.postings[t][0].append(i)
+                self.postings[t][1].append(c)
+            for kw in it["keywords"]:
+                for t in tokenize(kw):
+                    self.keyword_index.setdefault(t, set()).add(i)
+        # Pre-compute BM25 term weights per posting so a query is just gathers and adds
+        self.bm25 = {}
+        for t, (ids, tfs) in self.postings.items():
+            ids = np.array(ids, dtype=np.int64)
+            tfs = np.array(tfs, dtype=np.float32)
+            idf = np.log(1 + (self.n - len(ids) + 0.5) / (len(ids) + 0.5))
+            self.bm25[t] = (ids, idf * tfs * (k1 + 1) / (tfs + k1 * (1 - b + b * lengths[ids] / avg)))
+        self.priority = np.array([it["priority"] for it in items], dtype=np.float32)
+        self.embedder = embedder
+        self.matrix = embedder.embed([it["question"] for it in items]) if embedder and self.n else None
+
+        # One eligibility mask per hour of day, so the time filter is a single np.where per query
+        self.by_hour = [np.array([in_window(it, h) for it in items], dtype=bool) for h in range(24)]
+
+    def top(self, scores, hour, k):
+        if hour is not None:
+            scores = np.where(self.by_hour[hour % 24], scores, -np.inf)
+        k = min(k, self.n)
+        idx = np.argpartition(-scores, k - 1)[:k]
+        idx = idx[np.argsort(-scores[idx])]
+        return [self.items[i]["id"] for i in idx if np.isfinite(scores[i]) and scores[i] > 0]
+
+    def search_keyword(self, query, hour=None, k=5):
+        # Keyword hits ranked by hit count, then priority (what a LIKE/keyword lookup would return)
+        scores = np.zeros(self.n, dtype=np.float32)
+        for t in set(tokenize(query)):
+            for i in self.keyword_index.get(t, ()):
+                scores[i] += 1
+        return self.top(scores + (scores > 0) * self.priority * 1e-3, hour, k)
+
+    def bm25_scores(self, query):
+        scores = np.zeros(self.n, dtype=np.float32)
+        for t in tokenize(query):
+            hit = self.bm25.get(t)
+            if hit:
+                scores[hit[0]] += hit[1]
+        return scores
+
+    def search_bm25(self, query, hour=None, k=5):
+        return self.top(self.bm25_scores(query), hour, k)
+
+    def search_cosine(self, query, hour=None, k=5):
+        return self.top(self.matrix @ self.embedder.embed([query])[0], hour, k)
+
+    def search_hybrid(self, query, hour=None, k=5, alpha=0.5):
+        bm = self.bm25_scores(query)
+        top = bm.max()
+        cos = self.matrix @ self.embedder.embed([query])[0]
+        return self.top(alpha * (bm / top if top > 0 else bm) + (1 - alpha) * np.clip(cos, 0, None), hour, k)
+
+
+def load_queries(path):
+    """CSV or JSONL with text, expected (item id(s), ';' separated) and optional hour."""
+    rows = []
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            records = list(csv.DictReader(f))
+    for r in records:
+        expected = r.get("expected")
+        if isinstance(expected, str):
+            expected = [int(x) for x in expected.replace(",", ";").split(";") if x.strip()]
+        elif isinstance(expected, int):
+            expected = [expected]
+        hour = r.get("hour")
+        rows.append({"text": r["text"], "expected": set(expected or []), "hour": int(hour) if hour not in (None, "") else None})
+    return rows
+
+
+def synth_queries(items, n, rng):
+    """Paraphrased item questions labelled with their source item, asked at an hour the item is live."""
+    out = []
+    for _ in range(n):
+        it = rng.choice(items)
+        hour = rng.choice([h for h in range(24) if in_window(it, h)] or [None])
+        out.append({"text": paraphrase(it["question"], rng), "expected": {it["id"]}, "hour": hour})
+    return out
+
+
+def pgvector_search(conn_str, tenant_id, embedder, max_distance):
+    """The API's path: embed, then KnowledgeBaseChunks <=> query, mapping InformationItem-<id> sources back to ids."""
+    conn = connect(conn_str)
+    cur = conn.cursor()
+    sql = ('SELECT "Source", ("Embedding" <=> %s::vector) AS distance FROM public."KnowledgeBaseChunks" '
+           'WHERE "TenantId" = %s AND "Source" LIKE %s')
+    if max_distance:
+        sql += ' AND ("Embedding" <=> %s::vector) <= ' + str(float(max_distance))
+    sql += " ORDER BY distance LIMIT %s"
+
+    def search(query, hour=None, k=5):
+        vec = "[" + ",".join(f"{x:.6g}" for x in embedder.embed([query])[0]) + "]"
+        params = [vec, tenant_id, "InformationItem-%"] + ([vec] if max_distance else []) + [k]
+        cur.execute(sql, params)
+        return [int(r[0].split("-", 1)[1]) for r in cur.fetchall()]
+
+    return search, conn
+
+
+def evaluate(name, search, queries, k):
+    hist = Histogram()
+    hits1 = hitsk = 0
+    rr = 0.0
+    for q in queries:
+        t0 = time.perf_counter()
+        got = search(q["text"], q["hour"], k)
+        hist.record(time.perf_counter() - t0)
+        if not q["expected"]:
+            continue
+        for rank, item_id in enumerate(got, 1):
+            if item_id in q["expected"]:
+                rr += 1.0 / rank
+                hits1 += rank == 1
+                hitsk += 1
+                break
+    labelled = sum(1 for q in queries if q["expected"]) or 1
+    return {
+        "method": name, "queries": len(queries), "recall_at_1": hits1 / labelled, f"recall_at_{k}": hitsk / labelled,
+        "mrr": rr / labelled, "p50_us": hist.percentile_us(50), "p95_us": hist.percentile_us(95),
+        "p99_us": hist.percentile_us(99), "mean_us": hist.mean_ms() * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark in-process FAQ retrieval over InformationItems against the pgvector path")
+    parser.add_argument("--conn", default=os.environ.get("STAYBOT_CONN"), help="PostgreSQL connection string (or set STAYBOT_CONN)")
+    parser.add_argument("--tenant-id", type=int, default=1)
+    parser.add_argument("--xlsx", help="Read items from an onboarding workbook's FAQ Knowledge sheet instead of the database (pgvector only if the sheet has an Id column)")
+    parser.add_argument("--queries", help="CSV/JSONL of guest questions (text, expected, hour); default: paraphrases of the items")
+    parser.add_argument("--synthetic", type=int, default=500, help="Paraphrased queries to generate when --queries is not given")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--methods", default="keyword,bm25,cosine,hybrid,pgvector")
+    parser.add_argument("--max-distance", type=float, default=0.0, help="pgvector cut-off as in MessageRoutingService (0.4); 0 disables")
+    parser.add_argument("--seed", type=int, default=1, help="Embedding seed; use the one seed_embeddings load ran with")
+    parser.add_argument("--json", dest="json_out")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    if not np:
+        raise SystemExit("numpy not installed. Run: python -m pip install --user numpy")
+    if not args.xlsx and not args.conn:
+        raise SystemExit("Missing --conn or STAYBOT_CONN (or pass --xlsx)")
+
+    items, db_ids = load_items_xlsx(args.xlsx) if args.xlsx else (load_items_db(args.conn, args.tenant_id), True)
+    if not items:
+        raise SystemExit("No active InformationItems found")
+    rng = random.Random(args.seed)
+    queries = load_queries(args.queries) if args.queries else synth_queries(items, args.synthetic, rng)
+    embedder = HashedNgramEmbedder(seed=args.seed)
+
+    t0 = time.perf_counter()
+    index = FaqIndex(items, embedder)
+    print(f"Indexed {len(items)} items ({len(index.postings)} terms) in {1000 * (time.perf_counter() - t0):.1f} ms; {len(queries)} queries")
+
+    methods = [m.strip() for m in args.methods.split(",") if m.strip()]
+    results = []
+    pg_conn = None
+    try:
+        for m in methods:
+            if m == "pgvector":
+                if not args.conn:
+                    print("[skip] pgvector needs --conn")
+                    continue
+                if not db_ids:
+                    # Row numbers are not InformationItems ids, so every pgvector hit would score as a miss
+                    print("[skip] pgvector needs database ids; add an Id column to the FAQ Knowledge sheet or drop --xlsx")
+                    continue
+                search, pg_conn = pgvector_search(args.conn, args.tenant_id, embedder, args.max_distance)
+                # pgvector has no notion of item hours, so filter its results the same way afterwards
+                eligible = {it["id"]: it for it in items}
+                results.append(evaluate(m, lambda q, h, k, s=search: [i for i in s(q, h, k * 2) if i in eligible and in_window(eligible[i], h)][:k], queries, args.k))
+            else:
+                results.append(evaluate(m, getattr(index, f"search_{m}"), queries, args.k))
+    finally:
+        if pg_conn:
+            pg_conn.close()
+
+    print(f"{'method':10} {'recall@1':>9} {'recall@' + str(args.k):>9} {'mrr':>6} {'p50 us':>9} {'p95 us':>9} {'p99 us':>9}")
+    for r in results:
+        print(f"{r['method']:10} {r['recall_at_1']:>9.3f} {r[f'recall_at_{args.k}']:>9.3f} {r['mrr']:>6.3f} {r['p50_us']:>9} {r['p95_us']:>9} {r['p99_us']:>9}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({"items": len(items), "k": args.k, "results": results}, f, indent=2)
+        print(f"Results written: {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
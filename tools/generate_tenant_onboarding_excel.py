@@ -6,6 +6,9 @@ from openpyxl.worksheet.datavalidation import DataValidation
 from openpyxl.comments import Comment
 from openpyxl.formatting.rule import CellIsRule
 from openpyxl.utils import get_column_letter
+
+from tracing import add_trace_args, instrument, span, start_from_args
+
 try:
     import psycopg2
     import psycopg2.extras
@@ -798,36 +801,28 @@ def main(out_path, conn_str=None, tenant_id=1, debug=False):
     default = wb.active
     wb.remove(default)
 
-    named = build_lists_sheet(wb)
-
-    build_start_here(wb)
-    sheet_core_tenant(wb, named)
-    sheet_waba(wb, named)
-    sheet_owner_staff(wb, named)
-    sheet_hotel_info(wb, named)
-    sheet_tenant_settings(wb, named)
-    sheet_departments(wb, named)
-    sheet_service_mapping(wb, named)
-    sheet_request_items(wb, named)
-    sheet_concierge_providers(wb, named)
-    sheet_business_info(wb, named)
-    sheet_faq_knowledge(wb, named)
-    sheet_menu(wb, named)
-    sheet_templates(wb, named)
-    sheet_emergency(wb, named)
-    sheet_property_directions(wb, named)
-    sheet_intent_settings(wb, named)
-    sheet_welcome_messages(wb, named)
+    with span("build_lists_sheet", "sheet"):
+        named = build_lists_sheet(wb)
+
+    with span("build_start_here", "sheet"):
+        build_start_here(wb)
+    for build in (sheet_core_tenant, sheet_waba, sheet_owner_staff, sheet_hotel_info, sheet_tenant_settings, sheet_departments,
+                  sheet_service_mapping, sheet_request_items, sheet_concierge_providers, sheet_business_info, sheet_faq_knowledge,
+                  sheet_menu, sheet_templates, sheet_emergency, sheet_property_directions, sheet_intent_settings, sheet_welcome_messages):
+        with span(build.__name__, "sheet"):
+            build(wb, named)
 
     # Optional DB prefill
     raw_conn = conn_str or os.environ.get("STAYBOT_CONN", "")
     if debug:
         print("[prefill] Using connection string from", "--conn" if conn_str else "STAYBOT_CONN env")
-    conn = get_connection(raw_conn, debug=debug)
+    with span("get_connection", "db"):
+        conn = instrument(get_connection(raw_conn, debug=debug))
     try:
         if debug and not conn:
             print("[prefill] No DB connection available; skipping prefill")
-        prefill_from_db(conn, wb, tenant_id, debug=debug)
+        with span("prefill_from_db", "prefill", tenant=tenant_id):
+            prefill_from_db(conn, wb, tenant_id, debug=debug)
     finally:
         try:
             if conn:
@@ -835,7 +830,8 @@ def main(out_path, conn_str=None, tenant_id=1, debug=False):
         except Exception:
             pass
 
-    wb.save(out_path)
+    with span("wb.save", "io", path=os.path.basename(out_path)):
+        wb.save(out_path)
 
 
 if __name__ == "__main__":
@@ -844,7 +840,9 @@ if __name__ == "__main__":
     parser.add_argument("--tenant-id", type=int, help="Tenant ID to prefill", default=1)
     parser.add_argument("--out", help="Output xlsx path", default=None)
     parser.add_argument("--debug", action="store_true", help="Enable debug logging for prefill queries")
+    add_trace_args(parser)
     args = parser.parse_args()
+    start_from_args(args)
 
     out_file = args.out or os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "Tenant_Onboarding_Questionnaire.xlsx"))
     os.makedirs(os.path.dirname(out_file), exist_ok=True)
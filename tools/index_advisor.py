@@ -0,0 +1,359 @@
+import os
+import re
+import ast
+import glob
+import json
+import argparse
+
+from seed_demo_data import connect
+from tracing import add_trace_args, start_from_args
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r"(?<![\w$\"])-?\d+(?:\.\d+)?(?![\w\"])")
+PLACEHOLDER_RE = re.compile(r"\$\d+|%s")
+IN_LIST_RE = re.compile(r"\(\s*\$\?(?:\s*,\s*\$\?)+\s*\)")
+FROM_RE = re.compile(r'\bFROM\s+(?:(?:public|"public")\.)?"?(\w+)"?(?:\s+(?:AS\s+)?(?!WHERE\b|ORDER\b|GROUP\b|LIMIT\b|JOIN\b|LEFT\b|INNER\b|FOR\b)(\w+))?', re.I)
+COND_RE = re.compile(r'(?:(\w+)\.)?"(\w+)"\s*(=|>=|<=|<>|>|<|\bBETWEEN\b)\s*(?:ANY\s*\(\s*)?\$(\d+)', re.I)
+ORDER_RE = re.compile(r"\bORDER\s+BY\s+(.*?)(?:\bLIMIT\b|\bOFFSET\b|\bFOR\b|$)", re.I | re.S)
+ORDER_COL_RE = re.compile(r'^(?:(\w+)\.)?"(\w+)"\s*(ASC|DESC)?(?:\s+NULLS\s+(?:FIRST|LAST))?$', re.I)
+LOG_RE = re.compile(r"duration:\s*([\d.]+)\s*ms\s+(?:statement|execute [^:]*):\s*(.*)")
+
+
+def normalize(sql):
+    """Fingerprint text: literals and placeholders become $?, IN lists collapse, whitespace is squeezed."""
+    text = re.sub(r"--[^\n]*", " ", sql)
+    text = STRING_RE.sub("$?", text)
+    text = PLACEHOLDER_RE.sub("$?", text)
+    text = NUMBER_RE.sub("$?", text)
+    text = IN_LIST_RE.sub("($?)", text)
+    return " ".join(text.split()).rstrip(";")
+
+
+def numbered(sql):
+    """Rewrite %s placeholders as $1..$n (psycopg2 %% back to %) so every source explains the same way."""
+    counter = iter(range(1, 1000))
+    text = re.sub(r"%s", lambda m: f"${next(counter)}", sql)
+    return " ".join(text.replace("%%", "%").split()).rstrip(";")
+
+
+class Workload:
+    def __init__(self):
+        self.statements = {}
+
+    def add(self, sql, calls=1, total_ms=None, source=""):
+        if not re.match(r"\s*(SELECT|UPDATE|DELETE)\b", sql, re.I) or "TenantId" not in sql:
+            return
+        key = normalize(sql)
+        entry = self.statements.setdefault(key, {"example": numbered(sql), "calls": 0, "total_ms": None, "sources": set()})
+        entry["calls"] += calls
+        if total_ms is not None:
+            entry["total_ms"] = (entry["total_ms"] or 0.0) + total_ms
+        entry["sources"].add(source)
+
+
+def capture_pgss(conn, workload, min_calls):
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_stat_statements'")
+        if not cur.fetchone():
+            raise SystemExit("pg_stat_statements is not installed in this database (shared_preload_libraries + CREATE EXTENSION)")
+        cur.execute("SELECT current_setting('server_version_num')::int")
+        column = "total_exec_time" if cur.fetchone()[0] >= 130000 else "total_time"
+        cur.execute(
+            f"SELECT query, calls, {column} FROM pg_stat_statements "
+            "WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database()) AND calls >= %s", [min_calls])
+        for query, calls, total in cur.fetchall():
+            workload.add(query, calls, float(total), "pg_stat_statements")
+
+
+def capture_log(path, workload):
+    """Postgres log with log_min_duration_statement (continuation lines start with whitespace) or plain SQL, one statement per line."""
+    pending = None
+
+    def flush():
+        if pending:
+            workload.add(pending[1], 1, pending[0], os.path.basename(path))
+
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            m = LOG_RE.search(line)
+            if m:
+                flush()
+                pending = [float(m.group(1)), m.group(2)]
+            elif pending and line[:1] in (" ", "\t"):
+                pending[1] += " " + line.strip()
+            else:
+                flush()
+                pending = None
+                if line.strip():
+                    workload.add(line.strip(), 1, None, os.path.basename(path))
+    flush()
+
+
+def capture_tools(workload, pattern):
+    """String literals that look like tenant-scoped SQL in the tools/ scripts (f-strings are skipped)."""
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                workload.add(node.value, 1, None, os.path.basename(path))
+
+
+def shape(sql):
+    """Table, alias, conditions (column, op, param) and ORDER BY columns for the first FROM table; None if unparseable."""
+    m = FROM_RE.search(sql)
+    if not m:
+        return None
+    table, alias = m.group(1), m.group(2)
+    joined = re.search(r"\bJOIN\b", sql, re.I) is not None
+
+    def own(qualifier):
+        return qualifier == alias if qualifier else not joined
+
+    conds = [(col, op.upper(), int(n)) for q, col, op, n in COND_RE.findall(sql) if own(q)]
+    order = []
+    om = ORDER_RE.search(sql)
+    if om:
+        for part in om.group(1).split(","):
+            cm = ORDER_COL_RE.match(part.strip())
+            if not cm or not own(cm.group(1)):
+                order = []
+                break
+            order.append((cm.group(2), (cm.group(3) or "ASC").upper()))
+    return {"table": table, "conds": conds, "order": order}
+
+
+def candidates(info):
+    """Composite indexes for one query: equality columns (TenantId first), then the sort or the first range column."""
+    eq = []
+    for col, op, _ in info["conds"]:
+        if op == "=" and col not in eq:
+            eq.append(col)
+    if "TenantId" not in eq:
+        return []
+    eq.sort(key=lambda c: c != "TenantId")
+    ranges = [col for col, op, _ in info["conds"] if op in (">", ">=", "<", "<=", "BETWEEN") and col not in eq]
+    out = [tuple((c, "ASC") for c in eq)]
+    order = [(c, d) for c, d in info["order"] if c not in eq]
+    if order:
+        out.append(tuple((c, "ASC") for c in eq) + tuple(order))
+    if ranges:
+        out.append(tuple((c, "ASC") for c in eq) + ((ranges[0], "ASC"),))
+    return out
+
+
+def index_ddl(table, cols, concurrently=False):
+    name = "IX_" + table + "_" + "_".join(c for c, _ in cols)
+    body = ", ".join(f'"{c}"' + (" DESC" if d == "DESC" else "") for c, d in cols)
+    return f'CREATE INDEX {"CONCURRENTLY " if concurrently else ""}IF NOT EXISTS "{name[:63]}" ON public."{table}" ({body})'
+
+
+def existing_indexes(conn, table):
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT array_agg(a.attname ORDER BY k.ord) FROM pg_index i "
+            "CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY k(attnum, ord) "
+            "LEFT JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum "
+            "WHERE i.indrelid = %s::regclass GROUP BY i.indexrelid", [f'public."{table}"'])
+        return [list(r[0]) for r in cur.fetchall()]
+
+
+def covered(cols, existing):
+    names = [c for c, _ in cols]
+    return any(idx[:len(names)] == names for idx in existing)
+
+
+class Sampler:
+    """Representative parameter values: the most common value from pg_stats (biggest tenant), else any non-null row."""
+
+    def __init__(self, conn, limit):
+        self.conn = conn
+        self.limit = limit
+        self.cache = {}
+
+    def value(self, table, col):
+        key = (table, col)
+        if key not in self.cache:
+            with self.conn.cursor() as cur:
+                cur.execute("SELECT (most_common_vals::text::text[])[1] FROM pg_stats WHERE schemaname = 'public' AND tablename = %s AND attname = %s", [table, col])
+                row = cur.fetchone()
+                if not row or row[0] is None:
+                    cur.execute(f'SELECT "{col}"::text FROM public."{table}" WHERE "{col}" IS NOT NULL LIMIT 1')
+                    row = cur.fetchone()
+            self.cache[key] = row[0] if row else None
+        return self.cache[key]
+
+    def bind(self, sql, info):
+        """Replace $n placeholders with sampled literals; None when a placeholder can't be resolved."""
+        values = {}
+        for col, _, n in info["conds"]:
+            values.setdefault(n, self.value(info["table"], col))
+        for m in re.finditer(r"\b(LIMIT|OFFSET)\s+\$(\d+)", sql, re.I):
+            values[int(m.group(2))] = self.limit if m.group(1).upper() == "LIMIT" else 0
+        # "col" = ANY($n) takes an array: bind a one-element array literal, left untyped like the scalars so
+        # the server casts it to the column's array type
+        for m in re.finditer(r"\bANY\s*\(\s*\$(\d+)", sql, re.I):
+            n = int(m.group(1))
+            if values.get(n) is not None:
+                values[n] = '{"' + str(values[n]).replace("\\", "\\\\").replace('"', '\\"') + '"}'
+        params = []
+        for m in re.finditer(r"\$(\d+)", sql):
+            value = values.get(int(m.group(1)))
+            if value is None:
+                return None
+            params.append(value)
+        return re.sub(r"\$\d+", "%s", sql.replace("%", "%%")), params
+
+
+def plan_cost(conn, sql, params):
+    with conn.cursor() as cur:
+        cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+        plan = cur.fetchone()[0][0]["Plan"]
+    return plan["Total Cost"], plan["Node Type"]
+
+
+class HypotheticalIndexes:
+    """HypoPG when the extension is available (created inside the session transaction), else optionally real indexes in a rolled-back transaction."""
+
+    def __init__(self, conn, materialize):
+        self.conn = conn
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'hypopg'")
+            self.hypopg = cur.fetchone() is not None
+            if self.hypopg:
+                cur.execute("CREATE EXTENSION IF NOT EXISTS hypopg")
+        if not self.hypopg and not materialize:
+            raise SystemExit("hypopg extension not available. Install it, or pass --materialize to build each candidate for real inside a rolled-back transaction")
+        self.mode = "hypopg" if self.hypopg else "materialize"
+
+    def create(self, ddl):
+        with self.conn.cursor() as cur:
+            if self.hypopg:
+                cur.execute("SELECT indexrelid FROM hypopg_create_index(%s)", [ddl.replace("IF NOT EXISTS ", "")])
+                oid = cur.fetchone()[0]
+                cur.execute("SELECT hypopg_relation_size(%s)", [oid])
+                return cur.fetchone()[0]
+            cur.execute("SAVEPOINT advisor_candidate")
+            cur.execute(ddl)
+            cur.execute("SELECT pg_relation_size(%s::regclass)", ['public."' + re.search(r'EXISTS "([^"]+)"', ddl).group(1) + '"'])
+            return cur.fetchone()[0]
+
+    def drop(self):
+        with self.conn.cursor() as cur:
+            if self.hypopg:
+                cur.execute("SELECT hypopg_reset()")
+            else:
+                cur.execute("ROLLBACK TO SAVEPOINT advisor_candidate")
+
+
+def advise(conn, workload, materialize, limit):
+    sampler = Sampler(conn, limit)
+    queries, skipped = {}, 0
+    for key, entry in workload.statements.items():
+        info = shape(entry["example"])
+        bound = sampler.bind(entry["example"], info) if info else None
+        if not bound:
+            skipped += 1
+            continue
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SAVEPOINT advisor_base")
+            base, node = plan_cost(conn, *bound)
+        except Exception:
+            with conn.cursor() as cur:
+                cur.execute("ROLLBACK TO SAVEPOINT advisor_base")
+            skipped += 1
+            continue
+        queries.setdefault(info["table"], []).append({"key": key, "entry": entry, "info": info, "bound": bound, "base": base, "node": node})
+
+    hypo = HypotheticalIndexes(conn, materialize)
+    results = []
+    for table, qs in sorted(queries.items()):
+        existing = existing_indexes(conn, table)
+        cands = {c for q in qs for c in candidates(q["info"]) if not covered(c, existing)}
+        for cols in sorted(cands):
+            ddl = index_ddl(table, cols)
+            size = hypo.create(ddl)
+            helped, cost_saved, ms_saved = [], 0.0, 0.0
+            for q in qs:
+                cost, node = plan_cost(conn, *q["bound"])
+                if cost < q["base"] * 0.95:
+                    fraction = (q["base"] - cost) / q["base"]
+                    cost_saved += (q["base"] - cost) * q["entry"]["calls"]
+                    if q["entry"]["total_ms"] is not None:
+                        ms_saved += fraction * q["entry"]["total_ms"]
+                    helped.append({"query": q["key"], "calls": q["entry"]["calls"], "cost_before": round(q["base"], 2),
+                                   "cost_after": round(cost, 2), "plan_before": q["node"], "plan_after": node})
+            hypo.drop()
+            if helped:
+                results.append({"table": table, "ddl": index_ddl(table, cols, concurrently=True), "bytes": size,
+                                "cost_saved": round(cost_saved, 2), "ms_saved": round(ms_saved, 1), "queries": helped})
+    conn.rollback()
+    # Measured time beats planner cost units when pg_stat_statements supplied it; per byte of index breaks ties
+    results.sort(key=lambda r: (-r["ms_saved"], -r["cost_saved"], r["bytes"]))
+    return results, hypo.mode, skipped, sum(len(qs) for qs in queries.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalise tenant-scoped queries and rank candidate composite indexes by hypothetical-index EXPLAIN")
+    parser.add_argument("--conn", default=os.environ.get("STAYBOT_CONN"), help="PostgreSQL connection string (or set STAYBOT_CONN)")
+    parser.add_argument("--pgss", action="store_true", help="Capture the workload from pg_stat_statements")
+    parser.add_argument("--min-calls", type=int, default=5, help="pg_stat_statements: ignore rarer statements")
+    parser.add_argument("--log", action="append", default=[], help="Postgres log (log_min_duration_statement) or plain SQL file; repeatable")
+    parser.add_argument("--scan-tools", action="store_true", help="Capture the SQL literals in tools/*.py")
+    parser.add_argument("--materialize", action="store_true", help="Without hypopg, build candidates for real inside a rolled-back transaction (takes SHARE locks)")
+    parser.add_argument("--limit-value", type=int, default=100, help="Value bound to LIMIT placeholders")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--sql", help="Write the recommended CREATE INDEX CONCURRENTLY statements here")
+    parser.add_argument("--json", help="Write the full ranked report here")
+    parser.add_argument("--workload-only", action="store_true", help="Print the normalised workload and exit")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    if not args.conn:
+        raise SystemExit("Missing --conn or STAYBOT_CONN")
+    if not (args.pgss or args.log or args.scan_tools):
+        args.scan_tools = True
+
+    conn = connect(args.conn)
+    workload = Workload()
+    if args.pgss:
+        capture_pgss(conn, workload, args.min_calls)
+    for path in args.log:
+        capture_log(path, workload)
+    if args.scan_tools:
+        capture_tools(workload, os.path.join(os.path.dirname(os.path.abspath(__file__)), "*.py"))
+    print(f"Captured {len(workload.statements)} distinct tenant-scoped statements")
+    if args.workload_only:
+        for key, entry in sorted(workload.statements.items(), key=lambda kv: -kv[1]["calls"]):
+            print(f"{entry['calls']:>8}  {key[:140]}")
+        conn.close()
+        return
+
+    try:
+        results, mode, skipped, explained = advise(conn, workload, args.materialize, args.limit_value)
+    finally:
+        conn.close()
+    print(f"Explained {explained} statements ({skipped} skipped: unparsed, unbound placeholders or failing EXPLAIN); candidates via {mode}")
+    if not results:
+        print("No candidate index lowers any plan cost")
+    for rank, r in enumerate(results[:args.top], 1):
+        saved = f"{r['ms_saved']:.1f} ms" if r["ms_saved"] else "-"
+        print(f"\n#{rank} {r['ddl']}")
+        print(f"    size ~{r['bytes'] / 1e6:.2f} MB, cost saved {r['cost_saved']:.0f} (calls x plan cost), time saved {saved}, helps {len(r['queries'])} statement(s)")
+        for q in r["queries"][:3]:
+            print(f"    {q['plan_before']} {q['cost_before']} -> {q['plan_after']} {q['cost_after']}: {q['query'][:100]}")
+    if args.sql and results:
+        with open(args.sql, "w", encoding="utf-8") as f:
+            for r in results[:args.top]:
+                f.write(r["ddl"] + ";\n")
+        print(f"\nWrote {args.sql}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"mode": mode, "recommendations": results}, f, indent=2)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,7 @@ Uses ACME protocol with DNS-01 challenge for wildcard domains
 import json
 import os
 import time
+import argparse
 from datetime import datetime, timedelta
 from cryptography import x509
 from cryptography.hazmat.primitives import hashes, serialization
@@ -17,6 +18,8 @@ import josepy as jose
 from acme import client, messages, challenges
 import requests
 
+from tracing import add_trace_args, span, start_from_args, traced, wrap_methods
+
 # Configuration
 DOMAIN = "staybot.co.za"
 WILDCARD_DOMAIN = f"*.{DOMAIN}"
@@ -28,6 +31,7 @@ OUTPUT_DIR = "C:/certbot/certificates"
 ACME_DIRECTORY = "https://acme-v02.api.letsencrypt.org/directory"  # Production
 
 
+@traced("acme")
 def generate_private_key():
     """Generate a new RSA private key"""
     return rsa.generate_private_key(
@@ -37,6 +41,7 @@ def generate_private_key():
     )
 
 
+@traced("acme")
 def generate_csr(private_key, domains):
     """Generate a Certificate Signing Request"""
     subject = x509.Name([
@@ -58,6 +63,7 @@ def generate_csr(private_key, domains):
     return csr
 
 
+@traced("acme")
 def create_acme_client(account_key):
     """Create ACME client"""
     net = client.ClientNetwork(account_key)
@@ -65,6 +71,7 @@ def create_acme_client(account_key):
     return client.ClientV2(directory, net)
 
 
+@traced("acme")
 def register_account(acme_client, account_key):
     """Register account with Let's Encrypt"""
     registration = messages.NewRegistration.from_data(
@@ -87,6 +94,7 @@ def register_account(acme_client, account_key):
         raise
 
 
+@traced("acme")
 def get_dns_challenge(acme_client, order, domain):
     """Get DNS-01 challenge for a domain"""
     for authz in order.authorizations:
@@ -144,6 +152,7 @@ def main():
     # Create ACME client
     print("Connecting to Let's Encrypt...")
     acme_client = create_acme_client(account_key)
+    wrap_methods(acme_client, ["new_order", "answer_challenge", "poll_and_finalize"], "acme")
 
     # Register account
     print("Registering account...")
@@ -286,14 +295,15 @@ Press ENTER when you have added the DNS record(s)...
 
     # Use openssl command to create PFX
     import subprocess
-    subprocess.run([
-        "openssl", "pkcs12", "-export",
-        "-out", pfx_path,
-        "-inkey", key_path,
-        "-in", cert_path,
-        "-certfile", fullchain_path,
-        "-passout", f"pass:{pfx_password}"
-    ], check=True)
+    with span("openssl pkcs12", "acme"):
+        subprocess.run([
+            "openssl", "pkcs12", "-export",
+            "-out", pfx_path,
+            "-inkey", key_path,
+            "-in", cert_path,
+            "-certfile", fullchain_path,
+            "-passout", f"pass:{pfx_password}"
+        ], check=True)
 
     print(f"  - certificate.pfx   (for Azure, password: {pfx_password})")
 
@@ -309,4 +319,7 @@ az webapp config ssl upload \\
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Let's Encrypt wildcard certificate via DNS-01")
+    add_trace_args(parser)
+    start_from_args(parser.parse_args())
     main()
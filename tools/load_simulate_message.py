@@ -0,0 +1,168 @@
+import os
+import time
+import json
+import random
+import asyncio
+import argparse
+
+from loadstats import Stats, print_rows
+from seed_demo_data import connect, INTENT_CORPUS
+from tracing import add_trace_args, start_from_args
+from utterance_corpus import Corpus
+
+try:
+    import aiohttp
+except Exception:
+    aiohttp = None
+
+
+def load_guests_from_db(conn_str, tenant_ids=None):
+    """(tenant_id, phone) pairs from Bookings plus the enabled IntentSettings per tenant."""
+    conn = connect(conn_str)
+    guests = []
+    intents = {}
+    try:
+        with conn.cursor() as cur:
+            sql = 'SELECT DISTINCT "TenantId", "Phone" FROM public."Bookings" WHERE COALESCE("Phone", \'\') <> \'\''
+            params = []
+            if tenant_ids:
+                sql += ' AND "TenantId" = ANY(%s)'
+                params.append(tenant_ids)
+            cur.execute(sql, params)
+            guests = [(r[0], r[1]) for r in cur.fetchall()]
+            cur.execute('SELECT "TenantId", "IntentName", "Priority" FROM public."IntentSettings" WHERE "IsEnabled"')
+            for tenant_id, name, priority in cur.fetchall():
+                intents.setdefault(tenant_id, []).append((name, priority or 0))
+    finally:
+        conn.close()
+    return guests, intents
+
+
+def synth_guests(tenant_ids, per_tenant):
+    # Same +27 shape as the real guests in run_tests.sh; the 600 prefix keeps them out of real ranges
+    return [(t, f"+27600{t:03d}{i:04d}") for t in tenant_ids for i in range(per_tenant)]
+
+
+def intent_mix(db_intents, only=None):
+    """Weights per corpus intent: IntentSettings priority (+1) summed over tenants, uniform otherwise."""
+    weights = {}
+    for rows in (db_intents or {}).values():
+        for name, priority in rows:
+            key = name if name in INTENT_CORPUS else name.upper() if name.upper() in INTENT_CORPUS else None
+            if key:
+                weights[key] = weights.get(key, 0) + max(priority, 0) + 1
+    if not weights:
+        weights = {k: 1 for k in INTENT_CORPUS}
+    if only:
+        weights = {k: v for k, v in weights.items() if k in only}
+    return weights
+
+
+async def conversation_worker(session, url, guests, weights, phrases, stats, stop_at, turns, think, rng):
+    names = list(weights)
+    w = [weights[n] for n in names]
+    while time.monotonic() < stop_at:
+        tenant_id, phone = rng.choice(guests)
+        for _ in range(turns):
+            if time.monotonic() >= stop_at:
+                return
+            intent = rng.choices(names, w)[0]
+            texts, cum_weights = phrases[intent]
+            payload = {"tenantId": tenant_id, "phoneNumber": phone, "messageText": rng.choices(texts, cum_weights=cum_weights)[0]}
+            started = time.perf_counter()
+            try:
+                async with session.post(url, json=payload) as resp:
+                    await resp.read()
+                    ok = resp.status == 200
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                ok = False
+            stats.record(intent, time.perf_counter() - started, ok)
+            if think:
+                await asyncio.sleep(rng.uniform(0, think))
+
+
+async def run_level(base_url, guests, weights, phrases, concurrency, duration, turns, think, timeout, seed):
+    url = base_url.rstrip("/") + "/api/test/simulate-message"
+    stats = Stats()
+    # One pooled session per level; the connector caps open sockets at the concurrency level
+    connector = aiohttp.TCPConnector(limit=concurrency, keepalive_timeout=30)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        started = time.monotonic()
+        stop_at = started + duration
+        workers = []
+        for i in range(concurrency):
+            # Each worker owns a disjoint slice of guests so one phone never has two turns in flight
+            mine = guests[i::concurrency]
+            workers.append(conversation_worker(session, url, mine, weights, phrases, stats, stop_at, turns, think, random.Random(seed + i)))
+        await asyncio.gather(*workers)
+        elapsed = time.monotonic() - started
+    return stats, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent guest conversations against /api/test/simulate-message")
+    parser.add_argument("--base-url", default=os.environ.get("STAYBOT_API", "http://localhost:5000"), help="API base URL (or set STAYBOT_API)")
+    parser.add_argument("--conn", default=os.environ.get("STAYBOT_CONN"), help="PostgreSQL connection string for seeded guests/intents (or set STAYBOT_CONN)")
+    parser.add_argument("--tenant-ids", default="1", help="Comma-separated tenant ids")
+    parser.add_argument("--guests-per-tenant", type=int, default=50, help="Synthetic guests per tenant when no Bookings phones are available")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="Comma-separated concurrent conversation levels, run in order")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds per concurrency level")
+    parser.add_argument("--turns", type=int, default=3, help="Messages per conversation")
+    parser.add_argument("--think", type=float, default=0.0, help="Max random pause between turns (seconds)")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-request timeout (seconds)")
+    parser.add_argument("--intents", help="Comma-separated subset of intents to send")
+    parser.add_argument("--corpus", help="Mined utterance corpus (utterance_corpus.py mine): send real guest phrasing in its observed intent mix")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", dest="json_out", help="Write per-level results to this file")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    if not aiohttp:
+        raise SystemExit("aiohttp not installed. Run: python -m pip install --user aiohttp")
+
+    tenant_ids = [int(t) for t in args.tenant_ids.split(",") if t.strip()]
+    guests, db_intents = [], {}
+    if args.conn:
+        guests, db_intents = load_guests_from_db(args.conn, tenant_ids)
+    if not guests:
+        guests = synth_guests(tenant_ids, args.guests_per_tenant)
+    only = set(args.intents.split(",")) if args.intents else None
+    if args.corpus:
+        corpus = Corpus(args.corpus)
+        weights, phrases = corpus.mix({i.upper() for i in only} if only else None), corpus.phrases()
+        corpus.close()
+    else:
+        weights = intent_mix(db_intents, only=only)
+        phrases = {k: (v, list(range(1, len(v) + 1))) for k, v in INTENT_CORPUS.items()}
+    if not weights:
+        raise SystemExit("No intents left to send")
+    print(f"{len(guests)} guests across {len({g[0] for g in guests})} tenants; intent mix: {weights}")
+
+    levels = [int(c) for c in args.concurrency.split(",") if c.strip()]
+    if max(levels, default=0) > len(guests):
+        # Workers would have to share phones, and per-conversation locking would show up as latency
+        raise SystemExit(f"Concurrency {max(levels)} exceeds the {len(guests)} guests; every worker needs its own phones "
+                         "(raise --guests-per-tenant or lower --concurrency)")
+
+    results = []
+    for level in levels:
+        stats, elapsed = asyncio.run(run_level(args.base_url, guests, weights, phrases, level, args.duration, args.turns, args.think, args.timeout, args.seed))
+        rows = stats.rows(elapsed)
+        print(f"\n== concurrency {level} ({elapsed:.1f}s)")
+        print_rows(rows, label_title="intent")
+        results.append({"concurrency": level, "elapsed_s": elapsed, "intents": rows})
+
+    print("\nconcurrency     rps   p95 ms   err%")
+    for r in results:
+        total = r["intents"][-1]
+        print(f"{r['concurrency']:>11} {total['rps']:>7.2f} {total['p95_ms']:>8.1f} {100 * total['error_rate']:>5.1f}%")
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written: {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import os
+import time
+import zlib
+import sqlite3
+import hashlib
+import argparse
+
+from logdump import DEFAULT_ROOT, find_dumps, iter_files, rel
+from tracing import add_trace_args, start_from_args
+
+# Line blocks are content-defined: a block ends on a line whose crc32 has the low bits clear,
+# so an appended or re-extracted log produces the same block boundaries as the earlier copy.
+BOUNDARY_MASK = 0x1F      # ~32 lines per block on average
+MAX_BLOCK_BYTES = 64 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, dump TEXT NOT NULL, size INTEGER NOT NULL, mtime REAL NOT NULL,
+    digest TEXT NOT NULL, new_bytes INTEGER NOT NULL, ingested_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_files_dump ON files (dump);
+CREATE TABLE IF NOT EXISTS blobs (digest TEXT PRIMARY KEY, size INTEGER NOT NULL, first_path TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS blocks (digest BLOB PRIMARY KEY, size INTEGER NOT NULL);
+"""
+
+
+def open_index(path):
+    db = sqlite3.connect(path)
+    db.executescript(SCHEMA)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+def split_blocks(path):
+    """Return (file_digest, [(block_digest, offset, length), ...]) in a single read of the file."""
+    file_hash = hashlib.blake2b(digest_size=16)
+    blocks = []
+    block_hash = hashlib.blake2b(digest_size=16)
+    start = pos = 0
+    with open(path, "rb") as f:
+        for line in f:
+            file_hash.update(line)
+            block_hash.update(line)
+            pos += len(line)
+            if (zlib.crc32(line) & BOUNDARY_MASK) == 0 or pos - start >= MAX_BLOCK_BYTES:
+                blocks.append((block_hash.digest(), start, pos - start))
+                block_hash = hashlib.blake2b(digest_size=16)
+                start = pos
+    if pos > start:
+        blocks.append((block_hash.digest(), start, pos - start))
+    return file_hash.hexdigest(), blocks
+
+
+def ingest_file(db, path, key, dump, on_new_block=None):
+    """Index one file under key; returns (status, new_bytes) where status is unchanged/duplicate/new.
+
+    on_new_block(path, offset, length) is called for every line block not seen in any earlier
+    file, so downstream processing only ever touches previously unseen bytes.
+    """
+    st = os.stat(path)
+    row = db.execute("SELECT size, mtime FROM files WHERE path=?", [key]).fetchone()
+    if row and row[0] == st.st_size and row[1] == st.st_mtime:
+        return "unchanged", 0
+
+    digest, blocks = split_blocks(path)
+    new_bytes = 0
+    if db.execute("SELECT 1 FROM blobs WHERE digest=?", [digest]).fetchone():
+        status = "duplicate"
+    else:
+        status = "new"
+        db.execute("INSERT INTO blobs (digest, size, first_path) VALUES (?,?,?)", [digest, st.st_size, key])
+        for block_digest, offset, length in blocks:
+            cur = db.execute("INSERT OR IGNORE INTO blocks (digest, size) VALUES (?,?)", [block_digest, length])
+            if cur.rowcount:
+                new_bytes += length
+                if on_new_block:
+                    on_new_block(path, offset, length)
+    db.execute(
+        "INSERT OR REPLACE INTO files (path, dump, size, mtime, digest, new_bytes, ingested_at) VALUES (?,?,?,?,?,?,?)",
+        [key, dump, st.st_size, st.st_mtime, digest, new_bytes, time.time()],
+    )
+    return status, new_bytes
+
+
+def ingest(db, dumps, root=DEFAULT_ROOT, on_new_block=None, verbose=False):
+    totals = {"unchanged": 0, "duplicate": 0, "new": 0}
+    new_bytes = read_bytes = 0
+    started = time.perf_counter()
+    for dump in dumps:
+        dump_rel = rel(dump, root)
+        for path in iter_files([dump], nested_dumps=False):
+            # Keys are relative to the repo root so the index survives moving the checkout
+            status, added = ingest_file(db, path, rel(path, root), dump_rel, on_new_block=on_new_block)
+            totals[status] += 1
+            new_bytes += added
+            if status != "unchanged":
+                read_bytes += os.path.getsize(path)
+            if verbose and status != "unchanged":
+                print(f"[ingest] {status:9} {added:>10} new bytes  {rel(path, root)}")
+        db.commit()
+    elapsed = time.perf_counter() - started
+    return totals, read_bytes, new_bytes, elapsed
+
+
+def report(db):
+    rows = db.execute(
+        "SELECT dump, COUNT(*), SUM(size), SUM(new_bytes) "
+        "FROM files GROUP BY dump ORDER BY dump"
+    ).fetchall()
+    print(f"{'dump':40} {'files':>7} {'bytes':>12} {'unique':>12} {'redundant':>10}")
+    total_size = total_new = 0
+    for dump, files, size, new in rows:
+        size = size or 0
+        new = new or 0
+        total_size += size
+        total_new += new
+        pct = 100.0 * (1 - new / size) if size else 0.0
+        flag = "  (fully redundant)" if size and new == 0 else ""
+        print(f"{dump:40} {files:>7} {size:>12} {new:>12} {pct:>9.1f}%{flag}")
+    pct = 100.0 * (1 - total_new / total_size) if total_size else 0.0
+    print(f"{'TOTAL':40} {'':>7} {total_size:>12} {total_new:>12} {pct:>9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed dedup index over the extracted Azure log dumps")
+    parser.add_argument("command", choices=["ingest", "report"], help="ingest new dumps, or report redundancy per dump")
+    parser.add_argument("dumps", nargs="*", help="Dump directories to ingest (default: every azure_logs*/api_logs* dump)")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="Repository root the dumps live under")
+    parser.add_argument("--index", default=None, help="SQLite index path (default: <root>/log_index.sqlite)")
+    parser.add_argument("--verbose", action="store_true", help="Print one line per file read")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    root = os.path.abspath(args.root)
+    db = open_index(args.index or os.path.join(root, "log_index.sqlite"))
+    try:
+        if args.command == "ingest":
+            dumps = [os.path.abspath(d) for d in args.dumps] or find_dumps(root)
+            if not dumps:
+                raise SystemExit(f"No log dumps found under {root}")
+            totals, read_bytes, new_bytes, elapsed = ingest(db, dumps, root=root, verbose=args.verbose)
+            print(
+                f"Ingested {len(dumps)} dumps in {elapsed:.2f}s: {totals['new']} new, {totals['duplicate']} duplicate, "
+                f"{totals['unchanged']} unchanged files | read {read_bytes} bytes, {new_bytes} previously unseen"
+            )
+        report(db)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
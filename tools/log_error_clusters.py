@@ -0,0 +1,226 @@
+import os
+import re
+import json
+import hashlib
+import argparse
+from datetime import datetime, timedelta
+
+from logdump import DEFAULT_ROOT, find_dumps, iter_files, read_deployments, rel
+from tracing import add_trace_args, start_from_args
+
+try:
+    import xxhash
+except Exception:
+    xxhash = None
+
+ENTRY_START = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})\s*$")
+LOG_NAME = re.compile(r"^(?P<instance>[0-9a-f]+)-(?P<pid>\d+)-logging-errors\.txt$")
+
+# Order matters: GUIDs and timestamps first so their digits are not mistaken for phone numbers
+NORMALIZERS = [
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<guid>"),
+    (re.compile(r"\b[0-9a-fA-F]{32}\b"), "<guid>"),
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?Z?"), "<ts>"),
+    (re.compile(r"\d{1,2}/\d{1,2}/\d{4} \d{1,2}:\d{2}:\d{2}(?: [AP]M)?"), "<ts>"),
+    (re.compile(r"PID\[\d+\]|ProcessId[=: ]\s*\d+|\bpid[=: ]\s*\d+", re.IGNORECASE), "PID[<pid>]"),
+    (re.compile(r"(tenant(?:_?id)?[\"']?\s*[=:]?\s*[\"']?)\d+", re.IGNORECASE), r"\1<tenant>"),
+    (re.compile(r"(?:\+|\b)\d{10,15}\b"), "<phone>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b"), "<hex>"),
+    (re.compile(r":line \d+"), ":line <n>"),
+]
+
+MAX_ENTRY_LINES = 200
+
+
+def normalize(text):
+    for pattern, repl in NORMALIZERS:
+        text = pattern.sub(repl, text)
+    return text
+
+
+def fingerprint(text):
+    if xxhash:
+        return xxhash.xxh64_hexdigest(text.encode("utf-8"))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def iter_entries(path):
+    """Yield (timestamp, [lines]) for each exception entry of a *-logging-errors.txt file."""
+    ts = None
+    lines = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for raw in f:
+            line = raw.rstrip("\r\n")
+            m = ENTRY_START.match(line)
+            if m:
+                if ts and lines:
+                    yield ts, lines
+                ts = datetime.strptime(m.group(1), "%Y-%m-%dT%H:%M:%S")
+                lines = []
+            elif ts and line.strip() and len(lines) < MAX_ENTRY_LINES:
+                lines.append(line.strip())
+    if ts and lines:
+        yield ts, lines
+
+
+def signature_of(lines, frames):
+    # Exception header plus the top stack frames; deeper frames mostly vary with the caller
+    head = [lines[0]] + [l for l in lines[1:] if l.startswith("at ")][:frames]
+    return normalize("\n".join(head))
+
+
+class Clusters:
+    """Streaming aggregate keyed by fingerprint; memory is bounded by max_signatures x hours seen."""
+
+    def __init__(self, frames=8, max_signatures=5000):
+        self.frames = frames
+        self.max_signatures = max_signatures
+        self.sigs = {}
+        self.overflow = 0
+        # Highest timestamp consumed per <instance>-<pid> log, so the same log copied into
+        # several dumps is only counted once
+        self.watermarks = {}
+        self.entries = 0
+        self.duplicates = 0
+
+    def add_file(self, path):
+        m = LOG_NAME.match(os.path.basename(path))
+        instance = m.group("instance") if m else "unknown"
+        key = os.path.basename(path)
+        mark = self.watermarks.get(key)
+        newest = mark
+        for ts, lines in iter_entries(path):
+            if mark and ts <= mark:
+                self.duplicates += 1
+                continue
+            newest = ts if not newest or ts > newest else newest
+            self.add(ts, instance, lines)
+        if newest:
+            self.watermarks[key] = newest
+
+    def add(self, ts, instance, lines):
+        self.entries += 1
+        sig = signature_of(lines, self.frames)
+        fp = fingerprint(sig)
+        s = self.sigs.get(fp)
+        if s is None:
+            if len(self.sigs) >= self.max_signatures:
+                self.overflow += 1
+                return
+            s = self.sigs[fp] = {
+                "fingerprint": fp, "title": sig.split("\n", 1)[0][:200], "signature": sig,
+                "count": 0, "first_seen": ts, "last_seen": ts, "instances": {}, "hourly": {},
+            }
+        s["count"] += 1
+        s["first_seen"] = min(s["first_seen"], ts)
+        s["last_seen"] = max(s["last_seen"], ts)
+        s["instances"][instance] = s["instances"].get(instance, 0) + 1
+        hour = ts.replace(minute=0, second=0)
+        s["hourly"][hour] = s["hourly"].get(hour, 0) + 1
+
+    def ranked(self):
+        return sorted(self.sigs.values(), key=lambda s: s["count"], reverse=True)
+
+
+def daily(sig):
+    days = {}
+    for hour, n in sig["hourly"].items():
+        day = hour.date().isoformat()
+        days[day] = days.get(day, 0) + n
+    return dict(sorted(days.items()))
+
+
+def trend(sig, recent_days=3):
+    """Ratio of the daily rate over the last recent_days to the rate before them (None if no history)."""
+    days = daily(sig)
+    if len(days) < 2:
+        return None
+    last = datetime.strptime(max(days), "%Y-%m-%d").date()
+    cutoff = last - timedelta(days=recent_days - 1)
+    recent = sum(n for d, n in days.items() if datetime.strptime(d, "%Y-%m-%d").date() >= cutoff)
+    before_days = [d for d in days if datetime.strptime(d, "%Y-%m-%d").date() < cutoff]
+    if not before_days:
+        return None
+    first = datetime.strptime(min(before_days), "%Y-%m-%d").date()
+    span = max((cutoff - first).days, 1)
+    before = sum(days[d] for d in before_days)
+    return (recent / recent_days) / (before / span)
+
+
+def deployment_spikes(clusters, deployments, window_hours=24, top=5):
+    window = timedelta(hours=window_hours)
+    out = []
+    for dep in deployments:
+        at = dep["end"] or dep["received"]
+        if not at:
+            continue
+        rows = []
+        for s in clusters.sigs.values():
+            before = sum(n for h, n in s["hourly"].items() if at - window <= h < at)
+            after = sum(n for h, n in s["hourly"].items() if at <= h < at + window)
+            if after > before:
+                rows.append({"fingerprint": s["fingerprint"], "title": s["title"], "before": before, "after": after})
+        rows.sort(key=lambda r: r["after"] - r["before"], reverse=True)
+        out.append({"deployment": dep["id"], "at": at.isoformat(), "spikes": rows[:top]})
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fingerprint and cluster exceptions from *-logging-errors.txt across all log dumps")
+    parser.add_argument("dumps", nargs="*", help="Dump directories (default: every azure_logs*/api_logs* dump)")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="Repository root the dumps live under")
+    parser.add_argument("--frames", type=int, default=8, help="Stack frames included in a signature")
+    parser.add_argument("--max-signatures", type=int, default=5000, help="Cap on distinct signatures kept in memory")
+    parser.add_argument("--top", type=int, default=20, help="Signatures to print")
+    parser.add_argument("--window-hours", type=int, default=24, help="Before/after window around each deployment")
+    parser.add_argument("--json", dest="json_out", help="Write the full report (with daily series) to this file")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    root = os.path.abspath(args.root)
+    dumps = [os.path.abspath(d) for d in args.dumps] or find_dumps(root)
+    clusters = Clusters(frames=args.frames, max_signatures=args.max_signatures)
+    files = 0
+    for path in iter_files(dumps, suffix="-logging-errors.txt", nested_dumps=False):
+        clusters.add_file(path)
+        files += 1
+
+    print(f"Scanned {files} files in {len(dumps)} dumps: {clusters.entries} entries, {clusters.duplicates} already seen in another dump, "
+          f"{len(clusters.sigs)} signatures" + (f", {clusters.overflow} entries over --max-signatures" if clusters.overflow else ""))
+    print(f"{'fingerprint':16} {'count':>7} {'inst':>4} {'first_seen':19} {'last_seen':19} {'trend':>6}  title")
+    for s in clusters.ranked()[:args.top]:
+        t = trend(s)
+        t_str = f"{t:6.2f}" if t is not None else "     -"
+        print(f"{s['fingerprint']:16} {s['count']:>7} {len(s['instances']):>4} {s['first_seen'].isoformat()} {s['last_seen'].isoformat()} {t_str}  {s['title'][:90]}")
+
+    spikes = deployment_spikes(clusters, read_deployments(dumps), window_hours=args.window_hours)
+    spiking = [d for d in spikes if d["spikes"]]
+    if spiking:
+        print(f"\nErrors up in the {args.window_hours}h after a deployment:")
+        for d in spiking:
+            print(f"  {d['at']} {d['deployment']}")
+            for r in d["spikes"]:
+                print(f"      {r['before']:>5} -> {r['after']:<5} {r['fingerprint']} {r['title'][:80]}")
+
+    if args.json_out:
+        report = {
+            "dumps": [rel(d, root) for d in dumps],
+            "entries": clusters.entries,
+            "signatures": [
+                {
+                    "fingerprint": s["fingerprint"], "title": s["title"], "signature": s["signature"], "count": s["count"],
+                    "first_seen": s["first_seen"].isoformat(), "last_seen": s["last_seen"].isoformat(),
+                    "instances": s["instances"], "daily": daily(s), "trend": trend(s),
+                }
+                for s in clusters.ranked()
+            ],
+            "deployments": spikes,
+        }
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written: {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,417 @@
+import os
+import re
+import sys
+import json
+import mmap
+import time
+import heapq
+import bisect
+import struct
+import argparse
+from array import array
+from datetime import datetime, timedelta
+
+from logdump import DEFAULT_ROOT, find_dumps, iter_files, rel
+from tracing import add_trace_args, span, start_from_args
+
+# A record starts where its timestamp is; everything up to the next record start belongs to it
+# (stack traces, multi-line XML). One pattern per log shape found in the dumps:
+#   text:  2025-12-23T22:21:53  PID[2208] ...                      (Application/, SiteExtensions/, stdout logs)
+#   event: <Event><System>...<TimeCreated SystemTime="..."/>        (eventlog.xml, eventlog.prev.xml)
+#   step:  <step title="..." date="2025-12-23T22:16:42.327" ...>    (kudu/trace/*.xml)
+FORMATS = {
+    "text": re.compile(rb"^(\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?)", re.M),
+    "event": re.compile(rb"<Event><System>[^\n]*?SystemTime=\"([^\"]+)\""),
+    "step": re.compile(rb"<step [^>\n]*?date=\"([^\"]+)\""),
+}
+SKIP_SUFFIXES = (".zip", ".gz", ".png", ".jpg", ".jpeg", ".gif", ".ico", ".exe", ".dll", ".pdb", ".nupkg", ".htm", ".html")
+# Short instance id in file names: 1a2f11-1396-....txt, 2025-12-23T22-16-42_3ffd02_002_POST_....xml
+FILE_INSTANCE = re.compile(r"(?:^|_)([0-9a-f]{6})[-_]")
+# Machine name in file names: kudu/trace/dw1sdwk000MOD-<guid>.txt (the lines never repeat it)
+FILE_MACHINE = re.compile(r"^(dw\w+)-", re.I)
+MACHINE = re.compile(rb"\[(dw\w+)\]|<Computer>(dw\w+)</Computer>", re.I)
+
+MAGIC = b"TSIDX1\0\0"
+# Bumped when entries gain fields; an older catalog.json is rebuilt from scratch
+CATALOG_VERSION = 2
+HEADER = struct.Struct("<8sqqqq")  # magic, size, mtime_ns, blocks, sorted
+EVERY_BYTES = 64 << 10
+
+
+def log_format(path):
+    name = os.path.basename(path).lower()
+    if name.endswith(SKIP_SUFFIXES):
+        return None
+    if name.startswith("eventlog") and name.endswith(".xml"):
+        return "event"
+    if name.endswith(".xml") and os.path.basename(os.path.dirname(path)) == "trace":
+        return "step"
+    return "text"
+
+
+def stamp(value):
+    """'2025-12-23T22:16:42.3270000' -> 20251223221642327: an integer that sorts like the time, no calendar maths."""
+    v = value[:23]
+    seconds = int(v[0:4] + v[5:7] + v[8:10] + v[11:13] + v[14:16] + v[17:19])
+    frac = v[20:23] if v[19:20] in (b".", b",") else b""
+    return seconds * 1000 + (int(frac.ljust(3, b"0")) if frac.isdigit() else 0)
+
+
+def show_stamp(value):
+    s = f"{value:017d}"
+    return f"{s[0:4]}-{s[4:6]}-{s[6:8]}T{s[8:10]}:{s[10:12]}:{s[12:14]}.{s[14:17]}"
+
+
+def parse_when(value, date=None):
+    """2025-12-23T14:02[:30], '2025-12-23 14:02', or just 14:05 (on the --from date)."""
+    value = value.strip().replace(" ", "T")
+    if "T" not in value:
+        if not date:
+            raise SystemExit(f"{value}: give a date, e.g. 2025-12-23T{value}")
+        value = f"{date}T{value}"
+    day, _, clock = value.partition("T")
+    clock = (clock + ":00:00")[:8] if len(clock) < 8 else clock
+    try:
+        return stamp(f"{day}T{clock}".encode())
+    except ValueError:
+        raise SystemExit(f"Cannot read time {value!r}")
+
+
+def sidecar_path(index_dir, root, path):
+    return os.path.join(index_dir, rel(path, root) + ".tsidx")
+
+
+def file_machine(path, data):
+    m = MACHINE.search(data, 0, min(len(data), 4096))
+    return (m.group(1) or m.group(2)).decode().lower() if m else None
+
+
+def build_one(path, fmt, every):
+    """Scan one file once: a block starts at the first record at or past every `every` bytes.
+
+    Per block: offset, min and max stamp, plus the running max from the start and the running min from
+    the end. Both of those are monotonic whatever order the file is in, so a query bisects them for the
+    candidate block range and only then looks at per-block min/max."""
+    offsets, mins, maxs = array("q"), array("q"), array("q")
+    in_order, machine, records = True, None, 0
+    size = os.path.getsize(path)
+    if size:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if b"\0" in mm[:1024]:
+                return None
+            machine = file_machine(path, mm) if fmt == "text" else None
+            previous, next_block = None, 0
+            for m in FORMATS[fmt].finditer(mm):
+                try:
+                    t = stamp(m.group(1))
+                except ValueError:
+                    continue
+                records += 1
+                if m.start() >= next_block:
+                    offsets.append(m.start())
+                    mins.append(t)
+                    maxs.append(t)
+                    next_block = m.start() + every
+                else:
+                    mins[-1] = min(mins[-1], t)
+                    maxs[-1] = max(maxs[-1], t)
+                if previous is not None and t < previous:
+                    in_order = False
+                previous = t
+    reach, floor = array("q", maxs), array("q", mins)
+    for i in range(1, len(reach)):
+        reach[i] = max(reach[i], reach[i - 1])
+    for i in range(len(floor) - 2, -1, -1):
+        floor[i] = min(floor[i], floor[i + 1])
+    return {"offsets": offsets, "mins": mins, "maxs": maxs, "reach": reach, "floor": floor,
+            "sorted": in_order, "machine": machine, "records": records}
+
+
+def write_sidecar(out, stat, index):
+    os.makedirs(os.path.dirname(out), exist_ok=True)
+    tmp = out + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, stat.st_size, stat.st_mtime_ns, len(index["offsets"]), int(index["sorted"])))
+        for key in ("offsets", "mins", "maxs", "reach", "floor"):
+            index[key].tofile(f)
+    os.replace(tmp, out)
+
+
+def read_sidecar(out):
+    with open(out, "rb") as f:
+        data = f.read()
+    magic, size, mtime_ns, blocks, in_order = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        return None
+    cols, pos = {}, HEADER.size
+    for key in ("offsets", "mins", "maxs", "reach", "floor"):
+        cols[key] = array("q")
+        cols[key].frombytes(data[pos:pos + 8 * blocks])
+        pos += 8 * blocks
+    cols.update(size=size, mtime_ns=mtime_ns, sorted=bool(in_order))
+    return cols
+
+
+class Catalog:
+    """catalog.json in the index directory: per log file its size/mtime, format, time range and instance,
+    so a query drops whole files on their range and only opens the sidecars that can match."""
+
+    def __init__(self, root, index_dir):
+        self.root = root
+        self.index_dir = index_dir
+        self.path = os.path.join(index_dir, "catalog.json")
+        self.files = {}
+        if os.path.isfile(self.path):
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+            if saved.get("version") == CATALOG_VERSION:
+                self.files = saved["files"]
+        self.dirty = False
+
+    def fresh(self, path, stat):
+        entry = self.files.get(rel(path, self.root))
+        return entry is not None and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns
+
+    def update(self, path, stat, fmt, index, every):
+        entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "format": fmt, "every": every}
+        if index and index["offsets"]:
+            name = os.path.basename(path)
+            short = FILE_INSTANCE.search(name)
+            named = FILE_MACHINE.match(name)
+            entry.update(first=min(index["mins"]), last=max(index["maxs"]), blocks=len(index["offsets"]),
+                         records=index["records"], sorted=index["sorted"],
+                         machine=index["machine"] or (named.group(1).lower() if named else None),
+                         instance=short.group(1) if short else None)
+            write_sidecar(sidecar_path(self.index_dir, self.root, path), stat, index)
+        self.files[rel(path, self.root)] = entry
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(self.index_dir, exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CATALOG_VERSION, "files": self.files}, f)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+
+def log_files(paths):
+    for path in iter_files(paths, nested_dumps=False):
+        fmt = log_format(path)
+        if fmt and os.path.isfile(path):
+            yield path, fmt
+
+
+def build(catalog, paths, every, force=False):
+    """Index every new or changed file; returns (files indexed, bytes scanned, files up to date)."""
+    indexed, scanned, current = 0, 0, 0
+    for path, fmt in log_files(paths):
+        stat = os.stat(path)
+        entry = catalog.files.get(rel(path, catalog.root))
+        if not force and catalog.fresh(path, stat) and entry.get("every") == every:
+            current += 1
+            continue
+        with span(rel(path, catalog.root), "index"):
+            index = build_one(path, fmt, every)
+        catalog.update(path, stat, fmt, index, every)
+        indexed += 1
+        scanned += stat.st_size
+    catalog.save()
+    return indexed, scanned, current
+
+
+def instance_aliases(catalog, instance):
+    """The machine name plus every short instance id seen on it (DaaS/Kudu file names carry only the short id)."""
+    wanted = instance.lower()
+    aliases = {wanted}
+    for entry in catalog.files.values():
+        if entry.get("instance") and entry.get("machine") in aliases:
+            aliases.add(entry["instance"])
+        if entry.get("instance") == wanted and entry.get("machine"):
+            aliases.add(entry["machine"])
+    return aliases
+
+
+def candidate_blocks(index, lo, hi):
+    """Block numbers that can hold a record in [lo, hi): bisect the running max for the first, the running min for the last."""
+    first = bisect.bisect_left(index["reach"], lo)
+    last = bisect.bisect_left(index["floor"], hi)
+    return [b for b in range(first, last) if index["maxs"][b] >= lo and index["mins"][b] < hi]
+
+
+def window_records(path, fmt, index, lo, hi, match, stats):
+    """(stamp, offset, text) for the records of one file inside [lo, hi), in time order."""
+    blocks = candidate_blocks(index, lo, hi)
+    if not blocks:
+        return
+    pattern = FORMATS[fmt]
+    found = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        offsets = index["offsets"]
+        for b in blocks:
+            start = offsets[b]
+            end = offsets[b + 1] if b + 1 < len(offsets) else len(mm)
+            stats["blocks"] += 1
+            stats["bytes"] += end - start
+            starts = [(m.start(), m.group(1)) for m in pattern.finditer(mm, start, end)]
+            for i, (pos, value) in enumerate(starts):
+                try:
+                    t = stamp(value)
+                except ValueError:
+                    continue
+                if t < lo or t >= hi:
+                    continue
+                stop = starts[i + 1][0] if i + 1 < len(starts) else end
+                text = mm[pos:stop].decode("utf-8", "replace").rstrip()
+                if match(text):
+                    found.append((t, pos, text))
+            if index["sorted"] and index["maxs"][b] >= hi:
+                break
+    if not index["sorted"]:
+        found.sort()
+    yield from found
+
+
+def render(fmt, text, width):
+    """One line per record: the event essentials for eventlog XML, the first line otherwise."""
+    if fmt == "event":
+        fields = dict(re.findall(r"<(EventID|Computer)>([^<]*)<", text))
+        data = re.findall(r"<Data>([^<]*)", text)
+        line = f"{fields.get('EventID', '?')} {fields.get('Computer', '?')} " + " | ".join(d.strip() for d in data[:2])
+    elif fmt == "step":
+        line = re.sub(r"\s+", " ", text.split("\n", 1)[0])
+    elif width == 0:
+        line = text
+    else:
+        # Kudu's *-logging-errors.txt put the timestamp on a line of its own
+        head, _, rest = text.partition("\n")
+        line = f"{head} {rest.lstrip().partition(chr(10))[0]}" if len(head.strip()) <= 23 and rest else head
+    return line if width == 0 or len(line) <= width else line[:width - 3] + "..."
+
+
+def query(catalog, lo, hi, instance=None, grep=None):
+    """Yield (stamp, path, fmt, offset, text) across every indexed file, merged in time order with a heap."""
+    aliases = instance_aliases(catalog, instance) if instance else None
+    text_filter = re.compile(grep) if grep else None
+    stats = {"files": 0, "sidecars": 0, "blocks": 0, "bytes": 0, "stale": 0}
+    streams = []
+    for name, entry in sorted(catalog.files.items()):
+        stats["files"] += 1
+        if "first" not in entry or entry["last"] < lo or entry["first"] >= hi:
+            continue
+        path = os.path.join(catalog.root, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        if stat.st_size != entry["size"] or stat.st_mtime_ns != entry["mtime_ns"]:
+            stats["stale"] += 1
+            continue
+        whole_file = aliases is None or entry.get("machine") in aliases or entry.get("instance") in aliases
+        if not whole_file and entry["format"] != "event" and (entry.get("machine") or entry.get("instance")):
+            continue  # attributed to another instance
+        index = read_sidecar(sidecar_path(catalog.index_dir, catalog.root, path))
+        if not index:
+            stats["stale"] += 1
+            continue
+        stats["sidecars"] += 1
+
+        def match(text, whole_file=whole_file):
+            if not whole_file and not any(a in text.lower() for a in aliases):
+                return False
+            return not text_filter or bool(text_filter.search(text))
+
+        streams.append(tagged(len(streams), name, entry["format"], window_records(path, entry["format"], index, lo, hi, match, stats)))
+    return heapq.merge(*streams), stats
+
+
+def tagged(order, name, fmt, records):
+    for t, pos, text in records:
+        yield t, order, pos, name, fmt, text
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sparse timestamp index over the log dumps: build sidecars once, then seek straight to a time window across every file")
+    parser.add_argument("command", choices=["build", "query"])
+    parser.add_argument("paths", nargs="*", help="Dump directories or files to index (default: every azure_logs*/api_logs* dump)")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="Repository root; the index keeps paths relative to it")
+    parser.add_argument("--index-dir", help="Where sidecars and catalog.json live (default: <root>/tsindex)")
+    parser.add_argument("--every-kb", type=int, default=EVERY_BYTES >> 10, help="Index one timestamp per this many KB")
+    parser.add_argument("--force", action="store_true", help="build: re-index files even if unchanged")
+    parser.add_argument("--from", dest="start", help="query: window start, e.g. 2025-12-23T14:02 (UTC, as logged)")
+    parser.add_argument("--to", dest="end", help="query: window end (exclusive); a bare time uses the --from date")
+    parser.add_argument("--minutes", type=float, default=5, help="query: window length when --to is not given")
+    parser.add_argument("--instance", help="query: only this instance, by machine name (dw0sdwk000JAV) or short id (3ffd02)")
+    parser.add_argument("--grep", help="query: only records matching this regex")
+    parser.add_argument("--width", type=int, default=240, help="query: truncate lines to this many characters (0 = whole records)")
+    parser.add_argument("--limit", type=int, default=0, help="query: stop after this many records")
+    parser.add_argument("--keep-duplicates", action="store_true", help="query: print records repeated across overlapping dumps every time")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    root = os.path.abspath(args.root)
+    catalog = Catalog(root, os.path.abspath(args.index_dir or os.path.join(root, "tsindex")))
+    every = max(1, args.every_kb) << 10
+
+    if args.command == "build":
+        paths = [os.path.abspath(p) for p in args.paths] or find_dumps(root)
+        started = time.perf_counter()
+        indexed, scanned, current = build(catalog, paths, every, args.force)
+        elapsed = time.perf_counter() - started
+        entries = [e for e in catalog.files.values() if "first" in e]
+        blocks = sum(e["blocks"] for e in entries)
+        print(f"Indexed {indexed} file(s), {scanned / 1e6:.1f} MB in {elapsed:.2f}s ({scanned / 1e6 / max(elapsed, 1e-9):.0f} MB/s); "
+              f"{current} already up to date")
+        print(f"Catalog: {len(catalog.files)} file(s), {len(entries)} with timestamps, {sum(e['size'] for e in entries) / 1e6:.1f} MB, "
+              f"{blocks} blocks, {sum(e['records'] for e in entries)} records, "
+              f"{sum(1 for e in entries if not e['sorted'])} out of order")
+        if entries:
+            print(f"Range: {show_stamp(min(e['first'] for e in entries))} .. {show_stamp(max(e['last'] for e in entries))}")
+        return
+
+    if not args.start:
+        raise SystemExit("query needs --from")
+    if not catalog.files:
+        raise SystemExit(f"No index at {catalog.index_dir}; run: python tools/log_index.py build")
+    lo = parse_when(args.start)
+    day = show_stamp(lo)[:10]
+    if args.end:
+        hi = parse_when(args.end, day)
+    else:
+        end = datetime.strptime(show_stamp(lo)[:19], "%Y-%m-%dT%H:%M:%S") + timedelta(minutes=args.minutes)
+        hi = stamp(end.strftime("%Y-%m-%dT%H:%M:%S").encode()) + lo % 1000
+    if hi <= lo:
+        raise SystemExit("--to must be after --from")
+
+    started = time.perf_counter()
+    printed = duplicates = 0
+    same_stamp, last_stamp = set(), None
+    with span("query", "index"):
+        records, stats = query(catalog, lo, hi, args.instance, args.grep)
+        for t, _, pos, name, fmt, text in records:
+            if not args.keep_duplicates:
+                if t != last_stamp:
+                    same_stamp, last_stamp = set(), t
+                if text in same_stamp:
+                    duplicates += 1
+                    continue
+                same_stamp.add(text)
+            print(f"{show_stamp(t)}  {name}@{pos}  {render(fmt, text, args.width)}")
+            printed += 1
+            if args.limit and printed >= args.limit:
+                break
+    elapsed = time.perf_counter() - started
+    total = sum(e["size"] for e in catalog.files.values())
+    print(f"\n{printed} record(s) in {show_stamp(lo)} .. {show_stamp(hi)}"
+          f"{f' ({duplicates} duplicate(s) from overlapping dumps hidden)' if duplicates else ''}; "
+          f"opened {stats['sidecars']} of {stats['files']} indexed file(s), read {stats['blocks']} block(s) = "
+          f"{stats['bytes'] / 1024:.0f} KB of {total / 1e6:.1f} MB in {elapsed * 1000:.0f} ms", file=sys.stderr)
+    if stats["stale"]:
+        print(f"{stats['stale']} file(s) changed since indexing were skipped; run build again", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import os
+import re
+import hmac
+import fnmatch
+import mmap
+import time
+import hashlib
+import argparse
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+
+from logdump import DEFAULT_ROOT, DUMP_PREFIXES, iter_files, rel
+from tracing import add_trace_args, span, start_from_args
+
+# (type, pattern). A group named v marks the part to replace; otherwise the whole match is replaced.
+# Every pattern starts with a literal and checks the case/context before it with a fixed-width look-behind:
+# sre then finds candidates with a fast literal search (~1 GB/s per rule), where one big alternation or a
+# leading character class falls back to trying every position (2-100 MB/s on the dumps).
+# Where matches overlap, the earlier rule wins, so the specific secrets come before the generic phone/name rules.
+VALUE = rb"(?P<v>[^;\"'\s&<]+)"
+RULES = [
+    ("bearer", rb"earer(?<=[Bb]earer)\s+(?P<v>[A-Za-z0-9._~+/=-]{16,})"),
+    ("meta_token", rb"EAA(?<![A-Za-z0-9]EAA)[A-Za-z0-9]{30,}"),
+    ("jwt", rb"eyJ(?<![A-Za-z0-9_-]eyJ)[A-Za-z0-9_-]{5,}\.[A-Za-z0-9_-]{8,}\.[A-Za-z0-9_-]{8,}"),
+    ("conn_secret", rb"assword(?<=[Pp]assword)\s*=(?!\s*\*\*\*)\s*" + VALUE),
+    ("conn_secret", rb"wd=(?<=[Pp]wd=)(?!\*\*\*)" + VALUE),
+    ("conn_secret", rb"ccount[Kk]ey=(?<=[Aa]ccount[Kk]ey=)" + VALUE),
+    ("conn_secret", rb"ccess[Kk]ey=(?<=[Ss]hared[Aa]ccess[Kk]ey=)" + VALUE),
+    ("conn_secret", rb"ecret\s*=(?:(?<=[Cc]lient_[Ss]ecret)|(?<=[Cc]lient[Ss]ecret))\s*" + VALUE),
+    ("password", rb"ass(?:word)?\\?\"(?:(?<=[\"\\][Pp]ass\\\")|(?<=[\"\\][Pp]ass\")|(?<=[Pp]assword\\\")|(?<=[Pp]assword\"))\s*:\s*\\?\"(?P<v>[^\"\\]+)"),
+    ("sas", rb"sig=(?<=[?&]sig=)(?P<v>[A-Za-z0-9%+/=]{16,})"),
+    # The local part is added by walking left from the @ (see LEFT)
+    ("email", rb"@(?<=[A-Za-z0-9._%+-]@)[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,}\b"),
+    # Guest names only where the context says so: JSON name fields, WhatsApp profile names, the first body
+    # parameter of the guest templates, and "Name" "+27..." argument pairs in the test scripts
+    ("name", rb"ame\\?\"(?:(?<=[Gg]uest[Nn]ame)|(?<=[Gg]uest_name)|(?<=[Ff]irst[Nn]ame)|(?<=[Ff]irst_name)|(?<=[Ll]ast[Nn]ame)|"
+             rb"(?<=[Ll]ast_name)|(?<=[Ff]ull[Nn]ame)|(?<=[Cc]ustomer[Nn]ame)|(?<=[Cc]ontact[Nn]ame))\s*:\s*\\?\"(?P<v>[^\"\\]{1,80})"),
+    ("name", rb"profile\\?\"\s*:\s*\{\s*\\?\"name\\?\"\s*:\s*\\?\"(?P<v>[^\"\\]{1,80})"),
+    ("name", rb"parameters\\?\"\s*:\s*\[\s*\{\s*\\?\"type\\?\"\s*:\s*\\?\"text\\?\"\s*,\s*\\?\"text\\?\"\s*:\s*\\?\"(?P<v>[A-Z][^\"\\$]{0,60})"),
+    ("name", rb"\"(?P<v>[A-Z][A-Za-z'-]+(?: [A-Z][A-Za-z'-]+)*)\"(?=\s+\"\+?\d{10,15}\")"),
+    ("phone", rb"\+(?<![\w.:/-]\+)\d{10,14}(?![\w.-])"),
+    ("phone", rb"27(?<![\w.:/-]27)[6-8]\d{8}(?![\w.-])"),
+    ("phone", rb"0(?<![\w.:/-]0)[6-8]\d{8}(?![\w.-])"),
+]
+LEFT = {"email": frozenset(b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789._%+-")}
+
+SKIP_SUFFIXES = (".zip", ".gz", ".png", ".jpg", ".jpeg", ".gif", ".ico", ".exe", ".dll", ".pdb", ".nupkg")
+TEST_ARTIFACTS = ("test_*.sh", "test_*.json", "test_*.ps1", "login.json", "*.postman_collection.json")
+CHUNK_BYTES = 16 << 20
+
+# Compiled once per process (workers inherit or re-import the module)
+PATTERNS = [(kind, re.compile(pattern)) for kind, pattern in RULES]
+KEY = b""
+
+
+def init_worker(key):
+    global KEY
+    KEY = key
+
+
+def normalize(kind, value):
+    if kind == "phone":
+        digits = re.sub(rb"\D", b"", value)
+        # Local 0xx numbers are the same person as 27xx
+        return b"27" + digits[1:] if digits.startswith(b"0") and len(digits) == 10 else digits
+    if kind in ("email", "name"):
+        return value.strip().lower()
+    return value
+
+
+def pseudonym(kind, value):
+    digest = hmac.new(KEY, kind.encode() + b":" + normalize(kind, value), hashlib.sha256).hexdigest()[:10]
+    return f"{kind.upper()}_{digest}".encode()
+
+
+def find_spans(buf, start, end):
+    """Non-overlapping (value_start, value_end, type) in buf[start:end], earliest first."""
+    found = []
+    for i, (kind, rx) in enumerate(PATTERNS):
+        left = LEFT.get(kind)
+        for m in rx.finditer(buf, start, end):
+            a, b = m.span("v") if "v" in rx.groupindex else m.span()
+            if left:
+                floor = max(start, a - 64)
+                while a > floor and buf[a - 1] in left:
+                    a -= 1
+            found.append((a, i, b, kind))
+    found.sort()
+    spans, last = [], start
+    for a, _, b, kind in found:
+        if a >= last:
+            spans.append((a, b, kind))
+            last = b
+    return spans
+
+
+def scrub_range(buf, start, end, out):
+    """Write buf[start:end] to out with every match replaced; returns ({type: count}, {type: {token: original}})."""
+    counts, seen = {}, {}
+    pos = start
+    for a, b, kind in find_spans(buf, start, end):
+        value = buf[a:b]
+        token = pseudonym(kind, value)
+        out.write(buf[pos:a])
+        out.write(token)
+        pos = b
+        counts[kind] = counts.get(kind, 0) + 1
+        seen.setdefault(kind, {}).setdefault(token.decode(), value.decode("utf-8", "replace"))
+    out.write(buf[pos:end])
+    return counts, seen
+
+
+def split_lines(size, mm, chunk):
+    """Line-aligned (start, end) ranges of about chunk bytes."""
+    ranges, start = [], 0
+    while start < size:
+        end = min(size, start + chunk)
+        if end < size:
+            nl = mm.find(b"\n", end)
+            end = size if nl < 0 else nl + 1
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def scrub_unit(unit):
+    """Scrub one file, or one line-aligned range of a large file into its own part file."""
+    src, dst, start, end = unit
+    started = time.perf_counter()
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    with open(src, "rb") as f, open(dst, "wb") as out:
+        size = os.fstat(f.fileno()).st_size
+        if not size:
+            return src, 0, {}, {}, 0.0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = size if end is None else end
+            counts, seen = scrub_range(mm, start, end, out)
+    return src, end - start, counts, seen, time.perf_counter() - started
+
+
+def is_binary(path):
+    if path.lower().endswith(SKIP_SUFFIXES):
+        return True
+    with open(path, "rb") as f:
+        return b"\0" in f.read(8192)
+
+
+def default_inputs(root):
+    dumps = [os.path.join(root, n) for n in sorted(os.listdir(root))
+             if n.startswith(DUMP_PREFIXES) and os.path.isdir(os.path.join(root, n))]
+    artifacts = [os.path.join(root, n) for n in sorted(os.listdir(root))
+                 if os.path.isfile(os.path.join(root, n)) and any(fnmatch.fnmatch(n, p) for p in TEST_ARTIFACTS)]
+    return dumps + artifacts
+
+
+def plan_units(paths, root, out_dir, chunk):
+    units, parts, skipped = [], {}, []
+    for path in iter_files(paths):
+        dst = os.path.join(out_dir, rel(path, root))
+        if is_binary(path):
+            skipped.append(path)
+            continue
+        size = os.path.getsize(path)
+        if size <= chunk:
+            units.append((path, dst, 0, None))
+            continue
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            ranges = split_lines(size, mm, chunk)
+        parts[dst] = [f"{dst}.part{i}" for i in range(len(ranges))]
+        units.extend((path, part, a, b) for part, (a, b) in zip(parts[dst], ranges))
+    return units, parts, skipped
+
+
+def join_parts(parts):
+    for dst, names in parts.items():
+        with open(dst, "wb") as out:
+            for name in names:
+                with open(name, "rb") as f:
+                    while True:
+                        block = f.read(CHUNK_BYTES)
+                        if not block:
+                            break
+                        out.write(block)
+                os.remove(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write sanitised copies of the log dumps and test artifacts: secrets and guest PII become stable pseudonyms")
+    parser.add_argument("paths", nargs="*", help="Files or directories (default: every azure_logs*/api_logs* tree plus test_* scripts/JSON)")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="Repository root; output keeps paths relative to it")
+    parser.add_argument("--out", help="Output directory (default: <root>/scrubbed)")
+    parser.add_argument("--key", default=os.environ.get("STAYBOT_SCRUB_KEY"),
+                        help="HMAC key for pseudonyms (or set STAYBOT_SCRUB_KEY); reuse it so tokens match across runs")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_BYTES >> 20, help="Split files larger than this into line-aligned chunks")
+    parser.add_argument("--map", help="Write token -> original value here (keep it private; never ship it with the scrubbed copy)")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    root = os.path.abspath(args.root)
+    out_dir = os.path.abspath(args.out or os.path.join(root, "scrubbed"))
+    paths = [os.path.abspath(p) for p in args.paths] or default_inputs(root)
+    paths = [p for p in paths if not os.path.abspath(p).startswith(out_dir)]
+    if not paths:
+        raise SystemExit(f"Nothing to scrub under {root}")
+    key = args.key.encode() if args.key else secrets.token_bytes(32)
+    if not args.key:
+        print("No --key/STAYBOT_SCRUB_KEY: using a random key, so pseudonyms will differ from other runs")
+
+    started = time.perf_counter()
+    with span("plan", "scrub"):
+        units, parts, skipped = plan_units(paths, root, out_dir, max(1, args.chunk_mb) << 20)
+    # Largest units first keeps the pool busy to the end
+    units.sort(key=lambda u: -((u[3] if u[3] is not None else os.path.getsize(u[0])) - u[2]))
+    counts, seen, total = {}, {}, 0
+    files_with_hits = set()
+    with ProcessPoolExecutor(max_workers=max(1, args.workers), initializer=init_worker, initargs=(key,)) as pool:
+        for src, size, c, s, _ in pool.map(scrub_unit, units, chunksize=8):
+            total += size
+            if c:
+                files_with_hits.add(src)
+            for kind, n in c.items():
+                counts[kind] = counts.get(kind, 0) + n
+            for kind, tokens in s.items():
+                seen.setdefault(kind, {}).update(tokens)
+    with span("join", "scrub"):
+        join_parts(parts)
+    elapsed = time.perf_counter() - started
+
+    files = len({u[0] for u in units})
+    print(f"Scrubbed {files} files ({total / 1e6:.1f} MB) into {rel(out_dir, root)} in {elapsed:.2f}s "
+          f"= {total / 1e6 / elapsed if elapsed else 0:.0f} MB/s with {args.workers} workers; {len(files_with_hits)} files changed")
+    if skipped:
+        print(f"Skipped {len(skipped)} binary files (not copied): " + ", ".join(rel(p, root) for p in skipped[:5]) + (" ..." if len(skipped) > 5 else ""))
+    print(f"{'type':<12} {'replaced':>9} {'distinct':>9}")
+    for kind in sorted(counts, key=lambda k: -counts[k]):
+        print(f"{kind:<12} {counts[kind]:>9} {len(seen.get(kind, {})):>9}")
+    if args.map:
+        with open(args.map, "w", encoding="utf-8") as f:
+            for kind in sorted(seen):
+                for token, value in sorted(seen[kind].items()):
+                    f.write(f"{token}\t{value}\n")
+        print(f"Wrote {args.map}")
+
+
+if __name__ == "__main__":
+    main()
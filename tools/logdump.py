@@ -0,0 +1,110 @@
+import os
+import hashlib
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+# Repository root; the Azure/App Service dumps are extracted next to apps/ and tools/
+DEFAULT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+DUMP_PREFIXES = ("azure_logs", "azure-logs", "api_logs", "apilogs", "LogFiles")
+
+
+def is_dump_dir(path):
+    # A dump is whatever Kudu's "download logs" zip extracted to: LogFiles/ + deployments/
+    if os.path.basename(path) == "LogFiles":
+        return True
+    return os.path.isdir(os.path.join(path, "LogFiles")) or os.path.isdir(os.path.join(path, "deployments"))
+
+
+def find_dumps(root=DEFAULT_ROOT):
+    """Return every dump directory under root (azure_logs*, api_logs*, azure_logs/logs5, ...)"""
+    dumps = []
+    for name in sorted(os.listdir(root)):
+        top = os.path.join(root, name)
+        if not os.path.isdir(top) or not name.startswith(DUMP_PREFIXES):
+            continue
+        if is_dump_dir(top):
+            dumps.append(top)
+        # azure_logs/ holds one nested dump per download (logs3, logs5, new_logs, diag, ...)
+        for sub in sorted(os.listdir(top)):
+            path = os.path.join(top, sub)
+            if sub not in ("LogFiles", "deployments") and os.path.isdir(path) and is_dump_dir(path):
+                dumps.append(path)
+    return dumps
+
+
+def iter_files(paths, suffix=None, nested_dumps=True):
+    """Yield files below each path in a stable order.
+
+    With nested_dumps=False, nested dump directories (azure_logs/logs5 below azure_logs) are
+    skipped so each file is attributed to exactly one dump.
+    """
+    for base in paths:
+        if os.path.isfile(base):
+            if not suffix or base.endswith(suffix):
+                yield base
+            continue
+        for dirpath, dirnames, filenames in os.walk(base):
+            dirnames.sort()
+            if not nested_dumps:
+                dirnames[:] = [d for d in dirnames if d in ("LogFiles", "deployments") or not is_dump_dir(os.path.join(dirpath, d))]
+            for fn in sorted(filenames):
+                if suffix and not fn.endswith(suffix):
+                    continue
+                yield os.path.join(dirpath, fn)
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def rel(path, root=DEFAULT_ROOT):
+    try:
+        return os.path.relpath(path, root)
+    except ValueError:
+        return path
+
+
+def parse_iso(value):
+    # Kudu writes 7 fractional digits (2025-12-23T11:22:24.4718423Z); second precision is plenty
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value.strip()[:19], "%Y-%m-%dT%H:%M:%S")
+    except ValueError:
+        return None
+
+
+def read_deployments(dumps):
+    """Collect deployments/<id>/status.xml across dumps, de-duplicated by deployment id, oldest first."""
+    found = {}
+    for dump in dumps:
+        dep_root = os.path.join(dump, "deployments")
+        if not os.path.isdir(dep_root):
+            continue
+        for dep_id in os.listdir(dep_root):
+            status_path = os.path.join(dep_root, dep_id, "status.xml")
+            if dep_id in found or not os.path.isfile(status_path):
+                continue
+            try:
+                with open(status_path, "rb") as f:
+                    node = ET.fromstring(f.read().decode("utf-8-sig"))
+            except (OSError, ET.ParseError):
+                continue
+            found[dep_id] = {
+                "id": dep_id,
+                "status": node.findtext("status"),
+                "deployer": node.findtext("deployer"),
+                "received": parse_iso(node.findtext("receivedTime")),
+                "start": parse_iso(node.findtext("startTime")),
+                "end": parse_iso(node.findtext("endTime")),
+                "dump": dump,
+            }
+    return sorted(found.values(), key=lambda d: d["end"] or d["received"] or datetime.min)
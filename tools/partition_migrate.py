@@ -0,0 +1,371 @@
+import os
+import re
+import time
+import argparse
+from datetime import date
+
+from retention_purge import Checkpoint
+from seed_demo_data import connect
+from tracing import add_trace_args, start_from_args
+
+# Tables this helper knows how to convert, and the column they are range-partitioned on (monthly)
+PARTITION_KEYS = {"Messages": "CreatedAt", "Bookings": "CheckinDate"}
+
+DEFAULT_CHECKPOINT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "partition_migrate.ckpt.json"))
+
+
+def q(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def names(table):
+    return {
+        "table": table, "key": PARTITION_KEYS[table],
+        "new": f"{table}_p", "legacy": f"{table}_legacy",
+        "seq": f"{table}_p_Id_seq", "trigger": f"{table.lower()}_partition_mirror", "fn": f"{table.lower()}_partition_mirror_fn",
+    }
+
+
+def partition_name(n, month):
+    return f"{n['new']}_{month:%Y_%m}"
+
+
+def add_months(d, months):
+    y, m = divmod(d.month - 1 + months, 12)
+    return date(d.year + y, m + 1, 1)
+
+
+def columns(cur, table):
+    cur.execute("SELECT column_name FROM information_schema.columns WHERE table_schema='public' AND table_name=%s ORDER BY ordinal_position", [table])
+    return [r[0] for r in cur.fetchall()]
+
+
+def relkind(cur, name):
+    cur.execute("SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace WHERE n.nspname='public' AND c.relname=%s", [name])
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def referencing_fks(cur, table):
+    cur.execute(
+        "SELECT c.conname, c.conrelid::regclass::text, pg_get_constraintdef(c.oid) FROM pg_constraint c "
+        "WHERE c.contype = 'f' AND c.confrelid = %s::regclass ORDER BY 2, 1", [f"public.{q(table)}"])
+    return cur.fetchall()
+
+
+def outbound_fks(cur, table):
+    """Foreign keys declared on the table itself, as [(name, definition)]."""
+    cur.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE contype = 'f' AND conrelid = to_regclass(%s) ORDER BY 1",
+                [f"public.{q(table)}"])
+    return cur.fetchall()
+
+
+def missing_fks(cur, n):
+    """Source foreign keys with no identical definition on the partitioned table."""
+    have = {ddl for _, ddl in outbound_fks(cur, n["new"])}
+    return [(name, ddl) for name, ddl in outbound_fks(cur, n["table"]) if ddl not in have]
+
+
+def month_range(cur, n, ahead):
+    cur.execute(f"SELECT min({q(n['key'])}), max({q(n['key'])}) FROM public.{q(n['table'])}")
+    lo, hi = cur.fetchone()
+    today = date.today()
+    first = date(lo.year, lo.month, 1) if lo else date(today.year, today.month, 1)
+    last = max(date(hi.year, hi.month, 1) if hi else first, date(today.year, today.month, 1))
+    months = []
+    m = first
+    while m <= add_months(last, ahead):
+        months.append(m)
+        m = add_months(m, 1)
+    return months
+
+
+def index_ddl(cur, n):
+    """Secondary indexes of the source table, re-targeted at the partitioned parent (cascades to partitions)."""
+    cur.execute("SELECT indexname, indexdef FROM pg_indexes WHERE schemaname='public' AND tablename=%s", [n["table"]])
+    out = []
+    for name, ddl in cur.fetchall():
+        if name.startswith("PK_"):
+            continue
+        if " UNIQUE " in ddl:
+            # Unique indexes on a partitioned table must include the partition key
+            print(f"-- skipped {name}: unique index without {n['key']} cannot be enforced across partitions")
+            continue
+        new_name = name.replace(n["table"], n["new"], 1) if n["table"] in name else f"{name}_p"
+        ddl = ddl.replace(f"INDEX {q(name)}", f"INDEX IF NOT EXISTS {q(new_name)}").replace(f"INDEX {name} ", f"INDEX IF NOT EXISTS {q(new_name)} ")
+        out.append(re.sub(r"ON public\.\"?%s\"?" % re.escape(n["table"]), f"ON public.{q(n['new'])}", ddl, count=1))
+    return out
+
+
+def upsert_set(cols):
+    return ", ".join(f"{q(c)} = EXCLUDED.{q(c)}" for c in cols if c != "Id")
+
+
+def row_text(cols):
+    return "ROW(" + ", ".join(q(c) for c in cols) + ")::text"
+
+
+def content_mismatches(cur, n, source, window):
+    """Id windows whose rows differ between source and the partitioned table, compared by md5 of their text."""
+    cols = columns(cur, source)
+    digests = []
+    for table in (source, n["new"]):
+        cur.execute(f'SELECT "Id" / %s, md5(string_agg({row_text(cols)}, \'|\' ORDER BY "Id")) FROM public.{q(table)} GROUP BY 1',
+                    [window])
+        digests.append(dict(cur.fetchall()))
+    expected, actual = digests
+    return sorted(w for w in set(expected) | set(actual) if expected.get(w) != actual.get(w))
+
+
+def prepare_sql(cur, n, ahead):
+    cols = columns(cur, n["table"])
+    stmts = [
+        f"CREATE SEQUENCE IF NOT EXISTS public.{q(n['seq'])}",
+        f"CREATE TABLE IF NOT EXISTS public.{q(n['new'])} (LIKE public.{q(n['table'])} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE ({q(n['key'])})",
+        # Identity does not carry over to a partitioned parent; a plain sequence default behaves the same for EF inserts.
+        # OWNED BY lets pg_get_serial_sequence find it (seed_demo_data reserves Id blocks through it).
+        f"ALTER TABLE public.{q(n['new'])} ALTER COLUMN \"Id\" SET DEFAULT nextval('public.{q(n['seq'])}')",
+        f"ALTER SEQUENCE public.{q(n['seq'])} OWNED BY public.{q(n['new'])}.\"Id\"",
+    ]
+    if relkind(cur, n["new"]) is None:
+        stmts.append(f"ALTER TABLE public.{q(n['new'])} ADD PRIMARY KEY (\"Id\", {q(n['key'])})")
+    # LIKE does not copy foreign keys. Added while the table is still empty, so validation is free;
+    # without them the swap would lose e.g. the Messages -> Conversations ON DELETE CASCADE.
+    for name, ddl in missing_fks(cur, n):
+        new_name = name.replace(n["table"], n["new"], 1) if n["table"] in name else f"{name}_p"
+        stmts.append(f"ALTER TABLE public.{q(n['new'])} ADD CONSTRAINT {q(new_name)} {ddl}")
+    for month in month_range(cur, n, ahead):
+        stmts.append(f"CREATE TABLE IF NOT EXISTS public.{q(partition_name(n, month))} PARTITION OF public.{q(n['new'])} "
+                     f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')")
+    stmts.append(f"CREATE TABLE IF NOT EXISTS public.{q(n['new'] + '_default')} PARTITION OF public.{q(n['new'])} DEFAULT")
+    stmts += index_ddl(cur, n)
+
+    # Mirror writes on the live table into the new one while the backfill runs, so both converge online.
+    # The row's last writer always wins: backfill holds FOR SHARE on the rows it copies, so an UPDATE or
+    # DELETE of one of them waits for the batch to commit and its trigger then sees (and replaces or
+    # removes) the copy; an insert that races the copy upserts instead of keeping whichever came first.
+    col_list = ", ".join(q(c) for c in cols)
+    new_vals = ", ".join("NEW." + q(c) for c in cols)
+    stmts.append(f"""CREATE OR REPLACE FUNCTION public.{q(n['fn'])}() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM public.{q(n['new'])} WHERE "Id" = OLD."Id" AND {q(n['key'])} = OLD.{q(n['key'])};
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO public.{q(n['new'])} ({col_list}) VALUES ({new_vals})
+        ON CONFLICT ("Id", {q(n['key'])}) DO UPDATE SET {upsert_set(cols)};
+    END IF;
+    RETURN NULL;
+END $$""")
+    stmts.append(f"DROP TRIGGER IF EXISTS {q(n['trigger'])} ON public.{q(n['table'])}")
+    stmts.append(f"CREATE TRIGGER {q(n['trigger'])} AFTER INSERT OR UPDATE OR DELETE ON public.{q(n['table'])} "
+                 f"FOR EACH ROW EXECUTE FUNCTION public.{q(n['fn'])}()")
+    return stmts
+
+
+def prepare(conn, n, ahead, dry_run):
+    with conn.cursor() as cur:
+        if relkind(cur, n["table"]) != "r":
+            raise SystemExit(f"public.{n['table']} is not a plain table (already swapped?)")
+        stmts = prepare_sql(cur, n, ahead)
+        for s in stmts:
+            print(s.rstrip() + ";")
+            if not dry_run:
+                cur.execute(s)
+    if dry_run:
+        conn.rollback()
+    else:
+        conn.commit()
+        print(f"Prepared {n['new']} with {sum(1 for s in stmts if 'PARTITION OF' in s)} partitions; mirror trigger installed")
+
+
+def backfill(conn, n, batch_ids, rate, checkpoint):
+    """Copy existing rows in primary-key windows.
+
+    FOR SHARE makes writers of a row being copied wait for the batch, so their mirror trigger acts on the
+    copy; the upsert keeps the newest version when the trigger got there first."""
+    with conn.cursor() as cur:
+        source_cols = columns(cur, n["table"])
+        cols = ", ".join(q(c) for c in source_cols)
+        cur.execute(f'SELECT min("Id"), max("Id") FROM public.{q(n["table"])}')
+        lo, hi = cur.fetchone()
+    conn.rollback()
+    if lo is None:
+        print("Source table is empty")
+        return
+    state = checkpoint.get(n["table"], "backfill") or {}
+    next_id = state.get("next_id", lo)
+    copied = state.get("copied", 0)
+    sql = (f"INSERT INTO public.{q(n['new'])} ({cols}) SELECT {cols} FROM public.{q(n['table'])} "
+           f'WHERE "Id" >= %s AND "Id" < %s FOR SHARE '
+           f'ON CONFLICT ("Id", {q(n["key"])}) DO UPDATE SET {upsert_set(source_cols)}')
+    started = time.monotonic()
+    while next_id <= hi:
+        t0 = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute(sql, [next_id, next_id + batch_ids])
+            copied += cur.rowcount
+        conn.commit()
+        next_id += batch_ids
+        checkpoint.put(n["table"], "backfill", {"next_id": next_id, "max_id": hi, "copied": copied})
+        elapsed = time.perf_counter() - t0
+        if rate:
+            time.sleep(max(0.0, batch_ids / rate - elapsed))
+        if (next_id - lo) // batch_ids % 20 == 0:
+            total = time.monotonic() - started
+            print(f"[backfill] {n['table']}: id {next_id}/{hi}, {copied} rows copied ({copied / total if total else 0:,.0f}/s)")
+    print(f"[backfill] {n['table']}: done, {copied} rows copied in {time.monotonic() - started:.1f}s")
+
+
+def verify(conn, n, source=None, window=10000):
+    """Rows per month in the source vs rows per partition in the new table, then row content per Id window;
+    returns the mismatches."""
+    source = source or n["table"]
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT date_trunc('month', {q(n['key'])})::date, count(*) FROM public.{q(source)} GROUP BY 1")
+        expected = {r[0]: r[1] for r in cur.fetchall()}
+        cur.execute(
+            f"SELECT tableoid::regclass::text, date_trunc('month', {q(n['key'])})::date, count(*) FROM public.{q(n['new'])} GROUP BY 1, 2")
+        actual = {}
+        misplaced = 0
+        for part, month, count in cur.fetchall():
+            actual[month] = actual.get(month, 0) + count
+            if part.strip('"') not in (partition_name(n, month), n["new"] + "_default"):
+                misplaced += count
+        # Counts miss a stale copy of an updated row; compare what the rows hold
+        changed = content_mismatches(cur, n, source, window)
+    conn.rollback()
+    bad = []
+    print(f"{'month':10} {'source':>12} {'partitioned':>12}")
+    for month in sorted(set(expected) | set(actual), key=lambda m: (m is None, m)):
+        e, a = expected.get(month, 0), actual.get(month, 0)
+        flag = "" if e == a else "  MISMATCH"
+        if e != a:
+            bad.append((month, e, a))
+        print(f"{str(month):10} {e:>12} {a:>12}{flag}")
+    if misplaced:
+        print(f"{misplaced} rows sit in a partition that does not match their month")
+    for w in changed[:20]:
+        print(f"Ids {w * window}..{(w + 1) * window - 1}: content differs")
+    print(f"Total: source {sum(expected.values())}, partitioned {sum(actual.values())}, {len(bad)} mismatched months, "
+          f"{len(changed)} Id windows with different content")
+    return bad + [("ids", w * window, (w + 1) * window - 1) for w in changed]
+
+
+def swap(conn, n, drop_fks, window=10000):
+    """Under an exclusive lock: final verify, rename the table to *_legacy and route the name through a view."""
+    with conn.cursor() as cur:
+        fks = referencing_fks(cur, n["table"])
+        if fks and not drop_fks:
+            for name, child, ddl in fks:
+                print(f"  {child}.{name}: {ddl}")
+            raise SystemExit(f"{len(fks)} foreign keys reference {n['table']}; a partitioned table cannot be their target. "
+                             "Re-run with --drop-fks to drop them as part of the swap")
+        missing = missing_fks(cur, n)
+        if missing:
+            for name, ddl in missing:
+                print(f"  {n['table']}.{name}: {ddl}")
+            raise SystemExit(f"{n['new']} lacks {len(missing)} foreign keys of {n['table']} (cascades would stop); re-run prepare first")
+        cur.execute(f"LOCK TABLE public.{q(n['table'])} IN ACCESS EXCLUSIVE MODE")
+        cur.execute(f"SELECT count(*) FROM public.{q(n['table'])}")
+        src = cur.fetchone()[0]
+        cur.execute(f"SELECT count(*) FROM public.{q(n['new'])}")
+        dst = cur.fetchone()[0]
+        if src != dst:
+            conn.rollback()
+            raise SystemExit(f"Row counts differ ({src} vs {dst}); run backfill/verify before swapping")
+        changed = content_mismatches(cur, n, n["table"], window)
+        if changed:
+            conn.rollback()
+            raise SystemExit(f"{len(changed)} Id windows differ in content (first: Ids from {changed[0] * window}); run verify before swapping")
+        for name, child, _ in fks:
+            cur.execute(f"ALTER TABLE {child} DROP CONSTRAINT {q(name)}")
+        cur.execute(f"DROP TRIGGER IF EXISTS {q(n['trigger'])} ON public.{q(n['table'])}")
+        cur.execute(f"SELECT setval('public.{q(n['seq'])}', GREATEST((SELECT COALESCE(max(\"Id\"), 0) FROM public.{q(n['table'])}), 1))")
+        cur.execute(f"ALTER TABLE public.{q(n['table'])} RENAME TO {q(n['legacy'])}")
+        # A single-table view is auto-updatable, so EF's INSERT ... RETURNING "Id" keeps working through it
+        cur.execute(f"CREATE VIEW public.{q(n['table'])} AS SELECT * FROM public.{q(n['new'])}")
+    conn.commit()
+    print(f"Swapped: public.{n['table']} is now a view over {n['new']}; old table kept as {n['legacy']} ({len(fks)} FKs dropped)")
+
+
+def rollback_swap(conn, n):
+    """Point the name back at the legacy table, carrying over rows written since the swap."""
+    with conn.cursor() as cur:
+        if relkind(cur, n["table"]) != "v" or relkind(cur, n["legacy"]) != "r":
+            raise SystemExit(f"{n['table']} is not a swapped view with a {n['legacy']} table behind it")
+        cols = ", ".join(q(c) for c in columns(cur, n["legacy"]))
+        cur.execute(f"LOCK TABLE public.{q(n['new'])} IN ACCESS EXCLUSIVE MODE")
+        cur.execute(f"DROP VIEW public.{q(n['table'])}")
+        cur.execute(f"ALTER TABLE public.{q(n['legacy'])} RENAME TO {q(n['table'])}")
+        cur.execute(f"INSERT INTO public.{q(n['table'])} ({cols}) OVERRIDING SYSTEM VALUE SELECT {cols} FROM public.{q(n['new'])} "
+                    f'WHERE "Id" > (SELECT COALESCE(max("Id"), 0) FROM public.{q(n["table"])})')
+        carried = cur.rowcount
+        cur.execute(f"SELECT setval(pg_get_serial_sequence('public.{q(n['table'])}', 'Id'), (SELECT max(\"Id\") FROM public.{q(n['table'])}))")
+    conn.commit()
+    print(f"Rolled back: {n['table']} is the plain table again ({carried} rows carried back). Dropped FKs are not recreated.")
+
+
+def drop_partitions(conn, n, older_than_months, dry_run):
+    """Retention as DDL: detach and drop monthly partitions that end before the cutoff month."""
+    cutoff = add_months(date.today().replace(day=1), -older_than_months)
+    pattern = re.compile(re.escape(n["new"]) + r"_(\d{4})_(\d{2})$")
+    with conn.cursor() as cur:
+        cur.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = %s::regclass ORDER BY 1",
+                    [f"public.{q(n['new'])}"])
+        victims = [r[0] for r in cur.fetchall() if pattern.match(r[0]) and add_months(date(*map(int, pattern.match(r[0]).groups()), 1), 1) <= cutoff]
+        for part in victims:
+            print(f"{'[dry-run] ' if dry_run else ''}DROP {part}")
+            if not dry_run:
+                cur.execute(f"ALTER TABLE public.{q(n['new'])} DETACH PARTITION public.{q(part)}")
+                cur.execute(f"DROP TABLE public.{q(part)}")
+    if dry_run:
+        conn.rollback()
+    else:
+        conn.commit()
+    print(f"{len(victims)} partitions older than {cutoff} {'would be' if dry_run else ''} dropped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert Messages/Bookings into monthly range-partitioned tables online")
+    parser.add_argument("command", choices=["prepare", "backfill", "verify", "swap", "rollback", "drop-partitions"])
+    parser.add_argument("--table", choices=sorted(PARTITION_KEYS), required=True)
+    parser.add_argument("--conn", default=os.environ.get("STAYBOT_CONN"), help="PostgreSQL connection string (or set STAYBOT_CONN)")
+    parser.add_argument("--months-ahead", type=int, default=3, help="Future monthly partitions to pre-create")
+    parser.add_argument("--batch-ids", type=int, default=10000, help="Primary-key window per backfill transaction and per verify/swap content checksum")
+    parser.add_argument("--rate", type=float, default=0.0, help="Max backfilled ids/sec (0 = unthrottled)")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT)
+    parser.add_argument("--drop-fks", action="store_true", help="swap: drop foreign keys that reference the table")
+    parser.add_argument("--older-than-months", type=int, default=12, help="drop-partitions: keep this many whole months")
+    parser.add_argument("--dry-run", action="store_true", help="prepare/drop-partitions: print the DDL only")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    if not args.conn:
+        raise SystemExit("Missing --conn or STAYBOT_CONN")
+    n = names(args.table)
+    conn = connect(args.conn)
+    try:
+        if args.command == "prepare":
+            prepare(conn, n, args.months_ahead, args.dry_run)
+        elif args.command == "backfill":
+            backfill(conn, n, args.batch_ids, args.rate, Checkpoint(args.checkpoint))
+        elif args.command == "verify":
+            with conn.cursor() as cur:
+                source = n["legacy"] if relkind(cur, n["table"]) == "v" else n["table"]
+            if verify(conn, n, source, args.batch_ids):
+                raise SystemExit(1)
+        elif args.command == "swap":
+            swap(conn, n, args.drop_fks, args.batch_ids)
+        elif args.command == "rollback":
+            rollback_swap(conn, n)
+        else:
+            drop_partitions(conn, n, args.older_than_months, args.dry_run)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
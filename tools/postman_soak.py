@@ -0,0 +1,292 @@
+import os
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from urllib.parse import urlsplit, urlunsplit
+
+from loadstats import Stats, print_rows
+from tracing import add_trace_args, start_from_args
+
+try:
+    import aiohttp
+except Exception:
+    aiohttp = None
+
+DEFAULT_COLLECTION = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "Hostr-Backend-API.postman_collection.json"))
+
+VAR_RE = re.compile(r"\{\{([^{}]+)\}\}")
+ID_PATH_RE = re.compile(r"^(/api/(?P<resource>[\w-]+))/(?P<id>\d+)(?P<rest>/.*)?$")
+
+# Read-heavy default mix; tenant writes are excluded so a soak never deletes or rewrites the tenant
+# it runs against. PUT/DELETE only join with --allow-writes, and even then only ever target ids this
+# run's own POSTs created (see resolve). Override with --weights.
+DEFAULT_METHOD_WEIGHTS = {"GET": 10, "POST": 2}
+WRITE_METHOD_WEIGHTS = {"PUT": 2, "PATCH": 2, "DELETE": 1}
+WRITE_METHODS = set(WRITE_METHOD_WEIGHTS)
+DEFAULT_EXCLUDE = {"Create Tenant", "Update Tenant", "Delete Tenant"}
+
+
+def substitute(text, variables, depth=0):
+    if not text or depth > 5:
+        return text
+
+    def repl(m):
+        key = m.group(1).strip()
+        if key == "$guid":
+            return str(uuid.uuid4())
+        if key == "$timestamp":
+            return str(int(time.time()))
+        if key == "$randomInt":
+            return str(random.randint(0, 1000))
+        return str(variables.get(key, m.group(0)))
+
+    out = VAR_RE.sub(repl, text)
+    return substitute(out, variables, depth + 1) if VAR_RE.search(out) and out != text else out
+
+
+def iter_requests(items, folder=""):
+    for it in items:
+        if "item" in it:
+            yield from iter_requests(it["item"], it.get("name", folder))
+        elif "request" in it:
+            yield folder, it
+
+
+def compile_collection(path, variables, weights=None, exclude=None, allow_writes=False):
+    """Flatten a Postman v2.1 collection into weighted operations keyed by a normalised endpoint label."""
+    with open(path, "r", encoding="utf-8") as f:
+        collection = json.load(f)
+    base_vars = {v["key"]: v.get("value", "") for v in collection.get("variable", [])}
+    base_vars.update(variables)
+    weights = weights or {}
+    exclude = DEFAULT_EXCLUDE if exclude is None else exclude
+    method_weights = dict(DEFAULT_METHOD_WEIGHTS, **WRITE_METHOD_WEIGHTS) if allow_writes else DEFAULT_METHOD_WEIGHTS
+    ops = []
+    for folder, item in iter_requests(collection["item"]):
+        name = item.get("name", "")
+        req = item["request"]
+        method = req.get("method", "GET").upper()
+        raw_url = req["url"] if isinstance(req["url"], str) else req["url"].get("raw", "")
+        path = urlsplit(substitute(raw_url, base_vars)).path
+        m = ID_PATH_RE.match(path)
+        label = f"{method} " + (f"{m.group(1)}/{{id}}{m.group('rest') or ''}" if m else path)
+        weight = weights.get(name, weights.get(label, weights.get(folder, None if name in exclude else method_weights.get(method, 0 if method in WRITE_METHODS else 1))))
+        if not weight:
+            continue
+        body = (req.get("body") or {}).get("raw")
+        ops.append({
+            "name": name, "folder": folder, "label": label, "method": method, "url": raw_url, "weight": weight,
+            "headers": {h["key"]: h["value"] for h in req.get("header", []) if not h.get("disabled")},
+            "body": body, "resource": m.group("resource") if m else None,
+        })
+    return ops, base_vars
+
+
+class IdPool:
+    """Ids returned by POST /api/<resource>, reused by later /api/<resource>/{id} calls (DELETE consumes them)."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.ids = {}
+
+    def capture(self, url_path, body):
+        m = re.match(r"^/api/([\w-]+)/?$", url_path)
+        if not m or not isinstance(body, dict):
+            return
+        new_id = body.get("id", body.get("Id"))
+        if isinstance(new_id, int):
+            self.ids.setdefault(m.group(1), []).append(new_id)
+
+    def pick(self, resource, consume=False):
+        pool = self.ids.get(resource)
+        if not pool:
+            return None
+        i = self.rng.randrange(len(pool))
+        return pool.pop(i) if consume else pool[i]
+
+
+def resolve(op, variables, ids):
+    """(url, headers, body, path), or None when a write has no id from this run to target yet.
+
+    PUT/DELETE never fall back to the collection's literal ids (/api/faqs/1 is a seeded row)."""
+    url = substitute(op["url"], variables)
+    parts = urlsplit(url)
+    path = parts.path
+    m = ID_PATH_RE.match(path)
+    if m and op["resource"]:
+        chained = ids.pick(op["resource"], consume=op["method"] == "DELETE")
+        if chained is not None:
+            path = f"{m.group(1)}/{chained}{m.group('rest') or ''}"
+        elif op["method"] in WRITE_METHODS:
+            return None
+    headers = {k: substitute(v, variables) for k, v in op["headers"].items()}
+    host = parts.netloc
+    # <tenant>.localhost does not resolve everywhere; connect to localhost and keep the Host header
+    if parts.hostname and parts.hostname.endswith(".localhost"):
+        headers["Host"] = host
+        host = host.replace(parts.hostname, "localhost")
+    url = urlunsplit((parts.scheme, host, path, parts.query, ""))
+    body = substitute(op["body"], variables) if op["body"] else None
+    return url, headers, body, path
+
+
+async def soak(ops, variables, rps, duration, max_in_flight, timeout, seed):
+    rng = random.Random(seed)
+    ids = IdPool(rng)
+    stats = Stats()
+    status_counts = {}
+    weights = [op["weight"] for op in ops]
+    sem = asyncio.Semaphore(max_in_flight)
+    tasks = set()
+
+    async def fire(session, op, scheduled):
+        resolved = resolve(op, variables, ids)
+        if resolved is None:
+            # Deferred: nothing this run created for the resource yet (or all of it already deleted)
+            status_counts[(op["label"], "skipped")] = status_counts.get((op["label"], "skipped"), 0) + 1
+            return
+        url, headers, body, path = resolved
+        async with sem:
+            ok = False
+            try:
+                async with session.request(op["method"], url, data=body.encode("utf-8") if body else None, headers=headers) as resp:
+                    raw = await resp.read()
+                    ok = resp.status < 400
+                    status_counts[(op["label"], resp.status)] = status_counts.get((op["label"], resp.status), 0) + 1
+                    if ok and op["method"] == "POST":
+                        try:
+                            ids.capture(path, json.loads(raw))
+                        except ValueError:
+                            pass
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                status_counts[(op["label"], "error")] = status_counts.get((op["label"], "error"), 0) + 1
+        # Latency from the scheduled start, so queueing behind a slow server is not hidden
+        # (no coordinated omission)
+        stats.record(op["label"], time.monotonic() - scheduled, ok)
+
+    connector = aiohttp.TCPConnector(limit=max_in_flight)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        started = time.monotonic()
+        interval = 1.0 / rps
+        n = 0
+        while True:
+            scheduled = started + n * interval
+            if scheduled - started >= duration:
+                break
+            delay = scheduled - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            op = rng.choices(ops, weights)[0]
+            task = asyncio.create_task(fire(session, op, scheduled))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            n += 1
+        if tasks:
+            await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+    return stats, status_counts, elapsed
+
+
+def write_hgrm(hist, path):
+    """HdrHistogram percentile-distribution text, loadable by the HdrHistogram plotter."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"{'Value':>12} {'Percentile':>14} {'TotalCount':>10} {'1/(1-Percentile)':>14}\n\n")
+        for value, pct, count in hist.distribution():
+            p = pct / 100.0
+            inv = f"{1 / (1 - p):14.2f}" if p < 1 else ""
+            f.write(f"{value:12.3f} {p:14.12f} {count:10d} {inv}\n")
+        f.write(f"#[Mean    = {hist.mean_ms():12.3f}, Max     = {hist.max_us / 1000.0:12.3f}]\n")
+        f.write(f"#[Total count    = {hist.total:12d}, Buckets = {len(hist.counts):8d}]\n")
+
+
+def compare(rows, baseline_path, threshold_pct):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r["label"]: r for r in json.load(f)["endpoints"]}
+    regressions = []
+    for r in rows:
+        b = baseline.get(r["label"])
+        if not b or not b["p95_ms"]:
+            continue
+        change = 100.0 * (r["p95_ms"] - b["p95_ms"]) / b["p95_ms"]
+        if change > threshold_pct:
+            regressions.append((r["label"], b["p95_ms"], r["p95_ms"], change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay the Postman collection as a weighted, rate-controlled soak test")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION)
+    parser.add_argument("--var", action="append", default=[], help="Override a collection variable, e.g. --var base_url=http://localhost:5000")
+    parser.add_argument("--weights", help="JSON object of weights keyed by request name, endpoint label or folder (0 disables)")
+    parser.add_argument("--allow-writes", action="store_true", help="Add PUT/DELETE to the default mix, against ids this run created only")
+    parser.add_argument("--include-tenant-writes", action="store_true", help="Also run Create/Update/Delete Tenant (requires --allow-writes; Update/Delete are PUT/DELETE)")
+    parser.add_argument("--rps", type=float, default=20.0, help="Target requests per second (open loop)")
+    parser.add_argument("--duration", type=float, default=300.0, help="Seconds to run")
+    parser.add_argument("--max-in-flight", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--list", action="store_true", help="Print the compiled workload mix and exit")
+    parser.add_argument("--hgrm-dir", help="Write one .hgrm percentile distribution per endpoint here")
+    parser.add_argument("--json", dest="json_out", help="Write the summary (usable later as --baseline)")
+    parser.add_argument("--baseline", help="Earlier --json summary to compare p95 against")
+    parser.add_argument("--regress-pct", type=float, default=20.0, help="p95 increase over baseline that counts as a regression")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+    if args.include_tenant_writes and not args.allow_writes:
+        # Without it only Create Tenant would join: Update/Delete Tenant are PUT/DELETE, which stay at weight 0
+        parser.error("--include-tenant-writes requires --allow-writes")
+
+    variables = dict(v.split("=", 1) for v in args.var)
+    weights = None
+    if args.weights:
+        with open(args.weights, "r", encoding="utf-8") as f:
+            weights = json.load(f)
+    ops, resolved_vars = compile_collection(args.collection, variables, weights, exclude=set() if args.include_tenant_writes else None,
+                                           allow_writes=args.allow_writes)
+    if not ops:
+        raise SystemExit("No requests left in the workload mix")
+    total_weight = sum(op["weight"] for op in ops)
+    print(f"{len(ops)} requests in mix, target {args.rps} req/s for {args.duration}s")
+    for op in ops:
+        print(f"  {100.0 * op['weight'] / total_weight:5.1f}%  {op['label']:45} ({op['folder']}: {op['name']})")
+    if args.list:
+        return
+    if not aiohttp:
+        raise SystemExit("aiohttp not installed. Run: python -m pip install --user aiohttp")
+
+    stats, status_counts, elapsed = asyncio.run(soak(ops, resolved_vars, args.rps, args.duration, args.max_in_flight, args.timeout, args.seed))
+    rows = stats.rows(elapsed)
+    print()
+    print_rows(rows, label_title="endpoint", width=45)
+    odd = {k: v for k, v in status_counts.items() if k[1] == "error" or (k[1] != "skipped" and k[1] >= 400)}
+    skipped = {k[0]: v for k, v in status_counts.items() if k[1] == "skipped"}
+    if skipped:
+        print("Skipped (no id from this run's POST yet): " + ", ".join(f"{label} x{n}" for label, n in sorted(skipped.items())))
+    if odd:
+        print("Non-2xx/3xx: " + ", ".join(f"{label} [{status}] x{n}" for (label, status), n in sorted(odd.items(), key=lambda kv: str(kv[0]))))
+
+    if args.hgrm_dir:
+        os.makedirs(args.hgrm_dir, exist_ok=True)
+        for label, hist in stats.hist.items():
+            write_hgrm(hist, os.path.join(args.hgrm_dir, re.sub(r"[^\w.-]+", "_", label).strip("_") + ".hgrm"))
+        write_hgrm(stats.overall(), os.path.join(args.hgrm_dir, "ALL.hgrm"))
+        print(f"HDR distributions written to {args.hgrm_dir}")
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump({"rps": args.rps, "duration_s": elapsed, "endpoints": rows}, f, indent=2)
+        print(f"Summary written: {args.json_out}")
+    if args.baseline:
+        regressions = compare(rows, args.baseline, args.regress_pct)
+        for label, before, after, change in regressions:
+            print(f"REGRESSION {label}: p95 {before:.1f} ms -> {after:.1f} ms (+{change:.0f}%)")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+import os
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+
+from loadstats import Histogram
+from seed_demo_data import connect
+from tracing import add_trace_args, start_from_args
+
+DEFAULT_CHECKPOINT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "retention_purge.ckpt.json"))
+
+
+def tenants_with_retention(conn, tenant_ids=None):
+    sql = 'SELECT "Id", "Name", "RetentionDays" FROM public."Tenants"'
+    params = []
+    if tenant_ids:
+        sql += ' WHERE "Id" = ANY(%s)'
+        params.append(tenant_ids)
+    with conn.cursor() as cur:
+        cur.execute(sql + ' ORDER BY "Id"', params)
+        return [(r[0], r[1], r[2] or 30) for r in cur.fetchall()]
+
+
+def blocking_references(conn, schema, table):
+    """Foreign keys into schema.table that are not ON DELETE CASCADE/SET NULL (deleting a referenced row would fail)."""
+    q = (
+        "SELECT cn.nspname, cl.relname, a.attname FROM pg_constraint c "
+        "JOIN pg_class cl ON cl.oid = c.conrelid JOIN pg_namespace cn ON cn.oid = cl.relnamespace "
+        "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1] "
+        "WHERE c.contype = 'f' AND c.confrelid = %s::regclass AND c.confdeltype IN ('a', 'r')"
+    )
+    with conn.cursor() as cur:
+        cur.execute(q, [f'{schema}."{table}"'])
+        return [tuple(r) for r in cur.fetchall()]
+
+
+def purge_predicates(conn, schema):
+    """WHERE clauses per table, mirroring RetentionService.PurgeOldDataAsync.
+
+    Messages older than the cutoff go first; then conversations created before the cutoff with no
+    message at or after it, skipping any still referenced through a non-cascading foreign key.
+    """
+    conv = (f'"TenantId" = %(tenant)s AND "CreatedAt" < %(cutoff)s AND NOT EXISTS (SELECT 1 FROM {schema}."Messages" m '
+            f'WHERE m."ConversationId" = c."Id" AND m."CreatedAt" >= %(cutoff)s)')
+    for child_schema, child_table, child_col in blocking_references(conn, schema, "Conversations"):
+        if (child_schema, child_table) != (schema, "Messages"):
+            conv += f' AND NOT EXISTS (SELECT 1 FROM {child_schema}."{child_table}" x WHERE x."{child_col}" = c."Id")'
+    return [
+        ("Messages", '"TenantId" = %(tenant)s AND "CreatedAt" < %(cutoff)s'),
+        ("Conversations", conv),
+    ]
+
+
+def estimate(conn, schema, tenant_id, cutoff, predicates):
+    """Exact candidate counts (a real count(*), not the planner's guess) and PK range per table.
+
+    enable_seqscan is off so the count goes through the (TenantId, ...) indexes where it can; the chosen scan
+    and the planner's row estimate are reported next to the exact count."""
+    out = []
+    with conn.cursor() as cur:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for table, where in predicates:
+            alias = "c" if table == "Conversations" else "t"
+            sql = f'SELECT count(*), min({alias}."Id"), max({alias}."Id") FROM {schema}."{table}" {alias} WHERE {where}'
+            params = {"tenant": tenant_id, "cutoff": cutoff}
+            cur.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+            plan = cur.fetchone()[0][0]["Plan"]
+            node = plan
+            while node.get("Plans"):
+                node = node["Plans"][0]
+            cur.execute(sql, params)
+            count, lo, hi = cur.fetchone()
+            out.append({"table": table, "rows": count, "min_id": lo, "max_id": hi, "scan": node.get("Node Type"), "planned_rows": plan.get("Plan Rows")})
+    conn.rollback()
+    return out
+
+
+class ReplicationGuard:
+    """Blocks while any standby replays more than max_lag seconds behind (pg_stat_replication on the primary)."""
+
+    def __init__(self, conn, max_lag, poll=2.0):
+        self.conn = conn
+        self.max_lag = max_lag
+        self.poll = poll
+        self.paused_s = 0.0
+        self.enabled = max_lag > 0
+
+    def lag(self):
+        with self.conn.cursor() as cur:
+            cur.execute("SELECT COALESCE(MAX(EXTRACT(EPOCH FROM replay_lag)), 0) FROM pg_stat_replication")
+            value = float(cur.fetchone()[0] or 0)
+        self.conn.rollback()
+        return value
+
+    def wait(self):
+        if not self.enabled:
+            return
+        try:
+            lag = self.lag()
+        except Exception as e:
+            print(f"[lag] cannot read pg_stat_replication ({e}); lag checks disabled")
+            self.conn.rollback()
+            self.enabled = False
+            return
+        started = time.monotonic()
+        while lag > self.max_lag:
+            print(f"[lag] replica {lag:.1f}s behind (> {self.max_lag}s), pausing")
+            time.sleep(self.poll)
+            lag = self.lag()
+        self.paused_s += time.monotonic() - started
+
+
+class Checkpoint:
+    """Per (tenant, table) progress in a JSON file, rewritten atomically after every committed batch."""
+
+    def __init__(self, path):
+        self.path = path
+        self.state = {}
+        if path and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def get(self, tenant_id, table):
+        return self.state.get(f"{tenant_id}:{table}")
+
+    def put(self, tenant_id, table, value):
+        self.state[f"{tenant_id}:{table}"] = value
+        self.save()
+
+    def clear(self, tenant_ids):
+        """Forget the given tenants' progress, leaving other tenants' entries to resume; removes an emptied file."""
+        prefixes = tuple(f"{t}:" for t in tenant_ids)
+        self.state = {k: v for k, v in self.state.items() if not k.startswith(prefixes)}
+        if self.path and not self.state and os.path.exists(self.path):
+            os.remove(self.path)
+        else:
+            self.save()
+
+    def save(self):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp, self.path)
+
+
+def purge_table(conn, schema, table, where, tenant_id, cutoff, lo, hi, batch_ids, rate, guard, checkpoint, hist):
+    """Delete in ascending primary-key windows of batch_ids, one transaction each, capped at `rate` rows/s."""
+    alias = "c" if table == "Conversations" else "t"
+    sql = f'DELETE FROM {schema}."{table}" {alias} WHERE {alias}."Id" >= %(lo)s AND {alias}."Id" < %(hi)s AND {where}'
+    state = checkpoint.get(tenant_id, table) or {}
+    next_id = state.get("next_id", lo)
+    deleted = state.get("deleted", 0)
+    started = time.monotonic()
+    while next_id is not None and next_id <= hi:
+        guard.wait()
+        t0 = time.perf_counter()
+        with conn.cursor() as cur:
+            cur.execute(sql, {"lo": next_id, "hi": next_id + batch_ids, "tenant": tenant_id, "cutoff": cutoff})
+            n = cur.rowcount
+        conn.commit()
+        elapsed = time.perf_counter() - t0
+        hist.record(elapsed)
+        deleted += n
+        next_id += batch_ids
+        checkpoint.put(tenant_id, table, {"cutoff": cutoff.isoformat(), "next_id": next_id, "max_id": hi, "deleted": deleted})
+        if rate and n:
+            # Token-bucket style: the batch "spends" n/rate seconds, sleep off whatever it did not use
+            time.sleep(max(0.0, n / rate - elapsed))
+    checkpoint.put(tenant_id, table, {"cutoff": cutoff.isoformat(), "next_id": None, "max_id": hi, "deleted": deleted, "done": True})
+    return deleted, time.monotonic() - started
+
+
+def run_purge(conn, schema, tenants, batch_ids, rate, max_lag, checkpoint, dry_run, now=None):
+    predicates = purge_predicates(conn, schema)
+    guard = ReplicationGuard(conn, max_lag)
+    hist = Histogram()
+    now = now or datetime.utcnow()
+    totals = []
+    for tenant_id, name, retention_days in tenants:
+        for table, where in predicates:
+            state = checkpoint.get(tenant_id, table)
+            if state and state.get("done"):
+                print(f"[{tenant_id}] {table}: already done ({state['deleted']} rows)")
+                continue
+            # A resumed run keeps the original cutoff so both halves purge the same set
+            cutoff = datetime.fromisoformat(state["cutoff"]) if state else now - timedelta(days=retention_days)
+            est = estimate(conn, schema, tenant_id, cutoff, [(table, where)])[0]
+            hi = state["max_id"] if state else est["max_id"]
+            print(f"[{tenant_id}] {name}: {table} older than {cutoff:%Y-%m-%d} ({retention_days}d): {est['rows']} rows, "
+                  f"ids {est['min_id']}..{hi}, {est['scan']}")
+            if dry_run or not est["rows"]:
+                totals.append((tenant_id, table, est["rows"], 0.0))
+                continue
+            deleted, elapsed = purge_table(conn, schema, table, where, tenant_id, cutoff, est["min_id"], hi, batch_ids, rate, guard, checkpoint, hist)
+            print(f"[{tenant_id}] {table}: deleted {deleted} in {elapsed:.1f}s ({deleted / elapsed if elapsed else 0:,.0f} rows/s)")
+            totals.append((tenant_id, table, deleted, elapsed))
+    if hist.total:
+        print(f"Batches: {hist.total}, p50 {hist.percentile_ms(50):.1f} ms, p99 {hist.percentile_ms(99):.1f} ms, max {hist.max_us / 1000:.1f} ms; paused for lag {guard.paused_s:.1f}s")
+    return totals
+
+
+# --- benchmark -----------------------------------------------------------------------------------
+
+BENCH_SCHEMA = "retention_bench"
+
+
+def bench_load(conn, conversations, messages, days):
+    with conn.cursor() as cur:
+        cur.execute(f'TRUNCATE {BENCH_SCHEMA}."Messages", {BENCH_SCHEMA}."Conversations"')
+        cur.execute(
+            f'INSERT INTO {BENCH_SCHEMA}."Conversations" ("Id","TenantId","WaUserPhone","Status","CreatedAt","ConversationMode") '
+            f"SELECT g, 1, '+27600' || g, 'Closed', now() - (random() * %s || ' days')::interval, 'Normal' FROM generate_series(1, %s) g",
+            [days, conversations])
+        cur.execute(
+            f'INSERT INTO {BENCH_SCHEMA}."Messages" ("Id","TenantId","ConversationId","Direction","MessageType","Body","UsedRag","CreatedAt") '
+            f"SELECT g, 1, 1 + (g %% %s), CASE WHEN g %% 2 = 0 THEN 'Inbound' ELSE 'Outbound' END, 'text', "
+            f"'synthetic message body ' || g, false, now() - (random() * %s || ' days')::interval FROM generate_series(1, %s) g",
+            [conversations, days, messages])
+        cur.execute(f'ANALYZE {BENCH_SCHEMA}."Messages"')
+        cur.execute(f'ANALYZE {BENCH_SCHEMA}."Conversations"')
+    conn.commit()
+
+
+def wal_lsn(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_current_wal_lsn()")
+        return cur.fetchone()[0]
+
+
+def wal_bytes(conn, since):
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)", [since])
+        return int(cur.fetchone()[0])
+
+
+def bench(conn, conversations, messages, days, retention_days, batches):
+    """Worker-style single DELETE vs batched purges on a scratch copy of Messages/Conversations."""
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE SCHEMA IF NOT EXISTS {BENCH_SCHEMA}")
+        for table in ("Conversations", "Messages"):
+            cur.execute(f'CREATE TABLE IF NOT EXISTS {BENCH_SCHEMA}."{table}" (LIKE public."{table}" INCLUDING DEFAULTS INCLUDING INDEXES)')
+    conn.commit()
+    rows = []
+    try:
+        for batch in [0] + batches:
+            bench_load(conn, conversations, messages, days)
+            lsn = wal_lsn(conn)
+            t0 = time.perf_counter()
+            if batch == 0:
+                cutoff = datetime.utcnow() - timedelta(days=retention_days)
+                with conn.cursor() as cur:
+                    for table, where in purge_predicates(conn, BENCH_SCHEMA):
+                        alias = "c" if table == "Conversations" else "t"
+                        cur.execute(f'DELETE FROM {BENCH_SCHEMA}."{table}" {alias} WHERE {where}', {"tenant": 1, "cutoff": cutoff})
+                conn.commit()
+                elapsed = time.perf_counter() - t0
+                rows.append(("single DELETE (worker)", elapsed, elapsed * 1000, wal_bytes(conn, lsn)))
+                continue
+            hist = Histogram()
+            checkpoint = Checkpoint(None)
+            predicates = purge_predicates(conn, BENCH_SCHEMA)
+            cutoff = datetime.utcnow() - timedelta(days=retention_days)
+            for table, where in predicates:
+                est = estimate(conn, BENCH_SCHEMA, 1, cutoff, [(table, where)])[0]
+                if est["rows"]:
+                    purge_table(conn, BENCH_SCHEMA, table, where, 1, cutoff, est["min_id"], est["max_id"], batch, 0, ReplicationGuard(conn, 0), checkpoint, hist)
+            rows.append((f"batched ids/{batch}", time.perf_counter() - t0, hist.max_us / 1000.0, wal_bytes(conn, lsn)))
+    finally:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA {BENCH_SCHEMA} CASCADE")
+        conn.commit()
+    print(f"{'strategy':24} {'total s':>8} {'longest txn ms':>15} {'WAL MB':>8}")
+    for name, total, longest, wal in rows:
+        print(f"{name:24} {total:>8.2f} {longest:>15.1f} {wal / 1e6:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Estimate and run batched, throttled retention purges (RetentionWorker semantics)")
+    parser.add_argument("command", choices=["estimate", "purge", "bench"],
+                        help="estimate: exact count(*) of purgeable rows per tenant, deletes nothing; purge: batched delete; bench: compare strategies")
+    parser.add_argument("--conn", default=os.environ.get("STAYBOT_CONN"), help="PostgreSQL connection string (or set STAYBOT_CONN)")
+    parser.add_argument("--tenant-ids", help="Comma-separated tenant ids (default: all tenants)")
+    parser.add_argument("--batch-ids", type=int, default=5000, help="Primary-key window per DELETE transaction")
+    parser.add_argument("--rate", type=float, default=2000.0, help="Max deleted rows/sec (0 = unthrottled)")
+    parser.add_argument("--max-lag", type=float, default=10.0, help="Pause while replica replay lag exceeds this many seconds (0 = ignore)")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Progress file; rerun with the same file to resume")
+    parser.add_argument("--fresh", action="store_true", help="purge only: ignore and overwrite an existing checkpoint")
+    parser.add_argument("--bench-conversations", type=int, default=100000)
+    parser.add_argument("--bench-messages", type=int, default=2000000)
+    parser.add_argument("--bench-days", type=int, default=180, help="Spread synthetic rows over this many days")
+    parser.add_argument("--bench-retention", type=int, default=30)
+    parser.add_argument("--bench-batches", default="1000,5000,20000")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    if not args.conn:
+        raise SystemExit("Missing --conn or STAYBOT_CONN")
+    conn = connect(args.conn)
+    try:
+        if args.command == "bench":
+            bench(conn, args.bench_conversations, args.bench_messages, args.bench_days, args.bench_retention,
+                  [int(b) for b in args.bench_batches.split(",") if b.strip()])
+            return
+        tenant_ids = [int(t) for t in args.tenant_ids.split(",")] if args.tenant_ids else None
+        tenants = tenants_with_retention(conn, tenant_ids)
+        if args.command == "purge" and args.fresh and os.path.exists(args.checkpoint):
+            os.remove(args.checkpoint)
+        checkpoint = Checkpoint(None if args.command == "estimate" else args.checkpoint)
+        totals = run_purge(conn, "public", tenants, args.batch_ids, args.rate, args.max_lag, checkpoint, dry_run=args.command == "estimate")
+        verb = "would delete" if args.command == "estimate" else "deleted"
+        if args.command == "purge":
+            # Only the tenants this run finished start their next run from fresh cutoffs; a --tenant-ids run
+            # leaves other tenants' interrupted progress in place
+            checkpoint.clear([t[0] for t in tenants])
+        print(f"Total {verb}: " + ", ".join(f"{t}={sum(r[2] for r in totals if r[1] == t)}" for t in ("Messages", "Conversations")))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@ import os
 import argparse
 import uuid
 
+from tracing import add_trace_args, instrument, start_from_args
+
 try:
     import psycopg2
     import psycopg2.extras
@@ -38,9 +40,9 @@ def connect(conn_str: str):
             return " ".join(f"{k}={v}" for k, v in kv.items())
         return s
     try:
-        return psycopg2.connect(conn_str, cursor_factory=psycopg2.extras.DictCursor)
+        return instrument(psycopg2.connect(conn_str, cursor_factory=psycopg2.extras.DictCursor))
     except Exception:
-        return psycopg2.connect(to_dsn(conn_str), cursor_factory=psycopg2.extras.DictCursor)
+        return instrument(psycopg2.connect(to_dsn(conn_str), cursor_factory=psycopg2.extras.DictCursor))
 
 
 def table_exists(conn, schema: str, table: str) -> bool:
@@ -139,7 +141,9 @@ def main():
     parser.add_argument('--no-role', action='store_true', help='Do not link to Admin role')
     parser.add_argument('--no-tenant-link', action='store_true', help='Do not link to TenantUsers')
     parser.add_argument('--password-hash', help='If provided, update AspNetUsers.PasswordHash for the user (use Identity hasher output)')
+    add_trace_args(parser)
     args = parser.parse_args()
+    start_from_args(args)
 
     if not args.conn:
         raise SystemExit('Missing --conn or STAYBOT_CONN')
@@ -1,6 +1,13 @@
+import io
 import os
+import csv
+import math
+import time
+import random
 import argparse
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+from zoneinfo import ZoneInfo
 
 try:
     import psycopg2
@@ -8,6 +15,63 @@ try:
 except Exception:
     psycopg2 = None
 
+from tracing import add_trace_args, instrument, span, start_from_args
+
+# Guest phrasing per intent, shared with load_simulate_message. Keys cover the intents
+# seed_intent_settings creates, the IntentNames offered on the onboarding workbook, and the
+# maintenance cases from run_tests.sh.
+INTENT_CORPUS = {
+    "late_checkout": [
+        "Can I checkout at 2pm?",
+        "Is late checkout possible tomorrow?",
+        "Could we stay in the room until 1pm please",
+        "What does a late check out cost?",
+    ],
+    "request_towels": [
+        "Can I get extra towels please",
+        "We need two more bath towels in room 12",
+        "Please send fresh towels",
+        "Do you have pool towels?",
+    ],
+    "request_water": [
+        "Can you bring some water to my room",
+        "We ran out of bottled water",
+        "2 bottles of still water please",
+    ],
+    "CHECK_IN_OUT": [
+        "What time is check-in?",
+        "Can I check in early at 10am?",
+        "What time do I need to check out?",
+        "Where do I collect my keys when I arrive?",
+    ],
+    "DIRECTIONS": [
+        "Where is the gym?",
+        "How do I get to the pool?",
+        "Which floor is the conference room on?",
+        "Where can I park my car?",
+    ],
+    "RECOMMENDATION": [
+        "Can you recommend a restaurant nearby?",
+        "What is there to do in the area this weekend?",
+        "Any good coffee shops close by?",
+    ],
+    "FEEDBACK": [
+        "The room was lovely, thank you!",
+        "The aircon is very noisy",
+        "Breakfast was cold this morning",
+    ],
+    "CANCELLATION": [
+        "I need to cancel my booking",
+        "Can I cancel tomorrow's reservation without a fee?",
+    ],
+    "MAINTENANCE": [
+        "I smell gas in my room",
+        "Water is leaking from the ceiling",
+        "The light bulb is out",
+        "The TV remote is not working",
+    ],
+}
+
 
 def _parse_conn_str(conn_str: str):
     if not conn_str:
@@ -44,12 +108,12 @@ def connect(conn_str):
     if not psycopg2:
         raise RuntimeError("psycopg2 not installed. Run: python -m pip install --user psycopg2-binary")
     try:
-        return psycopg2.connect(conn_str, cursor_factory=psycopg2.extras.DictCursor)
+        return instrument(psycopg2.connect(conn_str, cursor_factory=psycopg2.extras.DictCursor))
     except Exception:
         dsn = _parse_conn_str(conn_str)
         if not dsn:
             raise
-        return psycopg2.connect(dsn, cursor_factory=psycopg2.extras.DictCursor)
+        return instrument(psycopg2.connect(dsn, cursor_factory=psycopg2.extras.DictCursor))
 
 
 def fetch_one(conn, sql, params=None):
@@ -69,7 +133,33 @@ def table_has_columns(conn, schema: str, table: str, columns: list[str]) -> bool
         return cnt == len(columns)
 
 
+# Seconds spent waiting per (tenant_id, table) lock, reported by main()
+LOCK_WAITS = {}
+
+
+def seed_lock(conn, tenant_id, table, session=False):
+    """Advisory lock on (table, tenant) so concurrent seeders never both pass the COUNT check.
+
+    Transaction-scoped by default, so it is released when the seeding step commits; session locks
+    (for history, which commits per batch) must be released with seed_unlock.
+    """
+    key = ['seed_demo_data.' + table, tenant_id]
+    try_kind, kind = ('pg_try_advisory_lock', 'pg_advisory_lock') if session else ('pg_try_advisory_xact_lock', 'pg_advisory_xact_lock')
+    started = time.perf_counter()
+    with conn.cursor() as cur:
+        cur.execute(f'SELECT {try_kind}(hashtext(%s), %s)', key)
+        if not cur.fetchone()[0]:
+            cur.execute(f'SELECT {kind}(hashtext(%s), %s)', key)
+    LOCK_WAITS[(tenant_id, table)] = LOCK_WAITS.get((tenant_id, table), 0.0) + time.perf_counter() - started
+
+
+def seed_unlock(conn, tenant_id, table):
+    with conn.cursor() as cur:
+        cur.execute('SELECT pg_advisory_unlock(hashtext(%s), %s)', ['seed_demo_data.' + table, tenant_id])
+
+
 def seed_business_info(conn, tenant_id, dry_run=False):
+    seed_lock(conn, tenant_id, 'BusinessInfo')
     count = fetch_one(conn, 'SELECT COUNT(1) FROM public."BusinessInfo" WHERE "TenantId"=%s', [tenant_id]) or 0
     if count > 0:
         return 0
@@ -93,6 +183,7 @@ def seed_business_info(conn, tenant_id, dry_run=False):
 
 
 def seed_information_items(conn, tenant_id, dry_run=False):
+    seed_lock(conn, tenant_id, 'InformationItems')
     count = fetch_one(conn, 'SELECT COUNT(1) FROM public."InformationItems" WHERE "TenantId"=%s', [tenant_id]) or 0
     if count > 0:
         return 0
@@ -115,6 +206,7 @@ def seed_information_items(conn, tenant_id, dry_run=False):
 
 
 def seed_intent_settings(conn, tenant_id, dry_run=False):
+    seed_lock(conn, tenant_id, 'IntentSettings')
     count = fetch_one(conn, 'SELECT COUNT(1) FROM public."IntentSettings" WHERE "TenantId"=%s', [tenant_id]) or 0
     if count > 0:
         return 0
@@ -137,6 +229,7 @@ def seed_intent_settings(conn, tenant_id, dry_run=False):
 
 
 def seed_property_directions(conn, tenant_id, dry_run=False):
+    seed_lock(conn, tenant_id, 'PropertyDirections')
     count = fetch_one(conn, 'SELECT COUNT(1) FROM public."PropertyDirections" WHERE "TenantId"=%s', [tenant_id]) or 0
     if count > 0:
         return 0
@@ -159,6 +252,7 @@ def seed_property_directions(conn, tenant_id, dry_run=False):
 
 
 def seed_welcome_messages(conn, tenant_id, dry_run=False):
+    seed_lock(conn, tenant_id, 'WelcomeMessages')
     count = fetch_one(conn, 'SELECT COUNT(1) FROM public."WelcomeMessages" WHERE "TenantId"=%s', [tenant_id]) or 0
     if count > 0:
         return 0
@@ -182,6 +276,7 @@ def seed_welcome_messages(conn, tenant_id, dry_run=False):
 
 def seed_bookings(conn, tenant_id, dry_run=False):
     # Optional demo bookings to light up dashboard/analytics; insert only if none exist
+    seed_lock(conn, tenant_id, 'Bookings')
     exists = fetch_one(conn, 'SELECT COUNT(1) FROM public."Bookings" WHERE "TenantId"=%s', [tenant_id]) or 0
     if exists > 0:
         return 0
@@ -209,30 +304,391 @@ def seed_bookings(conn, tenant_id, dry_run=False):
     return len(rows)
 
 
+# --- Conversation history for worker/endpoint benchmarks ---------------------------------------
+
+# Guest-local hour weights: breakfast and evening peaks, quiet small hours
+HOUR_WEIGHTS = [1, 0.5, 0.3, 0.2, 0.2, 0.5, 2, 5, 8, 9, 7, 6, 6, 5, 5, 6, 7, 8, 9, 10, 9, 7, 4, 2]
+
+# Bot reply per intent; replies for intents without an entry fall back to GENERIC_REPLIES
+BOT_REPLIES = {
+    "late_checkout": ["We will check availability and confirm shortly.", "Late checkout until 13:00 is available at no charge."],
+    "request_towels": ["Housekeeping will bring fresh towels to your room shortly.", "Extra towels are on their way."],
+    "request_water": ["Room service will deliver water to your room in about 15 minutes."],
+    "CHECK_IN_OUT": ["Check-in is from 14:00 and checkout is at 10:00.", "Early check-in may be arranged subject to availability."],
+    "DIRECTIONS": ["From the lobby, take the elevator to Level 2 and follow the signs.", "The pool is in the courtyard, opposite the restaurant."],
+    "RECOMMENDATION": ["Our concierge recommends the bistro around the corner. Shall I book a table?"],
+    "FEEDBACK": ["Thank you for letting us know, I have passed this on to the team."],
+    "CANCELLATION": ["I have asked the front desk to assist with your cancellation."],
+    "MAINTENANCE": ["Maintenance has been notified and will attend to it as soon as possible."],
+}
+GENERIC_REPLIES = ["Thank you, how else can I help?", "Noted! Anything else I can do for you?"]
+# Later turns in a session are often just acknowledgements with no intent
+FOLLOW_UPS = ["Thank you!", "Great, thanks", "Ok perfect", "How long will that take?", "Thanks so much"]
+
+# (TaskType, Department, Title) for intents that put work on a staff queue
+INTENT_TASKS = {
+    "request_towels": ("deliver_item", "Housekeeping", "Deliver towels"),
+    "request_water": ("deliver_item", "FoodService", "Deliver bottled water"),
+    "late_checkout": ("frontdesk", "FrontDesk", "Late checkout request"),
+    "CANCELLATION": ("frontdesk", "FrontDesk", "Booking cancellation"),
+    "MAINTENANCE": ("maintenance", "Maintenance", "Maintenance request"),
+}
+
+# DepartmentDefaults.DefaultDepartments[HotelSize.Medium] in Models/TenantDepartment.cs
+DEFAULT_DEPARTMENTS = ['FrontDesk', 'Housekeeping', 'Maintenance', 'Concierge', 'FoodService']
+
+RAG_INTENTS = {"CHECK_IN_OUT", "DIRECTIONS", "RECOMMENDATION"}
+REPLY_MODEL = 'gpt-4.1-mini-2025-04-14'
+
+
+def seed_tenant_departments(conn, tenant_id, dry_run=False):
+    seed_lock(conn, tenant_id, 'TenantDepartments')
+    count = fetch_one(conn, 'SELECT COUNT(1) FROM public."TenantDepartments" WHERE "TenantId"=%s', [tenant_id]) or 0
+    if count > 0:
+        return 0
+    rows = [(tenant_id, name, None, True, i + 1, None, '24/7', None) for i, name in enumerate(DEFAULT_DEPARTMENTS)]
+    base_cols = ['TenantId','DepartmentName','Description','IsActive','Priority','ContactInfo','WorkingHours','MaxConcurrentTasks']
+    sql = 'INSERT INTO public."TenantDepartments" ("'+'","'.join(base_cols+['CreatedAt','UpdatedAt'])+'") VALUES (%s,%s,%s,%s,%s,%s,%s,%s, NOW(), NOW())'
+    with conn.cursor() as cur:
+        for r in rows:
+            if not dry_run:
+                cur.execute(sql, r)
+    return len(rows)
+
+
+# public.<name> -> the base table that takes COPY, resolved once per run
+STORAGE_TABLES = {}
+
+
+def storage_table(conn, table):
+    """The table itself, or the partitioned table behind it once partition_migrate has swapped the name for a view.
+
+    COPY cannot write into a view, and NOT NULL and sequence metadata live on the base table.
+    """
+    if table not in STORAGE_TABLES:
+        base = table
+        with conn.cursor() as cur:
+            cur.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [f'public."{table}"'])
+            row = cur.fetchone()
+            if row and row[0] == 'v':
+                cur.execute("SELECT table_name FROM information_schema.view_table_usage WHERE view_schema='public' AND view_name=%s", [table])
+                used = [r[0] for r in cur.fetchall()]
+                if len(used) != 1:
+                    raise SystemExit(f'public."{table}" is a view over {len(used)} tables; cannot seed through it')
+                base = used[0]
+        STORAGE_TABLES[table] = base
+    return STORAGE_TABLES[table]
+
+
+def required_defaults(conn, table, given):
+    """Zero values for NOT NULL columns without a DB default that the generator does not set.
+
+    Entities pick up non-nullable columns over time (bool flags, counters) that EF fills in on
+    the C# side; COPY bypasses EF, so fill them the way EF would.
+    """
+    q = (
+        'SELECT column_name, data_type FROM information_schema.columns '
+        "WHERE table_schema='public' AND table_name=%s AND is_nullable='NO' "
+        "AND column_default IS NULL AND is_identity='NO' AND NOT (column_name = ANY(%s))"
+    )
+    zero = {'boolean': 'f', 'integer': 0, 'bigint': 0, 'smallint': 0, 'numeric': 0, 'double precision': 0, 'real': 0}
+    out = {}
+    with conn.cursor() as cur:
+        cur.execute(q, [storage_table(conn, table), list(given) + ['Id']])
+        for name, data_type in cur.fetchall():
+            if data_type.startswith('timestamp'):
+                out[name] = 'now'
+            elif data_type == 'date':
+                out[name] = 'today'
+            else:
+                out[name] = zero.get(data_type, '')
+    return out
+
+
+def reserve_ids(conn, table, n):
+    # Claim a contiguous block from the identity sequence so child rows can reference parents in
+    # the same COPY batch. Only seeders of the same sequence wait on each other, and only for one
+    # statement: a table lock here would serialise the --jobs seeders of different tenants. A lone
+    # nextval from the API between our nextval and setval would land inside the block; seeding is
+    # not meant to run beside live traffic.
+    table = storage_table(conn, table)
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_get_serial_sequence(%s, 'Id')", [f'public."{table}"'])
+        seq = cur.fetchone()[0]
+        if seq is None:
+            raise SystemExit(f'public."{table}"."Id" has no owned sequence; cannot reserve ids')
+        key = ['seed_demo_data.seq:' + seq]
+        cur.execute('SELECT pg_advisory_lock(hashtext(%s))', key)
+        try:
+            cur.execute('SELECT setval(%s, nextval(%s) + %s - 1)', [seq, seq, n])
+            end = cur.fetchone()[0]
+        finally:
+            cur.execute('SELECT pg_advisory_unlock(hashtext(%s))', key)
+    return end - n + 1
+
+
+def copy_rows(conn, table, cols, rows, extra=None):
+    if not rows:
+        return 0
+    extra = extra or {}
+    extra_vals = list(extra.values())
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator='\n')
+    for r in rows:
+        # \N marks NULL so empty strings stay empty strings
+        writer.writerow([r'\N' if v is None else v for v in r] + extra_vals)
+    buf.seek(0)
+    all_cols = list(cols) + list(extra)
+    with conn.cursor() as cur:
+        cur.copy_expert(f'COPY public."{storage_table(conn, table)}" ("' + '","'.join(all_cols) + '") FROM STDIN WITH (FORMAT csv, NULL \'\\N\')', buf)
+    return len(rows)
+
+
+def ts(dt):
+    return dt.strftime('%Y-%m-%d %H:%M:%S+00')
+
+
+def load_history_inputs(conn, tenant_id, start):
+    with conn.cursor() as cur:
+        cur.execute(
+            'SELECT "Id","GuestName","Phone","RoomNumber","CheckinDate","CheckoutDate" FROM public."Bookings" '
+            'WHERE "TenantId"=%s AND "CheckoutDate" >= %s AND "Status" <> %s AND COALESCE("Phone", \'\') <> \'\' ORDER BY "CheckinDate", "Id"',
+            [tenant_id, start.date(), 'Cancelled'])
+        bookings = [tuple(r) for r in cur.fetchall()]
+        cur.execute('SELECT "IntentName","Priority","AssignedDepartment","TaskPriority","NotifyStaff" FROM public."IntentSettings" WHERE "TenantId"=%s AND "IsEnabled"', [tenant_id])
+        intents = [tuple(r) for r in cur.fetchall()]
+        cur.execute('SELECT "DepartmentName" FROM public."TenantDepartments" WHERE "TenantId"=%s AND "IsActive" ORDER BY "Priority"', [tenant_id])
+        departments = [r[0] for r in cur.fetchall()]
+        cur.execute('SELECT "Timezone" FROM public."Tenants" WHERE "Id"=%s', [tenant_id])
+        row = cur.fetchone()
+    return bookings, intents, departments, (row[0] if row else None) or 'UTC'
+
+
+def synth_bookings(conn, tenant_id, rooms, occupancy, start, end, rng, dry_run=False):
+    """Fill `rooms` rooms at roughly `occupancy` with back-to-back stays between start and end."""
+    stays = []
+    for room in range(1, rooms + 1):
+        day = start.date() + timedelta(days=rng.randint(0, 3))
+        while day < end.date():
+            nights = min(int(rng.expovariate(1 / 2.5)) + 1, 14)
+            if rng.random() < occupancy:
+                phone = f'+27601{tenant_id:03d}{len(stays):06d}'[:20]
+                stays.append([f'Guest {len(stays) + 1}', phone, str(100 + room), day, day + timedelta(days=nights)])
+            day += timedelta(days=nights)
+    if not stays or dry_run:
+        return [(None, *s) for s in stays]
+    first = reserve_ids(conn, 'Bookings', len(stays))
+    today = datetime.utcnow().date()
+    cols = ['Id','TenantId','GuestName','Phone','RoomNumber','CheckinDate','CheckoutDate','Status','Source','NumberOfGuests','TotalNights','RoomRate','CreatedAt']
+    rows = []
+    for i, (name, phone, room, checkin, checkout) in enumerate(stays):
+        status = 'CheckedOut' if checkout < today else 'CheckedIn' if checkin <= today else 'Confirmed'
+        created = datetime.combine(checkin, datetime.min.time()) - timedelta(days=rng.randint(1, 45))
+        rows.append((first + i, tenant_id, name, phone, room, checkin, checkout, status, 'SEED', 2, (checkout - checkin).days, 1500, ts(created)))
+    copy_rows(conn, 'Bookings', cols, rows, required_defaults(conn, 'Bookings', cols))
+    return [(first + i, *s) for i, s in enumerate(stays)]
+
+
+def plan_sessions(rng, checkin, checkout, tz, per_night, now):
+    """UTC start times of guest chat sessions for one stay: optional pre-arrival, then Poisson per night."""
+    days = [checkin - timedelta(days=1)] if rng.random() < 0.4 else []
+    nights = max((checkout - checkin).days, 1)
+    for d in range(nights + 1):
+        n = 0
+        # Knuth Poisson draw; per_night is small so this is cheap
+        limit, p = math.exp(-per_night), rng.random()
+        while p > limit:
+            n += 1
+            p *= rng.random()
+        days.extend([checkin + timedelta(days=d)] * n)
+    out = []
+    for day in days:
+        hour = rng.choices(range(24), HOUR_WEIGHTS)[0]
+        local = datetime(day.year, day.month, day.day, hour, rng.randint(0, 59), rng.randint(0, 59), tzinfo=tz)
+        started = local.astimezone(timezone.utc).replace(tzinfo=None)
+        if started < now:
+            out.append(started)
+    out.sort()
+    return out
+
+
+def resolve_department(name, departments):
+    key = (name or '').replace(' ', '').lower()
+    for d in departments:
+        if d.replace(' ', '').lower() == key:
+            return d
+    return departments[0] if departments else (name or 'General')
+
+
+def seed_conversation_history(conn, tenant_id, months, per_night=1.2, rooms=0, occupancy=0.7, seed=1, batch=2000, dry_run=False, progress=True):
+    """COPY months of guest conversations, messages and staff tasks that follow the tenant's Bookings.
+
+    Commits every `batch` conversations so tens of millions of messages never sit in one transaction.
+    Like the other steps it only fills an empty tenant: with any Conversations already there (an
+    earlier run) nothing is generated, synthetic Bookings included. The check runs under a session
+    lock held until the last batch commits, so a seeder that waited on another finds its history
+    and returns. Returns row counts per table.
+    """
+    counts = {'Bookings': 0, 'Conversations': 0, 'Messages': 0, 'StaffTasks': 0}
+    seed_lock(conn, tenant_id, 'history', session=True)
+    try:
+        existing = fetch_one(conn, 'SELECT COUNT(1) FROM public."Conversations" WHERE "TenantId"=%s', [tenant_id]) or 0
+        if existing > 0:
+            print(f'[history] tenant {tenant_id}: {existing} conversations already present, skipped')
+            return counts
+        return generate_history(conn, tenant_id, months, per_night, rooms, occupancy, seed, batch, dry_run, progress, counts)
+    finally:
+        conn.rollback()
+        seed_unlock(conn, tenant_id, 'history')
+        conn.commit()
+
+
+def generate_history(conn, tenant_id, months, per_night, rooms, occupancy, seed, batch, dry_run, progress, counts):
+    rng = random.Random(seed * 1000003 + tenant_id)
+    now = datetime.utcnow()
+    start = now - timedelta(days=30 * months)
+    if not dry_run:
+        counts['TenantDepartments'] = seed_tenant_departments(conn, tenant_id)
+    bookings, intent_rows, departments, tz_name = load_history_inputs(conn, tenant_id, start)
+    departments = departments or DEFAULT_DEPARTMENTS
+    try:
+        tz = ZoneInfo(tz_name)
+    except Exception:
+        tz = timezone.utc
+    if rooms:
+        synthetic = synth_bookings(conn, tenant_id, rooms, occupancy, start, now + timedelta(days=14), rng, dry_run)
+        counts['Bookings'] = len(synthetic)
+        bookings.extend(synthetic)
+    if not dry_run:
+        conn.commit()
+
+    # Configured intents weigh 1-2x by IntentSettings priority; corpus intents without a setting keep
+    # weight 1 so FAQ-style traffic is still present
+    weights = {k: 1.0 for k in INTENT_CORPUS}
+    task_settings = {}
+    top_priority = max([max(r[1] or 0, 0) for r in intent_rows] + [1])
+    for name, priority, department, task_priority, notify in intent_rows:
+        key = name if name in INTENT_CORPUS else name.upper() if name.upper() in INTENT_CORPUS else None
+        if key:
+            weights[key] = 1.0 + max(priority or 0, 0) / top_priority
+            task_settings[key] = (department, task_priority or 'Normal', notify)
+    intent_names = list(weights)
+    intent_weights = [weights[k] for k in intent_names]
+
+    conv_cols = ['Id','TenantId','WaUserPhone','Status','CreatedAt','LastBotReplyAt','ConversationMode']
+    msg_cols = ['TenantId','ConversationId','Direction','MessageType','Body','Model','UsedRag','TokensPrompt','TokensCompletion','IntentClassification','CreatedAt']
+    task_cols = ['TenantId','ConversationId','BookingId','Title','TaskType','Department','Quantity','RoomNumber','GuestName','GuestPhone','Status','Priority','CreatedAt','UpdatedAt','CompletedAt']
+    extras = {} if dry_run else {t: required_defaults(conn, t, c) for t, c in (('Conversations', conv_cols), ('Messages', msg_cols), ('StaffTasks', task_cols))}
+    started = time.perf_counter()
+
+    for offset in range(0, len(bookings), batch):
+        chunk = bookings[offset:offset + batch]
+        plans = [(b, plan_sessions(rng, b[4], b[5], tz, per_night, now)) for b in chunk]
+        plans = [(b, s) for b, s in plans if s]
+        if not plans:
+            continue
+        first_id = 0 if dry_run else reserve_ids(conn, 'Conversations', len(plans))
+        conversations, messages, tasks = [], [], []
+        for i, (booking, sessions) in enumerate(plans):
+            conv_id = first_id + i
+            booking_id, guest, phone, room = booking[0], booking[1], booking[2], booking[3]
+            last_reply = None
+            for session_start in sessions:
+                t = session_start
+                session_tasks = set()
+                for turn in range(rng.choice((1, 1, 2, 2, 3, 4))):
+                    if turn and rng.random() < 0.5:
+                        intent, text, reply = None, rng.choice(FOLLOW_UPS), rng.choice(GENERIC_REPLIES)
+                    else:
+                        intent = rng.choices(intent_names, intent_weights)[0]
+                        text, reply = rng.choice(INTENT_CORPUS[intent]), rng.choice(BOT_REPLIES.get(intent, GENERIC_REPLIES))
+                    messages.append((tenant_id, conv_id, 'Inbound', 'text', text, None, 'f', None, None, intent, ts(t)))
+                    last_reply = t + timedelta(seconds=rng.uniform(1.5, 9.0))
+                    messages.append((tenant_id, conv_id, 'Outbound', 'text', reply, REPLY_MODEL, 't' if intent in RAG_INTENTS else 'f',
+                                     rng.randint(600, 2400), rng.randint(15, 120), intent, ts(last_reply)))
+                    setting = task_settings.get(intent)
+                    # One task per intent per session; repeats in the same chat update the same request
+                    if intent in INTENT_TASKS and intent not in session_tasks and (setting is None or setting[2]):
+                        session_tasks.add(intent)
+                        task_type, default_dept, title = INTENT_TASKS[intent]
+                        dept = resolve_department(setting[0] if setting and setting[0] else default_dept, departments)
+                        done = last_reply + timedelta(minutes=rng.uniform(5, 90))
+                        status = 'Completed' if done < now else rng.choice(('Open', 'InProgress'))
+                        tasks.append((tenant_id, conv_id, booking_id, title, task_type, dept, 1, room, guest, phone, status,
+                                      setting[1] if setting else 'Normal', ts(last_reply), ts(min(done, now)), ts(done) if status == 'Completed' else None))
+                    t = last_reply + timedelta(seconds=rng.uniform(20, 240))
+            status = 'Closed' if booking[5] < now.date() - timedelta(days=1) else 'Active'
+            conversations.append((conv_id, tenant_id, phone, status, ts(sessions[0]), ts(last_reply), 'Normal'))
+
+        if not dry_run:
+            copy_rows(conn, 'Conversations', conv_cols, conversations, extras['Conversations'])
+            copy_rows(conn, 'Messages', msg_cols, messages, extras['Messages'])
+            copy_rows(conn, 'StaffTasks', task_cols, tasks, extras['StaffTasks'])
+            conn.commit()
+        counts['Conversations'] += len(conversations)
+        counts['Messages'] += len(messages)
+        counts['StaffTasks'] += len(tasks)
+        if progress:
+            elapsed = time.perf_counter() - started
+            print(f"[history] tenant {tenant_id}: {offset + len(chunk)}/{len(bookings)} bookings, "
+                  f"{counts['Messages']} messages ({counts['Messages'] / elapsed if elapsed else 0:,.0f}/s)")
+    return counts
+
+
+SEED_STEPS = [seed_business_info, seed_information_items, seed_intent_settings, seed_property_directions, seed_welcome_messages, seed_bookings]
+
+
+def seed_tenant(conn_str, tenant_id, args):
+    """All seed steps for one tenant on its own connection. Each step commits on its own so its
+    (tenant, table) lock is held only while that table is checked and filled."""
+    conn = connect(conn_str)
+    total = 0
+    try:
+        for step in SEED_STEPS:
+            with conn, span(step.__name__, 'seed', tenant=tenant_id):
+                total += step(conn, tenant_id, dry_run=args.dry_run)
+        if args.history_months:
+            with span('seed_conversation_history', 'seed', tenant=tenant_id):
+                counts = seed_conversation_history(
+                    conn, tenant_id, args.history_months, per_night=args.history_per_night, rooms=args.history_rooms,
+                    occupancy=args.history_occupancy, seed=args.seed, batch=args.history_batch, dry_run=args.dry_run)
+            print(f'History rows (tenant {tenant_id}): ' + ', '.join(f'{k}={v}' for k, v in counts.items()))
+            total += sum(counts.values())
+    finally:
+        conn.close()
+    return total
+
+
 def main():
     parser = argparse.ArgumentParser(description='Seed demo data for StayBot UI')
     parser.add_argument('--conn', default=os.environ.get('STAYBOT_CONN'), help='PostgreSQL connection string (or set STAYBOT_CONN)')
     parser.add_argument('--tenant-id', type=int, default=1)
+    parser.add_argument('--tenant-ids', type=lambda v: [int(x) for x in v.split(',') if x.strip()], help='Comma-separated tenants to seed (overrides --tenant-id)')
+    parser.add_argument('--jobs', type=int, default=1, help='Tenants seeded in parallel, one connection each')
     parser.add_argument('--dry-run', action='store_true')
+    parser.add_argument('--history-months', type=int, default=0, help='Also generate this many months of conversations/messages/tasks following Bookings')
+    parser.add_argument('--history-per-night', type=float, default=1.2, help='Mean guest chat sessions per stay night')
+    parser.add_argument('--history-rooms', type=int, default=0, help='Synthesize Bookings for this many rooms across the history window first')
+    parser.add_argument('--history-occupancy', type=float, default=0.7, help='Occupancy for synthesized Bookings')
+    parser.add_argument('--history-batch', type=int, default=2000, help='Conversations per COPY batch/commit')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed for generated history')
+    add_trace_args(parser)
     args = parser.parse_args()
+    start_from_args(args)
 
     if not args.conn:
         raise SystemExit('Missing --conn or STAYBOT_CONN')
 
-    conn = connect(args.conn)
-    total = 0
-    try:
-        with conn:
-            total += seed_business_info(conn, args.tenant_id, dry_run=args.dry_run)
-            total += seed_information_items(conn, args.tenant_id, dry_run=args.dry_run)
-            total += seed_intent_settings(conn, args.tenant_id, dry_run=args.dry_run)
-            total += seed_property_directions(conn, args.tenant_id, dry_run=args.dry_run)
-            total += seed_welcome_messages(conn, args.tenant_id, dry_run=args.dry_run)
-            total += seed_bookings(conn, args.tenant_id, dry_run=args.dry_run)
-    finally:
-        conn.close()
+    tenants = args.tenant_ids or [args.tenant_id]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(args.jobs, len(tenants)))) as pool:
+        total = sum(pool.map(lambda t: seed_tenant(args.conn, t, args), tenants))
 
-    print(f"Seed completed. Inserted rows: {total} (dry_run={args.dry_run})")
+    waited = {k: v for k, v in LOCK_WAITS.items() if v >= 0.001}
+    print(f"Seed completed. Inserted rows: {total} (dry_run={args.dry_run}) in {time.perf_counter() - started:.1f}s; "
+          f"advisory lock wait {sum(LOCK_WAITS.values()):.3f}s")
+    for (tenant_id, table), seconds in sorted(waited.items(), key=lambda kv: -kv[1]):
+        print(f"  waited {seconds:.3f}s for tenant {tenant_id} {table}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,286 @@
+import os
+import io
+import time
+import zlib
+import random
+import struct
+import argparse
+from datetime import datetime, timezone
+
+from loadstats import Histogram
+from seed_demo_data import connect, required_defaults
+from tracing import add_trace_args, start_from_args
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+# Column type of KnowledgeBaseChunks.Embedding (HostrDbContext / WorkersDbContext)
+DIM = 1536
+
+FACILITIES = [
+    "pool", "gym", "spa", "sauna", "restaurant", "bar", "rooftop terrace", "breakfast room", "business center",
+    "conference room", "laundry", "parking garage", "EV charger", "kids club", "tennis court", "beach shuttle",
+    "airport shuttle", "concierge desk", "luggage room", "Wi-Fi", "minibar", "room safe", "hair dryer", "iron",
+    "cot", "extra bed", "balcony", "air conditioning", "heater", "TV", "coffee machine", "kettle", "bathrobe",
+    "slippers", "reception", "lift", "garden", "braai area", "library", "games room", "chapel", "wine cellar",
+    "tour desk", "bicycle rental", "car hire", "currency exchange", "ATM", "pharmacy", "shop", "hot tub",
+]
+PATTERNS = [
+    "What time does the {f} open?", "When does the {f} close?", "Where is the {f}?", "Is the {f} free for guests?",
+    "Do I need to book the {f}?", "Can children use the {f}?", "Is the {f} open {m}?", "How much does the {f} cost {m}?",
+    "Is there a {f} in my room?", "Can I get a {f} brought to my room?", "Who do I call about the {f}?",
+    "Is the {f} wheelchair accessible?", "Can I bring guests to the {f}?", "Is the {f} available {m}?",
+    "How do I get to the {f} from reception?", "Does the {f} need a reservation {m}?", "Is the {f} heated?",
+    "What are the rules for the {f}?", "Is the {f} included in my rate?", "Can I pay for the {f} with card?",
+]
+MODIFIERS = ["today", "tomorrow", "on weekends", "in winter", "after 10pm", "early in the morning", "on public holidays",
+             "during renovations", "for long stays", "for day visitors"]
+
+
+def synth_questions(n, rng):
+    return [rng.choice(PATTERNS).format(f=rng.choice(FACILITIES), m=rng.choice(MODIFIERS)) for _ in range(n)]
+
+
+def paraphrase(text, rng):
+    """Cheap query-side variation: lowercase, drop a word, swap a filler; keeps most n-grams shared."""
+    words = text.lower().rstrip("?").split()
+    if len(words) > 4:
+        del words[rng.randrange(1, len(words) - 1)]
+    lead = rng.choice(["", "hi, ", "please tell me ", "quick question: "])
+    return lead + " ".join(words) + rng.choice(["?", "", " thanks"])
+
+
+class HashedNgramEmbedder:
+    """Deterministic stand-in for the embedding API.
+
+    Word uni/bigrams and character 3-5 grams are hashed (crc32, salted with the seed) and each feature
+    is sparsely projected onto `nnz` of the `dim` output dimensions with a +/-1 sign (sparse
+    Johnson-Lindenstrauss). Vectors are L2-normalised, so texts sharing n-grams have high cosine
+    similarity and the data clusters the way real embeddings do, instead of being uniform noise.
+    """
+
+    def __init__(self, dim=DIM, nnz=8, seed=0):
+        self.dim = dim
+        self.nnz = nnz
+        self.salt = struct.pack("<I", seed & 0xFFFFFFFF)
+        # Per-slot odd multipliers used to spread one feature hash over nnz dimensions
+        self.mult = np.array([0x9E3779B1 + 2 * i * 0x85EBCA77 for i in range(nnz)], dtype=np.uint64) | np.uint64(1)
+
+    def features(self, text):
+        t = " ".join(text.lower().split())
+        words = t.split()
+        feats = words + [a + " " + b for a, b in zip(words, words[1:])]
+        padded = f" {t} "
+        for n in (3, 4, 5):
+            feats.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return [zlib.crc32(self.salt + f.encode("utf-8")) for f in feats]
+
+    def embed(self, texts):
+        rows, hashes = [], []
+        for i, text in enumerate(texts):
+            h = self.features(text)
+            hashes.extend(h)
+            rows.extend([i] * len(h))
+        h = np.array(hashes, dtype=np.uint64)[:, None]
+        mixed = (h * self.mult[None, :]) & np.uint64(0xFFFFFFFF)
+        dims = (mixed % np.uint64(self.dim)).astype(np.int64)
+        signs = np.where((mixed >> np.uint64(31)) & np.uint64(1), 1.0, -1.0).astype(np.float32)
+        flat = np.repeat(np.array(rows, dtype=np.int64), self.nnz) * self.dim + dims.ravel()
+        out = np.bincount(flat, weights=signs.ravel(), minlength=len(texts) * self.dim).astype(np.float32).reshape(len(texts), self.dim)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+# --- binary COPY ---------------------------------------------------------------------------------
+
+PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+CHUNK_COLS = ["TenantId", "Source", "Language", "Content", "Embedding", "UpdatedAt"]
+
+
+def encode_rows(rows, vectors, updated_at):
+    """Binary COPY tuples for CHUNK_COLS; pgvector's binary form is int16 dim, int16 0, float4[] (big-endian)."""
+    ts = struct.pack("!iq", 8, int((updated_at - PG_EPOCH).total_seconds() * 1_000_000))
+    vec_head = struct.pack("!ihh", 4 + 4 * vectors.shape[1], vectors.shape[1], 0)
+    big = vectors.astype(">f4")
+    out = []
+    for (tenant_id, source, language, content), vec in zip(rows, big):
+        s, l, c = source.encode("utf-8"), language.encode("utf-8"), content.encode("utf-8")
+        out.append(struct.pack("!hii", len(CHUNK_COLS), 4, tenant_id))
+        out.append(struct.pack("!i", len(s)) + s + struct.pack("!i", len(l)) + l + struct.pack("!i", len(c)) + c)
+        out.append(vec_head + vec.tobytes() + ts)
+    return b"".join(out)
+
+
+def copy_chunks(conn, rows, vectors):
+    buf = io.BytesIO(COPY_HEADER + encode_rows(rows, vectors, datetime.now(timezone.utc)) + struct.pack("!h", -1))
+    with conn.cursor() as cur:
+        cur.copy_expert('COPY public."KnowledgeBaseChunks" ("' + '","'.join(CHUNK_COLS) + '") FROM STDIN WITH (FORMAT binary)', buf)
+    return buf.tell()
+
+
+def existing_sources(conn, tenant_ids):
+    """Rows the EmbeddingsWorker would embed offline: InformationItems and BusinessInfo per tenant."""
+    out = []
+    with conn.cursor() as cur:
+        cur.execute('SELECT "Id","TenantId","Question" FROM public."InformationItems" WHERE "TenantId" = ANY(%s)', [tenant_ids])
+        out += [(t, f"InformationItem-{i}", "en", q) for i, t, q in cur.fetchall()]
+        cur.execute('SELECT "Id","TenantId","Title","Content" FROM public."BusinessInfo" WHERE "TenantId" = ANY(%s)', [tenant_ids])
+        out += [(t, f"BusinessInfo-{i}", "en", f"{title}: {content}") for i, t, title, content in cur.fetchall()]
+    return out
+
+
+def load(conn, tenant_ids, synthetic, batch, seed, replace):
+    extra = required_defaults(conn, "KnowledgeBaseChunks", CHUNK_COLS)
+    if extra:
+        raise SystemExit(f"KnowledgeBaseChunks has NOT NULL columns without defaults this loader does not fill: {sorted(extra)}")
+    rng = random.Random(seed)
+    embedder = HashedNgramEmbedder(seed=seed)
+    rows = existing_sources(conn, tenant_ids)
+    rows += [(tenant_ids[i % len(tenant_ids)], f"SEED-{i}", "en", q) for i, q in enumerate(synth_questions(synthetic, rng))]
+    if replace:
+        with conn.cursor() as cur:
+            cur.execute('DELETE FROM public."KnowledgeBaseChunks" WHERE "TenantId" = ANY(%s) AND ("Source" LIKE %s OR "Source" LIKE %s OR "Source" LIKE %s)',
+                        [tenant_ids, "SEED-%", "InformationItem-%", "BusinessInfo-%"])
+            print(f"Removed {cur.rowcount} previously seeded chunks")
+    embed_s = copy_s = 0.0
+    sent = 0
+    for offset in range(0, len(rows), batch):
+        part = rows[offset:offset + batch]
+        t0 = time.perf_counter()
+        vectors = embedder.embed([r[3] for r in part])
+        t1 = time.perf_counter()
+        sent += copy_chunks(conn, part, vectors)
+        conn.commit()
+        t2 = time.perf_counter()
+        embed_s += t1 - t0
+        copy_s += t2 - t1
+        print(f"[load] {offset + len(part)}/{len(rows)} rows  embed {embed_s:.1f}s  copy {copy_s:.1f}s ({sent / copy_s / 1e6 if copy_s else 0:.1f} MB/s)")
+    return len(rows)
+
+
+# --- index benchmark -----------------------------------------------------------------------------
+
+def vec_literal(v):
+    return "[" + ",".join(f"{x:.6g}" for x in v) + "]"
+
+
+def query_ids(cur, qvec, tenant_id, k, max_distance):
+    sql = 'SELECT "Id", ("Embedding" <=> %s::vector) AS distance FROM public."KnowledgeBaseChunks" WHERE "TenantId" = %s'
+    params = [qvec, tenant_id]
+    if max_distance:
+        # Same shape as MessageRoutingService's semantic search
+        sql += ' AND ("Embedding" <=> %s::vector) <= %s'
+        params += [qvec, max_distance]
+    cur.execute(sql + " ORDER BY distance LIMIT %s", params + [k])
+    return [r[0] for r in cur.fetchall()]
+
+
+def bench(conn, tenant_ids, queries, k, max_distance, configs, seed):
+    rng = random.Random(seed)
+    embedder = HashedNgramEmbedder(seed=seed)
+    with conn.cursor() as cur:
+        cur.execute('SELECT "TenantId", "Content" FROM public."KnowledgeBaseChunks" WHERE "TenantId" = ANY(%s) ORDER BY random() LIMIT %s', [tenant_ids, queries])
+        sample = cur.fetchall()
+        cur.execute('SELECT indexname FROM pg_indexes WHERE schemaname=%s AND tablename=%s AND indexdef ILIKE %s', ["public", "KnowledgeBaseChunks", '%"Embedding"%'])
+        existing = [r[0] for r in cur.fetchall()]
+    if not sample:
+        raise SystemExit("No KnowledgeBaseChunks for these tenants; run load first")
+    qs = [(t, vec_literal(v)) for (t, _), v in zip(sample, embedder.embed([paraphrase(c, rng) for _, c in sample]))]
+
+    results = []
+    for name, ddl, settings in [("exact", None, ["SET LOCAL enable_indexscan = off", "SET LOCAL enable_bitmapscan = off"])] + configs:
+        # Each configuration runs in its own transaction with the app's index dropped, then rolls back,
+        # so nothing about the schema changes
+        with conn.cursor() as cur:
+            for idx in existing:
+                cur.execute(f'DROP INDEX public."{idx}"')
+            build_s = 0.0
+            if ddl:
+                t0 = time.perf_counter()
+                cur.execute(ddl)
+                build_s = time.perf_counter() - t0
+                cur.execute("ANALYZE public.\"KnowledgeBaseChunks\"")
+            for s in settings:
+                cur.execute(s)
+            hist = Histogram()
+            hits = []
+            for tenant_id, qvec in qs:
+                t0 = time.perf_counter()
+                hits.append(query_ids(cur, qvec, tenant_id, k, max_distance))
+                hist.record(time.perf_counter() - t0)
+        conn.rollback()
+        results.append({"index": name, "build_s": build_s, "hist": hist, "hits": hits})
+
+    truth = results[0]["hits"]
+    print(f"{'index':34} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'recall@' + str(k):>10}")
+    for r in results:
+        found = sum(len(set(h) & set(t)) for h, t in zip(r["hits"], truth))
+        expected = sum(len(t) for t in truth)
+        recall = found / expected if expected else 1.0
+        h = r["hist"]
+        print(f"{r['index']:34} {r['build_s']:>8.2f} {h.percentile_ms(50):>8.2f} {h.percentile_ms(95):>8.2f} {h.percentile_ms(99):>8.2f} {recall:>10.3f}")
+
+
+def index_configs(lists, probes, m, ef_construction, ef_search):
+    table = 'public."KnowledgeBaseChunks"'
+    out = []
+    for l in lists:
+        for p in probes:
+            out.append((f"ivfflat lists={l} probes={p}", f'CREATE INDEX bench_ivfflat ON {table} USING ivfflat ("Embedding" vector_cosine_ops) WITH (lists = {l})',
+                        [f"SET LOCAL ivfflat.probes = {p}"]))
+    for ef in ef_search:
+        out.append((f"hnsw m={m} efc={ef_construction} ef={ef}", f'CREATE INDEX bench_hnsw ON {table} USING hnsw ("Embedding" vector_cosine_ops) WITH (m = {m}, ef_construction = {ef_construction})',
+                    [f"SET LOCAL hnsw.ef_search = {ef}"]))
+    return out
+
+
+def ints(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic offline embeddings for KnowledgeBaseChunks and pgvector index benchmarks")
+    parser.add_argument("command", choices=["load", "bench"])
+    parser.add_argument("--conn", default=os.environ.get("STAYBOT_CONN"), help="PostgreSQL connection string (or set STAYBOT_CONN)")
+    parser.add_argument("--tenant-ids", default="1", help="Comma-separated tenant ids")
+    parser.add_argument("--synthetic", type=int, default=100000, help="Synthetic FAQ chunks to add on top of InformationItems/BusinessInfo")
+    parser.add_argument("--batch", type=int, default=5000, help="Rows per binary COPY")
+    parser.add_argument("--keep", action="store_true", help="Keep previously seeded chunks instead of replacing them")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--queries", type=int, default=200, help="Paraphrased queries for bench")
+    parser.add_argument("--k", type=int, default=5, help="LIMIT per query (MessageRoutingService uses 5)")
+    parser.add_argument("--max-distance", type=float, default=0.0, help="Cosine distance cut-off as in the app (0.4); 0 disables so recall is comparable")
+    parser.add_argument("--lists", default="100", help="ivfflat lists values (the app's index uses 100)")
+    parser.add_argument("--probes", default="1,10", help="ivfflat.probes values")
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--ef-search", default="40,100", help="hnsw.ef_search values")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    if not np:
+        raise SystemExit("numpy not installed. Run: python -m pip install --user numpy")
+    if not args.conn:
+        raise SystemExit("Missing --conn or STAYBOT_CONN")
+    tenant_ids = ints(args.tenant_ids)
+
+    conn = connect(args.conn)
+    try:
+        if args.command == "load":
+            started = time.perf_counter()
+            n = load(conn, tenant_ids, args.synthetic, args.batch, args.seed, replace=not args.keep)
+            print(f"Loaded {n} chunks ({DIM}-d) in {time.perf_counter() - started:.1f}s")
+        else:
+            configs = index_configs(ints(args.lists), ints(args.probes), args.m, args.ef_construction, ints(args.ef_search))
+            bench(conn, tenant_ids, args.queries, args.k, args.max_distance, configs, args.seed)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,387 @@
+import io
+import os
+import csv
+import json
+import time
+import argparse
+from datetime import date, datetime, timedelta, timezone
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+try:
+    from zoneinfo import ZoneInfo
+except Exception:
+    ZoneInfo = None
+
+from seed_demo_data import connect
+from tracing import add_trace_args, span, start_from_args
+
+EPOCH = date(1970, 1, 1)
+DEFAULT_TZ = "Africa/Johannesburg"
+
+# The two date-driven sends from ProactiveMessageService (times come from ProactiveMessageSettings).
+# type is the ScheduledMessageType value stored in ScheduledMessages.MessageType.
+MESSAGES = [
+    {"name": "PreArrival", "type": 4, "template": "pre_arrival_welcome_v04"},
+    {"name": "CheckinDay", "type": 0, "template": "checkin_day_ready_v04"},
+]
+
+
+def tenant_settings(conn, tenants):
+    """Per tenant: timezone, and per message whether it is enabled, its local minute of day and days before check-in."""
+    with conn.cursor() as cur:
+        cur.execute('SELECT "Id", "Timezone" FROM public."Tenants" WHERE "Id" = ANY(%s)', [tenants])
+        tz = {r[0]: r[1] or DEFAULT_TZ for r in cur.fetchall()}
+        cur.execute("SELECT to_regclass('public.\"ProactiveMessageSettings\"') IS NOT NULL")
+        rows = {}
+        if cur.fetchone()[0]:
+            cur.execute('SELECT DISTINCT ON ("TenantId") "TenantId", "Timezone", "PreArrivalEnabled", "PreArrivalTime", "PreArrivalDaysBefore", '
+                        '"CheckinDayEnabled", "CheckinDayTime" FROM public."ProactiveMessageSettings" '
+                        'WHERE "TenantId" = ANY(%s) ORDER BY "TenantId", "Id"', [tenants])
+            rows = {r[0]: r for r in cur.fetchall()}
+    settings = {}
+    for t in tenants:
+        r = rows.get(t)
+        # Without a settings row the API creates one with the model defaults; the tenant's own timezone is the better guess
+        entry = {"tz": (r[1] if r and r[1] else tz.get(t, DEFAULT_TZ))}
+        entry["PreArrival"] = (r[2], r[3].seconds // 60, r[4]) if r else (True, 10 * 60, 3)
+        entry["CheckinDay"] = (r[5], r[6].seconds // 60, 0) if r else (True, 9 * 60, 0)
+        settings[t] = entry
+    return settings
+
+
+def sender_numbers(conn, tenants, tenant_numbers):
+    """PhoneNumberId/WabaId per tenant. The API sends every proactive message from the shared number (TenantId NULL);
+    with tenant_numbers a tenant's own active number is preferred."""
+    with conn.cursor() as cur:
+        cur.execute('SELECT "TenantId", "PhoneNumberId", "WabaId" FROM public."WhatsAppNumbers" WHERE "Status" = \'Active\' ORDER BY "Id"')
+        rows = cur.fetchall()
+    shared = next(((p, w) for t, p, w in rows if t is None), None)
+    own = {}
+    for t, p, w in rows:
+        if t is not None:
+            own.setdefault(t, (p, w))
+    out = {}
+    for t in tenants:
+        number = own.get(t) if tenant_numbers else None
+        number = number or shared or own.get(t)
+        if number:
+            out[t] = number
+    return out
+
+
+def load_bookings(conn, tenants, first, last):
+    """Bookings still expecting proactive messages with a check-in in [first, last]."""
+    with conn.cursor() as cur:
+        cur.execute('SELECT "Id", "TenantId", "CheckinDate" - DATE \'1970-01-01\', "Phone" FROM public."Bookings" '
+                    'WHERE "TenantId" = ANY(%s) AND "CheckinDate" BETWEEN %s AND %s AND "Status" IN (\'Confirmed\', \'CheckedIn\') '
+                    'AND COALESCE("Phone", \'\') <> \'\'', [tenants, first, last])
+        rows = cur.fetchall()
+    return {
+        "booking": np.array([r[0] for r in rows], dtype=np.int64),
+        "tenant": np.array([r[1] for r in rows], dtype=np.int32),
+        "checkin": np.array([r[2] for r in rows], dtype=np.int32),
+        "phone": [r[3] for r in rows],
+    }
+
+
+def local_skew(zones, when):
+    """Minutes each timezone's sends fire after its configured local time (east of UTC: late, west: early)."""
+    out = {}
+    for name in sorted(zones):
+        try:
+            offset = when.astimezone(ZoneInfo(name)).utcoffset()
+        except Exception:
+            print(f"Warning: unknown timezone {name}")
+            continue
+        out[name] = int(offset.total_seconds() // 60)
+    return out
+
+
+def requested_sends(b, tenants, settings, senders, now_minute, horizon):
+    """Expand bookings into (message, dispatch minute) arrays, all vectorised per message type.
+
+    ProactiveMessageService stores ScheduledFor as the tenant's local wall clock but dispatches on
+    ScheduledFor <= DateTime.UtcNow, so a send goes out at its local time read as UTC. Minutes here are
+    on that dispatch clock, which is both when WhatsApp sees the traffic and what --apply writes back."""
+    lookup = np.zeros(max(tenants) + 1, dtype=np.int32)
+    lookup[tenants] = np.arange(len(tenants))
+    ti = lookup[b["tenant"]]
+    has_sender = np.isin(b["tenant"], list(senders))
+    parts = []
+    for kind, msg in enumerate(MESSAGES):
+        enabled = np.array([settings[t][msg["name"]][0] for t in tenants], dtype=bool)
+        minute = np.array([settings[t][msg["name"]][1] for t in tenants], dtype=np.int64)
+        before = np.array([settings[t][msg["name"]][2] for t in tenants], dtype=np.int64)
+        local_day = b["checkin"].astype(np.int64) - before[ti]
+        due = local_day * 1440 + minute[ti]
+        # Like the API, a send whose time has already passed is skipped rather than sent late
+        idx = np.nonzero(enabled[ti] & has_sender & (due >= now_minute) & (due < now_minute + horizon))[0]
+        parts.append((np.full(len(idx), kind, dtype=np.int8), idx, due[idx]))
+    return {
+        "kind": np.concatenate([p[0] for p in parts]),
+        "row": np.concatenate([p[1] for p in parts]),
+        "minute": np.concatenate([p[2] for p in parts]) - now_minute,
+    }
+
+
+def shape(demand, rate, burst):
+    """Greedy token-bucket shaper for every WABA at once.
+
+    demand is (wabas, minutes). Sends in any u consecutive minutes are capped at burst + rate * (u - 1), so the
+    cumulative departures are the min-plus convolution D(t) = min(A(t), min over s < t of A(s) + burst + rate * (t - s - 1)),
+    which is a running minimum of A(s) - rate * s."""
+    arrivals = np.cumsum(demand, axis=1)
+    t = np.arange(demand.shape[1], dtype=np.int64)
+    running = np.minimum.accumulate(arrivals - rate * t, axis=1)
+    prev = np.empty_like(running)
+    prev[:, 0] = rate
+    prev[:, 1:] = np.minimum(rate, running[:, :-1])
+    return np.minimum(arrivals, burst + rate * (t - 1) + prev)
+
+
+def plan(sends, waba, rate, burst):
+    """Assign every send a minute (and second) under its WABA's bucket, FIFO by requested minute; never earlier than requested."""
+    n = len(sends["minute"])
+    wabas = int(waba.max()) + 1 if n else 0
+    # Enough extra minutes to drain the largest backlog
+    minutes = (int(sends["minute"].max()) + 2 if n else 1) + (n // rate + 2)
+    demand = np.zeros((wabas, minutes), dtype=np.int64)
+    np.add.at(demand, (waba, sends["minute"]), 1)
+    departed = shape(demand, rate, burst)
+
+    order = np.lexsort((sends["row"], sends["kind"], sends["minute"], waba))
+    w_sorted = waba[order]
+    first = np.searchsorted(w_sorted, np.arange(wabas))
+    rank = np.arange(n) - first[w_sorted]
+    # One searchsorted over all WABAs: offset each row of departures so the flattened array stays sorted
+    stride = n + 1
+    flat = (departed + (np.arange(wabas) * stride)[:, None]).ravel()
+    pos = np.searchsorted(flat, w_sorted * stride + rank, side="right")
+    minute = pos - w_sorted * minutes
+    before = np.where(minute > 0, departed[w_sorted, np.maximum(minute - 1, 0)], 0)
+    in_minute = departed[w_sorted, minute] - before
+    second = (rank - before) * 60 // np.maximum(in_minute, 1)
+
+    planned = np.empty(n, dtype=np.int64)
+    planned_second = np.empty(n, dtype=np.int64)
+    planned[order] = minute
+    planned_second[order] = second
+    return planned, planned_second
+
+
+def per_minute(index, minute, groups, minutes):
+    volume = np.zeros((groups, minutes), dtype=np.int64)
+    np.add.at(volume, (index, minute), 1)
+    return volume
+
+
+def summarize(sends, planned, planned_second, phone_index, phones, now_minute):
+    minutes = int(max(sends["minute"].max(), planned.max())) + 1 if len(planned) else 1
+    raw = per_minute(phone_index, sends["minute"], len(phones), minutes)
+    smooth = per_minute(phone_index, planned, len(phones), minutes)
+    delay = (planned - sends["minute"]) * 60 + planned_second
+    rows = []
+    for i, (number, waba) in enumerate(phones):
+        mine = phone_index == i
+        if not mine.any():
+            continue
+        peak = int(raw[i].argmax())
+        d = delay[mine]
+        rows.append({"phone_number_id": number, "waba_id": waba, "messages": int(mine.sum()), "peak_per_min": int(raw[i].max()),
+                     "peak_at_utc": minute_label(now_minute + peak), "planned_peak_per_min": int(smooth[i].max()),
+                     "delayed": int((d > 0).sum()), "p95_delay_s": int(np.percentile(d, 95)), "max_delay_s": int(d.max())})
+    return rows, raw
+
+
+def minute_label(minute):
+    return (datetime(1970, 1, 1) + timedelta(minutes=int(minute))).strftime("%Y-%m-%d %H:%M")
+
+
+def print_skew(settings, senders, now_minute):
+    """Which tenants do not send at the local time their settings say, and by how much."""
+    when = datetime(1970, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=now_minute)
+    skew = local_skew({settings[t]["tz"] for t in senders}, when)
+    shifted = {name: m for name, m in skew.items() if m}
+    if shifted:
+        print("ScheduledFor is local wall clock but dispatched against UtcNow; sends fire off their configured local time by:")
+        for name, m in sorted(shifted.items(), key=lambda kv: kv[1]):
+            count = sum(1 for t in senders if settings[t]["tz"] == name)
+            print(f"  {name:<28} {'+' if m > 0 else '-'}{abs(m) // 60}h{abs(m) % 60:02d}  ({count} tenants)")
+
+
+def print_summary(rows, raw, now_minute, rate, burst, top):
+    print(f"Token bucket per WABA: {rate}/min, burst {burst}")
+    print(f"{'phone number id':<18} {'waba':<18} {'msgs':>7} {'peak/min':>9} {'peak at (UTC)':>17} {'planned':>8} {'delayed':>8} {'p95 s':>7} {'max s':>7}")
+    for r in rows:
+        print(f"{r['phone_number_id']:<18} {r['waba_id']:<18} {r['messages']:>7} {r['peak_per_min']:>9} {r['peak_at_utc']:>17} "
+              f"{r['planned_peak_per_min']:>8} {r['delayed']:>8} {r['p95_delay_s']:>7} {r['max_delay_s']:>7}")
+    if top and raw.size:
+        total = raw.sum(axis=0)
+        busiest = np.argsort(-total, kind="stable")[:top]
+        print("\nBusiest requested minutes (all numbers):")
+        for m in sorted(busiest):
+            if total[m]:
+                print(f"  {minute_label(now_minute + m)} UTC  {int(total[m]):>6}")
+
+
+def write_plan(path, b, sends, planned, planned_second, settings, senders, now_minute):
+    """One row per send, shaped like ScheduledMessages. ScheduledFor is the value to store: the dispatcher fires it
+    when UtcNow reaches it, so it is also the UTC minute the send leaves."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["TenantId", "BookingId", "Phone", "MessageType", "Template", "ScheduledFor", "RequestedFor",
+                    "DelaySeconds", "Timezone", "PhoneNumberId", "WabaId", "Status"])
+        for row in plan_rows(b, sends, planned, planned_second, settings, senders, now_minute):
+            w.writerow(row)
+
+
+def plan_rows(b, sends, planned, planned_second, settings, senders, now_minute):
+    origin = datetime(1970, 1, 1)
+    for k in np.argsort(planned * 60 + planned_second, kind="stable"):
+        r = int(sends["row"][k])
+        tenant = int(b["tenant"][r])
+        msg = MESSAGES[int(sends["kind"][k])]
+        requested = origin + timedelta(minutes=int(now_minute + sends["minute"][k]))
+        at = origin + timedelta(minutes=int(now_minute + planned[k]), seconds=int(planned_second[k]))
+        number, waba = senders[tenant]
+        yield [tenant, int(b["booking"][r]), b["phone"][r], msg["type"], msg["template"], at.isoformat(sep=" "),
+               requested.isoformat(sep=" "), int((at - requested).total_seconds()), settings[tenant]["tz"], number, waba, 0]
+
+
+def apply_plan(conn, rows):
+    """Move the ScheduledFor of matching Pending ScheduledMessages to the planned times; returns (updated, planned)."""
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    for r in rows:
+        w.writerow([r[1], r[3], r[5]])
+    buf.seek(0)
+    with conn.cursor() as cur:
+        cur.execute('CREATE TEMP TABLE send_plan ("BookingId" integer, "MessageType" integer, "ScheduledFor" timestamp) ON COMMIT DROP')
+        cur.copy_expert("COPY send_plan FROM STDIN (FORMAT csv)", buf)
+        cur.execute('UPDATE public."ScheduledMessages" m SET "ScheduledFor" = p."ScheduledFor" FROM send_plan p '
+                    'WHERE m."BookingId" = p."BookingId" AND m."MessageType" = p."MessageType" AND m."Status" = 0 AND m."SentAt" IS NULL')
+        updated = cur.rowcount
+        cur.execute("SELECT count(*) FROM send_plan")
+        total = cur.fetchone()[0]
+    conn.commit()
+    return updated, total
+
+
+def synthetic(n, tenants, now_minute, days, seed):
+    rng = np.random.default_rng(seed)
+    today = now_minute // 1440
+    return {
+        "booking": np.arange(1, n + 1, dtype=np.int64),
+        "tenant": rng.choice(np.array(tenants, dtype=np.int32), n),
+        "checkin": (today + rng.integers(0, days + 4, n)).astype(np.int32),
+        "phone": [f"+2782{i:07d}" for i in range(n)],
+    }
+
+
+def build(b, tenants, settings, senders, now_minute, horizon, rate, burst):
+    with span("expand", "planner", bookings=len(b["booking"])):
+        sends = requested_sends(b, tenants, settings, senders, now_minute, horizon)
+    phones = sorted(set(senders.values()))
+    wabas = sorted({w for _, w in phones})
+    tenant_phone = {t: phones.index(senders[t]) for t in senders}
+    tenant_of = b["tenant"][sends["row"]]
+    lookup_phone = np.full(max(tenants) + 1, -1, dtype=np.int32)
+    for t, i in tenant_phone.items():
+        lookup_phone[t] = i
+    phone_index = lookup_phone[tenant_of]
+    waba_of_phone = np.array([wabas.index(w) for _, w in phones], dtype=np.int32)
+    with span("shape", "planner", sends=len(sends["minute"])):
+        planned, planned_second = plan(sends, waba_of_phone[phone_index], rate, burst)
+    return sends, planned, planned_second, phone_index, phones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan pre-arrival and check-in-day template sends from Bookings and smooth them under a per-WABA token bucket")
+    parser.add_argument("--conn", default=os.environ.get("STAYBOT_CONN"), help="PostgreSQL connection string (or set STAYBOT_CONN)")
+    parser.add_argument("--tenant-ids", default="all", help="Comma-separated tenants, or 'all'")
+    parser.add_argument("--days", type=int, default=3, help="Plan sends due in the next N days")
+    parser.add_argument("--rate", type=int, default=60, help="Messages per minute per WABA")
+    parser.add_argument("--burst", type=int, default=120, help="Token bucket size per WABA")
+    parser.add_argument("--tenant-numbers", action="store_true", help="Send from a tenant's own WhatsApp number when it has one (the API uses the shared number)")
+    parser.add_argument("--top", type=int, default=10, help="Show the N busiest requested minutes")
+    parser.add_argument("--csv", help="Write the plan (one ScheduledMessages-shaped row per send) here")
+    parser.add_argument("--json", help="Write the per-number summary here")
+    parser.add_argument("--apply", action="store_true", help="Move matching Pending ScheduledMessages to the planned times")
+    parser.add_argument("--bench", type=int, help="Skip the database: time the planner on this many synthetic bookings")
+    parser.add_argument("--seed", type=int, default=1)
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    if not np:
+        raise SystemExit("numpy not installed. Run: python -m pip install --user numpy")
+    if ZoneInfo is None:
+        raise SystemExit("zoneinfo needs Python 3.9+")
+    rate, burst = max(1, args.rate), max(args.rate, args.burst)
+    now_minute = int(time.time() // 60) + 1
+    horizon = args.days * 1440
+
+    if args.bench:
+        tenants = list(range(1, 41))
+        zones = ["Africa/Johannesburg", "Africa/Lagos", "Europe/London", "Asia/Dubai"]
+        settings = {t: {"tz": zones[t % len(zones)], "PreArrival": (True, 10 * 60, 3), "CheckinDay": (True, 9 * 60, 0)} for t in tenants}
+        senders = {t: (f"10000000000000{t % 3}", f"20000000000000{t % 2}") for t in tenants}
+        t0 = time.perf_counter()
+        b = synthetic(args.bench, tenants, now_minute, args.days, args.seed)
+        t1 = time.perf_counter()
+        sends, planned, planned_second, phone_index, phones = build(b, tenants, settings, senders, now_minute, horizon, rate, burst)
+        t2 = time.perf_counter()
+        print(f"{args.bench:,} bookings -> {len(planned):,} sends over {args.days} days: generate {t1 - t0:.2f}s, plan {t2 - t1:.2f}s")
+        rows, raw = summarize(sends, planned, planned_second, phone_index, phones, now_minute)
+        print_skew(settings, senders, now_minute)
+        print_summary(rows, raw, now_minute, rate, burst, args.top)
+        return
+
+    if not args.conn:
+        raise SystemExit("Missing --conn or STAYBOT_CONN")
+    conn = connect(args.conn)
+    try:
+        with conn.cursor() as cur:
+            if args.tenant_ids == "all":
+                cur.execute('SELECT "Id" FROM public."Tenants" ORDER BY 1')
+                tenants = [r[0] for r in cur.fetchall()]
+            else:
+                tenants = [int(t) for t in args.tenant_ids.split(",")]
+        settings = tenant_settings(conn, tenants)
+        senders = sender_numbers(conn, tenants, args.tenant_numbers)
+        for t in tenants:
+            if t not in senders:
+                print(f"Tenant {t}: no active WhatsApp number, skipped")
+        today = EPOCH + timedelta(days=now_minute // 1440)
+        longest = max([s["PreArrival"][2] for s in settings.values()] + [0])
+        with span("load_bookings", "planner"):
+            b = load_bookings(conn, tenants, today - timedelta(days=1), today + timedelta(days=args.days + longest + 1))
+        sends, planned, planned_second, phone_index, phones = build(b, tenants, settings, senders, now_minute, horizon, rate, burst)
+        print(f"{len(b['booking']):,} bookings -> {len(planned):,} sends due in the next {args.days} days")
+        if not len(planned):
+            return
+        rows, raw = summarize(sends, planned, planned_second, phone_index, phones, now_minute)
+        print_skew(settings, senders, now_minute)
+        print_summary(rows, raw, now_minute, rate, burst, args.top)
+        if args.apply:
+            with span("apply", "planner"):
+                updated, total = apply_plan(conn, plan_rows(b, sends, planned, planned_second, settings, senders, now_minute))
+            print(f"Rescheduled {updated} of {total} planned sends; the rest have no Pending ScheduledMessages row yet")
+    finally:
+        conn.close()
+
+    if args.csv:
+        write_plan(args.csv, b, sends, planned, planned_second, settings, senders, now_minute)
+        print(f"Wrote {args.csv}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"rate_per_min": rate, "burst": burst, "days": args.days, "numbers": rows}, f, indent=2, sort_keys=True)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import argparse
+
+from loadstats import Histogram, Stats, print_rows
+from seed_demo_data import connect
+from tracing import add_trace_args, span, start_from_args
+
+try:
+    import aiohttp
+except Exception:
+    aiohttp = None
+
+try:
+    import psutil
+except Exception:
+    psutil = None
+
+# SignalR JSON hub protocol: every frame is a JSON object terminated by the record separator
+RS = "\x1e"
+INVOCATION, COMPLETION, PING, CLOSE = 1, 3, 6, 7
+PING_INTERVAL = 15      # the server drops clients silent for 30 s (ClientTimeoutInterval)
+
+# Both hubs from Program.cs. Only StaffTaskHub receives broadcasts (NotificationService sends
+# TaskCreated to its Tenant_{id} group); TaskHub connections are held and joined for capacity only.
+HUBS = {"stafftask": "/hubs/stafftask", "tasks": "/hubs/tasks"}
+
+
+class HubConnection:
+    """One staff screen: negotiate, WebSocket, handshake, JoinTenantGroup, then read pushes until closed."""
+
+    def __init__(self, run, hub, tenant_id):
+        self.run = run
+        self.hub = hub
+        self.tenant_id = tenant_id
+        self.ws = None
+        self.reader = None
+        self.pending = {}
+        self.next_id = 0
+        self.closed = None
+
+    async def start(self):
+        run = self.run
+        base = run.base_url + HUBS[self.hub]
+        query = {"access_token": run.token} if run.token else {}
+        if run.negotiate:
+            async with run.session.post(base + "/negotiate", params=dict(query, negotiateVersion="1")) as resp:
+                if resp.status != 200:
+                    raise RuntimeError(f"negotiate {resp.status}")
+                body = await resp.json(content_type=None)
+            if "WebSockets" not in [t.get("transport") for t in body.get("availableTransports", [])]:
+                raise RuntimeError("server offers no WebSockets transport")
+            query["id"] = body.get("connectionToken") or body["connectionId"]
+        self.ws = await run.session.ws_connect(base.replace("http", "ws", 1), params=query, heartbeat=None, autoping=True, max_msg_size=0)
+        await self.ws.send_str(json.dumps({"protocol": "json", "version": 1}) + RS)
+        msg = await self.ws.receive(timeout=run.timeout)
+        if msg.type != aiohttp.WSMsgType.TEXT or json.loads(msg.data.split(RS)[0]).get("error"):
+            raise RuntimeError(f"handshake failed: {getattr(msg, 'data', msg.type)}")
+        self.reader = asyncio.create_task(self.read())
+        await self.invoke("JoinTenantGroup", self.tenant_id)
+
+    async def invoke(self, target, *arguments):
+        self.next_id += 1
+        invocation_id = str(self.next_id)
+        done = asyncio.get_running_loop().create_future()
+        self.pending[invocation_id] = done
+        await self.ws.send_str(json.dumps({"type": INVOCATION, "invocationId": invocation_id, "target": target, "arguments": list(arguments)}) + RS)
+        return await asyncio.wait_for(done, self.run.timeout)
+
+    async def read(self):
+        try:
+            async for msg in self.ws:
+                if msg.type != aiohttp.WSMsgType.TEXT:
+                    continue
+                received = time.perf_counter()
+                for frame in msg.data.split(RS):
+                    if frame:
+                        self.dispatch(json.loads(frame), received)
+        except (aiohttp.ClientError, asyncio.CancelledError, ConnectionResetError) as e:
+            self.closed = self.closed or type(e).__name__
+        finally:
+            self.closed = self.closed or "closed"
+            for done in self.pending.values():
+                if not done.done():
+                    done.set_exception(ConnectionError(self.closed))
+            self.run.dropped(self)
+
+    def dispatch(self, message, received):
+        kind = message.get("type")
+        if kind == INVOCATION and message.get("target") == "TaskCreated":
+            self.run.delivered(message.get("arguments") or [{}], received)
+        elif kind == COMPLETION:
+            done = self.pending.pop(message.get("invocationId"), None)
+            if done and not done.done():
+                if message.get("error"):
+                    done.set_exception(RuntimeError(message["error"]))
+                else:
+                    done.set_result(message.get("result"))
+        elif kind == CLOSE:
+            self.closed = message.get("error") or "server closed"
+
+    async def ping(self):
+        if self.ws is not None and not self.ws.closed:
+            await self.ws.send_str(json.dumps({"type": PING}) + RS)
+
+    async def close(self):
+        if self.ws is not None and not self.ws.closed:
+            self.closed = "client closed"
+            await self.ws.close()
+        if self.reader:
+            await asyncio.gather(self.reader, return_exceptions=True)
+
+
+class ProcessSampler:
+    """RSS and CPU seconds of the local API process: psutil when installed, /proc on Linux otherwise."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.proc = psutil.Process(pid) if psutil else None
+        self.ticks = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+    @staticmethod
+    def find(name):
+        """The process whose executable or first argument (dotnet Hostr.Api.dll) is named like name."""
+        name = name.lower()
+
+        def matches(argv):
+            return any(os.path.basename(a.replace("\\", "/")).lower().startswith(name) for a in argv[:2])
+
+        if psutil:
+            for p in psutil.process_iter(["pid", "name", "cmdline"]):
+                if p.info["pid"] != os.getpid() and matches([p.info["name"] or ""] + (p.info["cmdline"] or [])[:2]):
+                    return p.info["pid"]
+            return None
+        if not os.path.isdir("/proc"):
+            return None
+        for entry in os.listdir("/proc"):
+            if entry.isdigit() and int(entry) != os.getpid():
+                try:
+                    with open(f"/proc/{entry}/cmdline", "rb") as f:
+                        argv = f.read().decode("utf-8", "replace").split("\0")
+                except OSError:
+                    continue
+                if matches(argv):
+                    return int(entry)
+        return None
+
+    def sample(self):
+        """(rss_bytes, cpu_seconds)"""
+        if self.proc:
+            cpu = self.proc.cpu_times()
+            return self.proc.memory_info().rss, cpu.user + cpu.system
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{self.pid}/status") as f:
+            rss = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:"))
+        return rss, (int(fields[11]) + int(fields[12])) / self.ticks
+
+
+class LoadRun:
+    """Connections, published tasks and what arrived where, for the current level."""
+
+    def __init__(self, args, session, tenants):
+        self.base_url = args.base_url.rstrip("/")
+        self.token = args.token
+        self.negotiate = not args.skip_negotiation
+        self.timeout = args.timeout
+        self.session = session
+        self.tenants = tenants
+        self.connections = []
+        self.live = {}
+        self.marker = f"loadtest-{uuid.uuid4().hex[:8]}"
+        self.published = {}
+        self.task_ids = {}
+        self.connect_stats = Stats()
+        self.post_stats = Stats()
+        self.attempts = 0
+        self.last_error = None
+        self.reset_level()
+
+    def reset_level(self):
+        self.delivery = Histogram()
+        self.level_tasks = []
+        self.drops = 0
+
+    def dropped(self, conn):
+        if conn in self.live.get(conn.tenant_id, set()):
+            self.live[conn.tenant_id].discard(conn)
+            self.drops += 1
+
+    def delivered(self, arguments, received):
+        note = arguments[0] if arguments else {}
+        task = self.published.get(note.get("title"))
+        if not task:
+            return
+        delay = received - task["sent"]
+        self.delivery.record(delay)
+        task["received"] += 1
+        task["last"] = max(task["last"], delay)
+        # Backstop for servers whose POST response carries no id; post_task records the rest
+        if note.get("taskId"):
+            self.task_ids[note["taskId"]] = task["tenant"]
+
+    async def open_one(self, hub, tenant_id, gate):
+        async with gate:
+            conn = HubConnection(self, hub, tenant_id)
+            started = time.perf_counter()
+            try:
+                await conn.start()
+                ok = True
+            except Exception as e:
+                ok = False
+                self.last_error = f"{type(e).__name__}: {e}"
+                await conn.close()
+            self.connect_stats.record(f"connect {hub}", time.perf_counter() - started, ok)
+            if ok:
+                self.connections.append(conn)
+                if hub == "stafftask":
+                    self.live.setdefault(tenant_id, set()).add(conn)
+
+    async def ramp(self, target, tasks_share, rate, concurrency):
+        """Open connections up to target, round-robin over tenants, at most rate per second."""
+        gate = asyncio.Semaphore(concurrency)
+        pending = []
+        for _ in range(max(0, target - len(self.connections))):
+            i = self.attempts
+            self.attempts += 1
+            # Spread TaskHub connections evenly: connection i goes there when i * share crosses an integer
+            hub = "tasks" if int((i + 1) * tasks_share) > int(i * tasks_share) else "stafftask"
+            tenant_id = self.tenants[i % len(self.tenants)][0]
+            pending.append(asyncio.create_task(self.open_one(hub, tenant_id, gate)))
+            if rate:
+                await asyncio.sleep(1 / rate)
+        await asyncio.gather(*pending)
+
+    async def keepalive(self):
+        while True:
+            await asyncio.sleep(PING_INTERVAL)
+            await asyncio.gather(*(c.ping() for c in self.connections), return_exceptions=True)
+
+    async def publish(self, rate, duration):
+        """POST /api/tasks at rate per second to tenants that have staff connected; titles carry the run marker."""
+        targets = [(t, slug) for t, slug in self.tenants if self.live.get(t)]
+        if not targets:
+            return
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        stop_at = time.perf_counter() + duration
+        seq, inflight = 0, []
+        while time.perf_counter() < stop_at:
+            tenant_id, slug = targets[seq % len(targets)]
+            seq += 1
+            inflight.append(asyncio.create_task(self.post_task(tenant_id, slug, f"{self.marker}-{len(self.published)}", headers)))
+            await asyncio.sleep(1 / rate)
+        await asyncio.gather(*inflight)
+
+    async def post_task(self, tenant_id, slug, title, headers):
+        task = {"tenant": tenant_id, "sent": time.perf_counter(), "expected": len(self.live.get(tenant_id, ())), "received": 0, "last": 0.0}
+        self.published[title] = task
+        self.level_tasks.append(task)
+        # No room or guest phone: the API would WhatsApp the guest about the task
+        body = {"title": title, "description": "SignalR fan-out load test", "department": "Housekeeping", "priority": "Low"}
+        try:
+            async with self.session.post(f"{self.base_url}/api/tasks", json=body, headers=dict(headers, **{"X-Tenant": slug})) as resp:
+                raw = await resp.read()
+                ok = resp.status < 300
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            ok = False
+        if ok:
+            # CreateTask returns the created task: clean up from that, not from pushes a saturated level never delivers
+            try:
+                created = json.loads(raw)
+            except ValueError:
+                created = None
+            task_id = created.get("id", created.get("Id")) if isinstance(created, dict) else None
+            if task_id is not None:
+                self.task_ids[task_id] = tenant_id
+        self.post_stats.record("POST /api/tasks", time.perf_counter() - task["sent"], ok)
+        if not ok:
+            task["expected"] = 0
+
+    async def delete_tasks(self):
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        slugs = dict(self.tenants)
+
+        async def delete(task_id, tenant_id):
+            try:
+                async with self.session.delete(f"{self.base_url}/api/tasks/{task_id}", headers=dict(headers, **{"X-Tenant": slugs[tenant_id]})) as resp:
+                    return resp.status < 300
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return False
+
+        results = []
+        items = list(self.task_ids.items())
+        for i in range(0, len(items), 50):
+            results += await asyncio.gather(*(delete(t, tenant) for t, tenant in items[i:i + 50]))
+        return sum(results), len(results)
+
+    async def close_all(self):
+        for i in range(0, len(self.connections), 500):
+            await asyncio.gather(*(c.close() for c in self.connections[i:i + 500]), return_exceptions=True)
+
+
+def load_tenants(conn_str, tenant_ids, slugs):
+    """[(id, slug)]: slugs from the Tenants table when --conn is set, else from --slugs in --tenant-ids order."""
+    if conn_str:
+        conn = connect(conn_str)
+        try:
+            with conn.cursor() as cur:
+                if tenant_ids == "all":
+                    cur.execute('SELECT "Id", "Slug" FROM public."Tenants" ORDER BY "Id"')
+                else:
+                    cur.execute('SELECT "Id", "Slug" FROM public."Tenants" WHERE "Id" = ANY(%s) ORDER BY "Id"', [[int(t) for t in tenant_ids.split(",")]])
+                return [(r[0], r[1]) for r in cur.fetchall()]
+        finally:
+            conn.close()
+    if tenant_ids == "all":
+        raise SystemExit("--tenant-ids all needs --conn or STAYBOT_CONN")
+    ids = [int(t) for t in tenant_ids.split(",") if t.strip()]
+    names = [s.strip() for s in (slugs or "").split(",") if s.strip()]
+    if len(names) != len(ids):
+        raise SystemExit("Give --conn, or one --slugs entry per --tenant-ids entry (tasks are created with X-Tenant: <slug>)")
+    return list(zip(ids, names))
+
+
+def raise_fd_limit():
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        return hard
+    except Exception:
+        return None
+
+
+async def run_levels(args, tenants, levels, sampler):
+    connector = aiohttp.TCPConnector(limit=0, force_close=False)
+    timeout = aiohttp.ClientTimeout(total=None, connect=args.timeout, sock_read=None)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        run = LoadRun(args, session, tenants)
+        keepalive = asyncio.create_task(run.keepalive())
+        baseline = sampler.sample() if sampler else None
+        results = []
+        try:
+            for level in levels:
+                run.reset_level()
+                client_cpu = time.process_time()
+                with span(f"ramp {level}", "signalr"):
+                    ramp_started = time.perf_counter()
+                    await run.ramp(level, args.tasks_share, args.connect_rate, args.connect_concurrency)
+                    ramp_s = time.perf_counter() - ramp_started
+                await asyncio.sleep(args.settle)
+                before = sampler.sample() if sampler else None
+                wall = time.perf_counter()
+                with span(f"publish {level}", "signalr"):
+                    await run.publish(args.task_rate, args.duration)
+                    await asyncio.sleep(args.drain)
+                wall = time.perf_counter() - wall
+                after = sampler.sample() if sampler else None
+                results.append(level_row(run, level, ramp_s, wall, baseline, before, after, time.process_time() - client_cpu))
+                print_level(results[-1], run)
+                if not slo_met(results[-1], args):
+                    print(f"Stopping: level {level} misses the SLO (p95 <= {args.slo_p95_ms} ms, >= {args.slo_delivered}% delivered)")
+                    break
+        finally:
+            keepalive.cancel()
+            if not args.keep_tasks and run.task_ids:
+                ok, n = await run.delete_tasks()
+                print(f"Deleted {ok}/{n} load-test task(s)")
+            await run.close_all()
+        return results
+
+
+def level_row(run, level, ramp_s, wall, baseline, before, after, client_cpu_s):
+    tasks = [t for t in run.level_tasks if t["expected"]]
+    expected = sum(t["expected"] for t in tasks)
+    received = sum(min(t["received"], t["expected"]) for t in tasks)
+    complete = Histogram()
+    for t in tasks:
+        if t["received"] >= t["expected"]:
+            complete.record(t["last"])
+    connected = sum(len(c) for c in run.live.values())
+    opened = len(run.connections)
+    row = {
+        "level": level, "open": opened, "stafftask_live": connected, "connect_failed": sum(run.connect_stats.errors.values()),
+        "dropped": run.drops, "ramp_s": round(ramp_s, 2), "publish_s": round(wall, 2), "tasks": len(tasks), "deliveries": received, "expected": expected,
+        "delivered_pct": 100.0 * received / expected if expected else None,
+        "fanout_p50_ms": run.delivery.percentile_ms(50), "fanout_p95_ms": run.delivery.percentile_ms(95),
+        "fanout_p99_ms": run.delivery.percentile_ms(99), "fanout_max_ms": run.delivery.max_us / 1000.0,
+        "complete_p95_ms": complete.percentile_ms(95), "client_cpu_pct": 100.0 * client_cpu_s / max(wall + ramp_s, 1e-9),
+        "server_rss_mb": None, "server_kb_per_conn": None, "server_cpu_pct": None,
+    }
+    if after:
+        row["server_rss_mb"] = after[0] / 1e6
+        row["server_kb_per_conn"] = (after[0] - baseline[0]) / 1024 / opened if opened else None
+        row["server_cpu_pct"] = 100.0 * (after[1] - before[1]) / wall if wall else None
+    return row
+
+
+def slo_met(row, args):
+    if row["delivered_pct"] is None:
+        return row["connect_failed"] == 0
+    return row["fanout_p95_ms"] <= args.slo_p95_ms and row["delivered_pct"] >= args.slo_delivered
+
+
+def fmt(value, width, digits=1):
+    return f"{value:>{width}.{digits}f}" if value is not None else "-".rjust(width)
+
+
+def print_level(r, run):
+    print(f"\n== {r['level']} connections: {r['open']} open ({r['stafftask_live']} on StaffTaskHub), "
+          f"{r['connect_failed']} failed, {r['dropped']} dropped; ramp {r['ramp_s']}s")
+    if run.last_error and r["connect_failed"]:
+        print(f"   last connect error: {run.last_error}")
+    print_rows(run.connect_stats.rows(r["ramp_s"])[:-1] + run.post_stats.rows(r["publish_s"])[:-1], label_title="step")
+    print(f"   fan-out: {r['deliveries']}/{r['expected']} deliveries of {r['tasks']} task(s); per delivery p50 {r['fanout_p50_ms']:.1f} "
+          f"p95 {r['fanout_p95_ms']:.1f} p99 {r['fanout_p99_ms']:.1f} max {r['fanout_max_ms']:.1f} ms; last screen p95 {r['complete_p95_ms']:.1f} ms")
+    if r["server_rss_mb"] is not None:
+        print(f"   API: {r['server_rss_mb']:.0f} MB RSS, {fmt(r['server_kb_per_conn'], 0)} KB/connection, {r['server_cpu_pct']:.0f}% CPU; "
+              f"load client {r['client_cpu_pct']:.0f}% CPU")
+    run.connect_stats, run.post_stats = Stats(), Stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hold thousands of staff SignalR connections (JSON protocol over WebSocket) and time TaskCreated fan-out")
+    parser.add_argument("--base-url", default=os.environ.get("STAYBOT_API", "http://localhost:5000"), help="API base URL (or set STAYBOT_API)")
+    parser.add_argument("--conn", default=os.environ.get("STAYBOT_CONN"), help="PostgreSQL connection string for tenant slugs (or set STAYBOT_CONN)")
+    parser.add_argument("--tenant-ids", default="1", help="Comma-separated tenants, or 'all' (with --conn)")
+    parser.add_argument("--slugs", help="Without --conn: tenant slugs in --tenant-ids order (tasks are created with X-Tenant)")
+    parser.add_argument("--token", default=os.environ.get("STAYBOT_TOKEN"), help="JWT for TaskHub ([Authorize]) and the task API (or set STAYBOT_TOKEN)")
+    parser.add_argument("--connections", default="100,500,1000,2000,4000", help="Comma-separated total connection levels, ramped in order")
+    parser.add_argument("--tasks-share", type=float, default=0.0, help="Fraction of connections on TaskHub instead of StaffTaskHub (needs --token)")
+    parser.add_argument("--connect-rate", type=float, default=200, help="New connections per second while ramping (0 = unthrottled)")
+    parser.add_argument("--connect-concurrency", type=int, default=100, help="Handshakes in flight at once")
+    parser.add_argument("--skip-negotiation", action="store_true", help="Connect the WebSocket directly, as skipNegotiation does in the JS client")
+    parser.add_argument("--task-rate", type=float, default=2.0, help="Tasks created per second while measuring fan-out")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of task publishing per level")
+    parser.add_argument("--settle", type=float, default=3, help="Seconds to wait after a ramp before measuring")
+    parser.add_argument("--drain", type=float, default=3, help="Seconds to keep listening after the last task")
+    parser.add_argument("--timeout", type=float, default=30, help="Handshake/invocation/request timeout (seconds)")
+    parser.add_argument("--api-pid", type=int, help="Local API process to sample for memory/CPU")
+    parser.add_argument("--api-process", default="Hostr.Api", help="Find the API process by this name when --api-pid is not given")
+    parser.add_argument("--slo-p95-ms", type=float, default=1000, help="Fan-out p95 a level must meet to count toward capacity")
+    parser.add_argument("--slo-delivered", type=float, default=99.9, help="Percent of expected deliveries a level must reach")
+    parser.add_argument("--keep-tasks", action="store_true", help="Leave the load-test tasks in StaffTasks")
+    parser.add_argument("--json", dest="json_out", help="Write per-level results to this file")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    if not aiohttp:
+        raise SystemExit("aiohttp not installed. Run: python -m pip install --user aiohttp")
+    if args.tasks_share and not args.token:
+        raise SystemExit("TaskHub is [Authorize]: --tasks-share needs --token or STAYBOT_TOKEN")
+    tenants = load_tenants(args.conn, args.tenant_ids, args.slugs)
+    if not tenants:
+        raise SystemExit("No tenants found")
+    levels = [int(c) for c in args.connections.split(",") if c.strip()]
+    limit = raise_fd_limit()
+    if limit and max(levels) + 64 > limit:
+        print(f"Warning: open-file limit is {limit}; levels above ~{limit - 64} connections will fail on the client, not the API")
+
+    pid = args.api_pid or ProcessSampler.find(args.api_process)
+    sampler = None
+    if pid:
+        try:
+            sampler = ProcessSampler(pid)
+            sampler.sample()
+            print(f"Sampling API process {pid} ({'psutil' if psutil else '/proc'})")
+        except (OSError, StopIteration) as e:
+            print(f"Cannot sample process {pid}: {e}")
+            sampler = None
+    else:
+        print(f"No local process matching {args.api_process!r}: memory/CPU not measured (pass --api-pid)")
+    print(f"{len(tenants)} tenant(s): {', '.join(s for _, s in tenants[:8])}{' ...' if len(tenants) > 8 else ''}; levels {levels}")
+
+    results = asyncio.run(run_levels(args, tenants, levels, sampler))
+
+    print(f"\n{'conns':>6} {'failed':>6} {'deliv%':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'RSS MB':>7} {'KB/conn':>8} {'API cpu':>8} {'client':>7}")
+    for r in results:
+        print(f"{r['open']:>6} {r['connect_failed']:>6} {fmt(r['delivered_pct'], 7, 2)} {r['fanout_p50_ms']:>8.1f} {r['fanout_p95_ms']:>8.1f} "
+              f"{r['fanout_p99_ms']:>8.1f} {fmt(r['server_rss_mb'], 7, 0)} {fmt(r['server_kb_per_conn'], 8)} "
+              f"{fmt(r['server_cpu_pct'], 7, 0)}% {r['client_cpu_pct']:>6.0f}%")
+    passing = [r for r in results if slo_met(r, args)]
+    if passing:
+        print(f"\nCapacity: {max(r['open'] for r in passing)} concurrent staff connections met p95 <= {args.slo_p95_ms:.0f} ms "
+              f"with >= {args.slo_delivered}% delivered")
+    if any(r["client_cpu_pct"] > 90 for r in results):
+        print("Warning: the load client was CPU-bound; split the connections across several client processes/machines", file=sys.stderr)
+
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written: {args.json_out}")
+
+
+if __name__ == "__main__":
+    main()
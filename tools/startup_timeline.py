@@ -0,0 +1,300 @@
+import os
+import re
+import json
+import argparse
+from datetime import datetime
+from statistics import median
+
+from logdump import DEFAULT_ROOT, find_dumps, parse_iso, read_deployments, rel
+from tracing import add_trace_args, span, start_from_args
+
+# ASP.NET Core Module / runtime events in LogFiles/eventlog.xml that bound a w3wp (API) process
+STARTED = "1032"                                    # Application '...' started successfully
+STOPS = {"1033": "shutdown", "1012": "app_offline", "1005": "forced_shutdown"}
+FAILURES = {"1007": "start_failed", "1018": "start_failed", "1026": "crash", "2299": "startup_failure_limit"}
+
+EVENT = re.compile(rb"<Event>.*?</Event>", re.S)
+FIELDS = {
+    "provider": re.compile(rb'<Provider Name="([^"]*)"'),
+    "id": re.compile(rb"<EventID>(\d+)</EventID>"),
+    "time": re.compile(rb'<TimeCreated SystemTime="([^"]+)"'),
+    "record": re.compile(rb"<EventRecordID>(\d+)</EventRecordID>"),
+    "computer": re.compile(rb"<Computer>([^<]*)</Computer>"),
+}
+DATA = re.compile(rb"<Data>(.*?)</Data>", re.S)
+PROCESS_ID = re.compile(r"Process Id: (\d+)")
+EXCEPTION = re.compile(r"Exception Info: ([^\n]+)")
+
+# Kudu (SCM) traces: 2025-12-15T23-40-36_11d75b_001_Startup_GET_logstream_0s.xml
+KUDU_TRACE = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}-\d{2}-\d{2})_([0-9a-f]{6})_\d+_(Startup|Shutdown)")
+# DaaS runner logs: Application/<instance>-<pid>-<ticks>.txt, lines "2025-12-23T22:21:53  PID[2208] ... [dw1sdwk000MOD] ..."
+DAAS_LOG = re.compile(r"^([0-9a-f]{6})-(\d+)-\d+\.txt$")
+DAAS_LINE = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})\s+PID\[\d+\].*?\[(dw\w+)\]")
+
+
+def read_events(dumps):
+    """ANCM/runtime events from every eventlog(.prev).xml, de-duplicated by (computer, record id), oldest first."""
+    seen = {}
+    for dump in dumps:
+        for name in ("eventlog.prev.xml", "eventlog.xml"):
+            path = os.path.join(dump, "LogFiles", name) if os.path.basename(dump) != "LogFiles" else os.path.join(dump, name)
+            if not os.path.isfile(path):
+                continue
+            with open(path, "rb") as f:
+                text = f.read()
+            for m in EVENT.finditer(text):
+                raw = m.group(0)
+                fields = {k: (rx.search(raw).group(1).decode("utf-8", "replace") if rx.search(raw) else None) for k, rx in FIELDS.items()}
+                if fields["id"] not in FAILURES and fields["id"] != STARTED and fields["id"] not in STOPS:
+                    continue
+                key = (fields["computer"], fields["record"])
+                if key in seen:
+                    continue
+                data = [d.decode("utf-8", "replace") for d in DATA.findall(raw)]
+                pid = next((PROCESS_ID.search(d).group(1) for d in data if PROCESS_ID.search(d)), None)
+                exc = next((EXCEPTION.search(d).group(1)[:160] for d in data if EXCEPTION.search(d)), None)
+                seen[key] = {"time": parse_iso(fields["time"]), "id": fields["id"], "computer": fields["computer"],
+                             "pid": pid, "detail": exc or (data[0].split("\n")[0][:160] if data else "")}
+    return sorted((e for e in seen.values() if e["time"]), key=lambda e: (e["time"], e["computer"] or ""))
+
+
+def api_lifetimes(events):
+    """w3wp lifetimes per (computer, pid): started-successfully to shutdown/recycle/crash, plus failed starts."""
+    live = {}
+    lifetimes, failures = [], []
+    for e in events:
+        computer = e["computer"]
+        if e["id"] == STARTED:
+            previous = live.pop(computer, None)
+            if previous:
+                # A new process without a recorded stop: the old one ended unobserved
+                previous.update(end=previous["last"], reason="unobserved")
+                lifetimes.append(previous)
+            live[computer] = {"kind": "api", "computer": computer, "pid": e["pid"], "start": e["time"], "last": e["time"], "end": None, "reason": "running"}
+        elif e["id"] in STOPS:
+            current = live.get(computer)
+            if current and (e["pid"] is None or e["pid"] == current["pid"]):
+                current.update(end=e["time"], last=e["time"], reason=STOPS[e["id"]])
+                lifetimes.append(live.pop(computer))
+        else:
+            failures.append({"computer": computer, "time": e["time"], "reason": FAILURES[e["id"]], "pid": e["pid"], "detail": e["detail"]})
+            current = live.get(computer)
+            if current and e["id"] == "1026":
+                current.update(end=e["time"], last=e["time"], reason="crash")
+                lifetimes.append(live.pop(computer))
+    lifetimes.extend(live.values())
+    return sorted(lifetimes, key=lambda l: l["start"]), failures
+
+
+def kudu_lifetimes(dumps):
+    """SCM site lifetimes from kudu/trace Startup/Shutdown file names, per short instance id."""
+    marks = set()
+    for dump in dumps:
+        trace = os.path.join(dump, "LogFiles", "kudu", "trace")
+        if not os.path.isdir(trace):
+            continue
+        for fn in os.listdir(trace):
+            m = KUDU_TRACE.match(fn)
+            if m:
+                marks.add((datetime.strptime(m.group(1), "%Y-%m-%dT%H-%M-%S"), m.group(2), m.group(3)))
+    lifetimes, open_ = [], {}
+    for at, instance, what in sorted(marks):
+        if what == "Startup":
+            if instance in open_:
+                lifetimes.append(dict(open_.pop(instance), reason="unobserved"))
+            open_[instance] = {"kind": "kudu", "computer": instance, "pid": None, "start": at, "last": at, "end": None, "reason": "running"}
+        elif instance in open_:
+            lifetimes.append(dict(open_.pop(instance), end=at, last=at, reason="shutdown"))
+    lifetimes.extend(open_.values())
+    return sorted(lifetimes, key=lambda l: l["start"])
+
+
+def daas_lifetimes(dumps):
+    """DaaS runner processes: PID start line to last line; also maps short instance ids to machine names."""
+    found, machines = {}, {}
+    for dump in dumps:
+        app = os.path.join(dump, "LogFiles", "Application")
+        if not os.path.isdir(app):
+            continue
+        for fn in os.listdir(app):
+            m = DAAS_LOG.match(fn)
+            if not m:
+                continue
+            first = last = machine = None
+            with open(os.path.join(app, fn), encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    lm = DAAS_LINE.match(line)
+                    if lm:
+                        at = parse_iso(lm.group(1))
+                        first = first or at
+                        last = at
+                        machine = machine or lm.group(2)
+            if not first:
+                continue
+            key = (m.group(1), m.group(2), first)
+            if key not in found or last > found[key]["last"]:
+                found[key] = {"kind": "daas", "computer": machine or m.group(1), "instance": m.group(1), "pid": m.group(2),
+                              "start": first, "last": last, "end": last, "reason": "last_line"}
+            if machine:
+                machines[m.group(1)] = machine
+    return sorted(found.values(), key=lambda l: l["start"]), machines
+
+
+def seconds(a, b):
+    return (b - a).total_seconds() if a and b else None
+
+
+def deployment_cold_starts(deployments, lifetimes, failures, window_s):
+    """For each deployment: how long after it finished each recycled instance was started again, and what failed first.
+
+    The instances a deployment restarted are those whose process was recycled for app_offline.htm while it ran;
+    older dumps without those events fall back to any instance starting within window_s of the end."""
+    api = [l for l in lifetimes if l["kind"] == "api"]
+    rows = []
+    ends = [d["end"] for d in deployments if d["end"]]
+    for dep in deployments:
+        done = dep["end"]
+        if not done:
+            continue
+        later = [t for t in ends if t > done]
+        until = min(later) if later else None
+        began = dep["received"] or dep["start"] or done
+        recycled = {l["computer"] for l in api if l["reason"] == "app_offline" and l["end"]
+                    and -60 <= seconds(began, l["end"]) and seconds(l["end"], done) >= -60}
+        starts = {}
+        for l in api:
+            if l["start"] < done or (until is not None and l["start"] >= until) or l["computer"] in starts:
+                continue
+            if l["computer"] in recycled or (not recycled and seconds(done, l["start"]) <= window_s):
+                starts[l["computer"]] = l
+        window = [f for f in failures if f["time"] >= done and (until is None or f["time"] < until)]
+        before_first = [f for f in window if f["computer"] in starts and f["time"] <= starts[f["computer"]]["start"]]
+        latencies = sorted(seconds(done, l["start"]) for l in starts.values())
+        restarts = [l for l in api if l["start"] >= done and (until is None or l["start"] < until)]
+        rows.append({
+            "deployment": dep["id"], "deployer": dep["deployer"], "status": dep["status"],
+            "finished": done.isoformat(), "deploy_s": seconds(dep["start"], done),
+            "recycled": len(recycled), "instances": len(starts),
+            "first_start_s": latencies[0] if latencies else None,
+            "median_start_s": median(latencies) if latencies else None,
+            "last_start_s": latencies[-1] if latencies else None,
+            "failed_before_start": len(before_first),
+            "starts_in_release": len(restarts),
+            "failures_in_release": len(window),
+            "release_hours": round(seconds(done, until) / 3600, 1) if until else None,
+            "first_failure": before_first[0]["detail"] if before_first else None,
+        })
+    return rows
+
+
+def restart_summary(lifetimes):
+    """Per kind and machine: lifetimes, restarts per day, median lifetime and how processes ended."""
+    groups = {}
+    for l in lifetimes:
+        groups.setdefault((l["kind"], l["computer"]), []).append(l)
+    rows = []
+    for (kind, computer), items in sorted(groups.items()):
+        span_days = max(seconds(items[0]["start"], max(i["last"] for i in items)) / 86400, 1 / 24)
+        durations = [seconds(i["start"], i["end"]) for i in items if i["end"]]
+        reasons = {}
+        for i in items:
+            reasons[i["reason"]] = reasons.get(i["reason"], 0) + 1
+        rows.append({"kind": kind, "computer": computer, "processes": len(items),
+                     "first": items[0]["start"].isoformat(), "last": max(i["last"] for i in items).isoformat(),
+                     "restarts_per_day": round((len(items) - 1) / span_days, 2) if len(items) > 1 else 0.0,
+                     "median_lifetime_h": round(median(durations) / 3600, 2) if durations else None,
+                     "ended": reasons})
+    return rows
+
+
+def trend(rows):
+    """Least-squares slope of the median start latency over successive deployments (seconds per release)."""
+    points = [(i, r["median_start_s"]) for i, r in enumerate(rows) if r["median_start_s"] is not None]
+    if len(points) < 3:
+        return None
+    n = len(points)
+    mx = sum(x for x, _ in points) / n
+    my = sum(y for _, y in points) / n
+    var = sum((x - mx) ** 2 for x, _ in points)
+    return sum((x - mx) * (y - my) for x, y in points) / var if var else None
+
+
+def fmt(v, width, digits=0):
+    return f"{'-':>{width}}" if v is None else f"{v:>{width}.{digits}f}"
+
+
+def print_report(deploys, summary, failures, slope):
+    print(f"{'deployment':<12} {'finished (UTC)':<20} {'deploy s':>8} {'recyc':>5} {'inst':>4} {'first s':>8} {'median s':>8} {'last s':>8} "
+          f"{'fail<up':>7} {'starts':>6} {'fails':>5} {'hours':>6}")
+    for r in deploys:
+        print(f"{r['deployment'][:12]:<12} {r['finished'][:19]:<20} {fmt(r['deploy_s'], 8)} {r['recycled']:>5} {r['instances']:>4} {fmt(r['first_start_s'], 8)} "
+              f"{fmt(r['median_start_s'], 8)} {fmt(r['last_start_s'], 8)} {r['failed_before_start']:>7} {r['starts_in_release']:>6} "
+              f"{r['failures_in_release']:>5} {fmt(r['release_hours'], 6, 1)}")
+        if r["first_failure"]:
+            print(f"{'':<12} first failure: {r['first_failure']}")
+    if slope is not None:
+        print(f"\nMedian deploy-to-started latency trend: {slope:+.1f} s per release")
+    print(f"\n{'kind':<5} {'machine':<16} {'procs':>5} {'restarts/day':>12} {'median life h':>13}  ended")
+    for r in summary:
+        ended = ", ".join(f"{k} {v}" for k, v in sorted(r["ended"].items(), key=lambda kv: -kv[1]))
+        print(f"{r['kind']:<5} {r['computer']:<16} {r['processes']:>5} {r['restarts_per_day']:>12.2f} {fmt(r['median_lifetime_h'], 13, 2)}  {ended}")
+    if failures:
+        kinds = {}
+        for f in failures:
+            kinds[(f["reason"], f["detail"])] = kinds.get((f["reason"], f["detail"]), 0) + 1
+        print("\nStart failures and crashes:")
+        for (reason, detail), n in sorted(kinds.items(), key=lambda kv: -kv[1])[:10]:
+            print(f"  {n:>4}  {reason:<22} {detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruct process lifetimes, restarts and per-deployment cold starts from the App Service log dumps")
+    parser.add_argument("dumps", nargs="*", help="Dump directories (default: every azure_logs*/api_logs* dump)")
+    parser.add_argument("--root", default=DEFAULT_ROOT, help="Repository root the dumps live under")
+    parser.add_argument("--window", type=int, default=1800, help="Seconds after a deployment in which a start counts as its cold start when no app_offline recycle was logged")
+    parser.add_argument("--lifetimes", action="store_true", help="Also list every process lifetime")
+    parser.add_argument("--json", help="Write deployments, lifetimes and restart summary here")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    root = os.path.abspath(args.root)
+    dumps = [os.path.abspath(d) for d in args.dumps] or find_dumps(root)
+    if not dumps:
+        raise SystemExit(f"No log dumps found under {root}")
+    with span("read", "timeline", dumps=len(dumps)):
+        events = read_events(dumps)
+        deployments = read_deployments(dumps)
+        daas, machines = daas_lifetimes(dumps)
+        kudu = kudu_lifetimes(dumps)
+    api, failures = api_lifetimes(events)
+    for l in kudu:
+        l["computer"] = machines.get(l["computer"], l["computer"])
+    lifetimes = api + kudu + daas
+    deploys = deployment_cold_starts(deployments, lifetimes, failures, args.window)
+    summary = restart_summary(lifetimes)
+    slope = trend(deploys)
+
+    print(f"{len(dumps)} dumps: {len(events)} ASP.NET Core Module/runtime events, {len(deployments)} deployments, "
+          f"{len(api)} API processes, {len(kudu)} Kudu and {len(daas)} DaaS process lifetimes\n")
+    print_report(deploys, summary, failures, slope)
+    if args.lifetimes:
+        print(f"\n{'kind':<5} {'machine':<16} {'pid':>6} {'start (UTC)':<20} {'end (UTC)':<20} {'hours':>7}  reason")
+        for l in sorted(lifetimes, key=lambda l: l["start"]):
+            end = l["end"].isoformat() if l["end"] else "-"
+            hours = seconds(l["start"], l["end"])
+            print(f"{l['kind']:<5} {l['computer']:<16} {l['pid'] or '-':>6} {l['start'].isoformat():<20} {end:<20} "
+                  f"{fmt(hours / 3600 if hours is not None else None, 7, 2)}  {l['reason']}")
+    if args.json:
+        out = {"dumps": [rel(d, root) for d in dumps], "deployments": deploys, "restart_summary": summary,
+               "latency_trend_s_per_release": slope,
+               "lifetimes": [dict(l, start=l["start"].isoformat(), last=l["last"].isoformat(), end=l["end"].isoformat() if l["end"] else None)
+                             for l in lifetimes],
+               "failures": [dict(f, time=f["time"].isoformat()) for f in failures]}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(out, f, indent=2, sort_keys=True)
+        print(f"Wrote {args.json}")
+
+
+if __name__ == "__main__":
+    main()
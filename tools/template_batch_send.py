@@ -0,0 +1,233 @@
+import os
+import csv
+import json
+import time
+import base64
+import asyncio
+import argparse
+from datetime import datetime
+
+from loadstats import Stats, print_rows
+from whatsapp_standin import validate_message
+from tracing import add_trace_args, start_from_args
+
+try:
+    import aiohttp
+except Exception:
+    aiohttp = None
+
+# Body parameter order and portal page per template, as sent by test_all_templates*.sh.
+# Body entries are guest CSV columns (or the derived checkin_when/checkin_time/checkout_time);
+# "button" is the portal page, formatted with the row, that goes into the base64 url parameter.
+DEFAULT_TEMPLATES = {
+    "pre_arrival_welcome_v04": {"body": ["guest_name", "property", "room", "checkin_when"], "button": "prepare"},
+    "checkin_day_ready_v04": {"body": ["guest_name", "room", "property", "checkin_time"], "button": "checkin"},
+    "welcome_settled_v05": {"body": ["room"], "button": "services"},
+    "mid_stay_checkup_v04": {"body": ["guest_name", "property", "room"], "button": "housekeeping"},
+    "pre_checkout_reminder_v03": {"body": ["guest_name", "property", "room", "checkout_time"], "button": "checkout?booking={booking_id}"},
+    "post_stay_survey_v03": {"body": ["guest_name", "property", "room"], "button": "feedback?booking={booking_id}"},
+}
+
+MAX_PARAM_LEN = 1024
+
+
+def load_templates(path=None):
+    if not path:
+        return DEFAULT_TEMPLATES
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def fmt_time(dt):
+    return dt.strftime("%I:%M %p").lstrip("0")
+
+
+def derive_fields(row):
+    """Fill checkin_when/checkin_time/checkout_time from ISO checkin/checkout columns when not given."""
+    out = dict(row)
+    for col, derived in (("checkin", ("checkin_when", "checkin_time")), ("checkout", (None, "checkout_time"))):
+        raw = (row.get(col) or "").strip()
+        if not raw:
+            continue
+        try:
+            dt = datetime.fromisoformat(raw)
+        except ValueError:
+            continue
+        when_key, time_key = derived
+        if when_key and not out.get(when_key):
+            out[when_key] = f"{dt.strftime('%A, %B')} {dt.day} at {fmt_time(dt)}"
+        if not out.get(time_key):
+            out[time_key] = fmt_time(dt)
+    return out
+
+
+def button_param(row, name, spec):
+    # Pre-encoded values in the CSV win: button_<template> first, then a shared button_param column
+    explicit = row.get(f"button_{name}") or row.get("button_param")
+    if explicit:
+        return explicit.strip()
+    page = spec["button"].format(**row)
+    token = json.dumps({"t": row.get("tenant_slug", ""), "p": page}, separators=(",", ":"))
+    return base64.b64encode(token.encode("utf-8")).decode("ascii")
+
+
+def render(row, name, spec, language="en"):
+    body = [{"type": "text", "text": str(row.get(col) or "")} for col in spec["body"]]
+    components = [{"type": "body", "parameters": body}]
+    if spec.get("button"):
+        components.append({"type": "button", "sub_type": "url", "index": "0",
+                           "parameters": [{"type": "text", "text": button_param(row, name, spec)}]})
+    return {
+        "messaging_product": "whatsapp",
+        "to": (row.get("phone") or "").strip(),
+        "type": "template",
+        "template": {"name": name, "language": {"code": row.get("language") or language}, "components": components},
+    }
+
+
+def validate(payload, templates):
+    """Graph-side checks from the stand-in plus the text rules Meta applies to template params."""
+    counts = {name: len(spec["body"]) for name, spec in templates.items()}
+    error = validate_message(payload, templates=counts)
+    if error:
+        return error[1]["error"]["error_data"]["details"]
+    for comp in payload["template"]["components"]:
+        for p in comp.get("parameters", []):
+            text = p.get("text", "")
+            if len(text) > MAX_PARAM_LEN:
+                return f"{comp['type']} parameter longer than {MAX_PARAM_LEN} chars"
+            if comp["type"] == "body" and ("\n" in text or "\t" in text or "     " in text):
+                return "body parameter contains newline, tab or more than 4 consecutive spaces"
+            if comp["type"] == "button":
+                try:
+                    decoded = json.loads(base64.b64decode(text, validate=True))
+                except (ValueError, TypeError):
+                    return "button parameter is not base64 JSON"
+                if not isinstance(decoded, dict) or not decoded.get("t") or not decoded.get("p"):
+                    return "button parameter must decode to {\"t\": tenant, \"p\": page}"
+    return None
+
+
+def iter_payloads(csv_path, templates, only=None, language="en"):
+    """Yield (template, payload, error) lazily so memory does not grow with the guest list."""
+    with open(csv_path, "r", encoding="utf-8-sig", newline="") as f:
+        for row in csv.DictReader(f):
+            row = derive_fields({k.strip(): (v or "").strip() for k, v in row.items() if k})
+            wanted = [t.strip() for t in row.get("templates", "").split(";") if t.strip()] or list(templates)
+            for name in wanted:
+                if only and name not in only:
+                    continue
+                spec = templates.get(name)
+                if not spec:
+                    yield name, None, f"unknown template {name}"
+                    continue
+                try:
+                    payload = render(row, name, spec, language)
+                except KeyError as e:
+                    yield name, None, f"button page needs column {e}"
+                    continue
+                yield name, payload, validate(payload, templates)
+
+
+async def send_all(items, url, token, concurrency, rate, max_retries, stats, invalid, out_file):
+    headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
+    interval = 1.0 / rate if rate else 0.0
+    next_slot = [time.monotonic()]
+
+    async def pace():
+        if not interval:
+            return
+        now = time.monotonic()
+        slot = max(now, next_slot[0])
+        next_slot[0] = slot + interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    async def worker(session):
+        # Workers share one iterator; asyncio is single-threaded so next() needs no lock
+        for name, payload, error in items:
+            if error:
+                invalid[name] = invalid.get(name, 0) + 1
+                if out_file:
+                    out_file.write(json.dumps({"template": name, "error": error, "payload": payload}) + "\n")
+                continue
+            for attempt in range(max_retries + 1):
+                await pace()
+                started = time.perf_counter()
+                try:
+                    async with session.post(url, data=json.dumps(payload), headers=headers) as resp:
+                        body = await resp.text()
+                        status = resp.status
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    status, body = 0, str(e)
+                if status == 429 and attempt < max_retries:
+                    await asyncio.sleep(min(2 ** attempt * 0.5, 8.0))
+                    continue
+                stats.record(name, time.perf_counter() - started, status == 200)
+                if out_file:
+                    out_file.write(json.dumps({"template": name, "to": payload["to"], "status": status, "response": body[:500]}) + "\n")
+                break
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60)) as session:
+        await asyncio.gather(*[worker(session) for _ in range(concurrency)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render, validate and bulk-send WhatsApp template payloads from a guest CSV")
+    parser.add_argument("guests", help="CSV with guest_name, phone, room, property, tenant_slug, booking_id, checkin, checkout[, templates, button_param]")
+    parser.add_argument("--templates", help="JSON template definitions (default: the six templates from test_all_templates.sh)")
+    parser.add_argument("--only", help="Comma-separated subset of templates")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--dry-run", action="store_true", help="Render and validate only")
+    parser.add_argument("--graph-url", default=os.environ.get("WA_GRAPH_URL", "https://graph.facebook.com/v22.0"), help="Graph base URL, or the local stand-in (http://127.0.0.1:8089/v22.0)")
+    parser.add_argument("--phone-id", default=os.environ.get("WA_PHONE_ID"), help="WhatsApp phone number id (or set WA_PHONE_ID)")
+    parser.add_argument("--token", default=os.environ.get("WA_TOKEN"), help="Bearer token (or set WA_TOKEN)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Max requests in flight")
+    parser.add_argument("--rate", type=float, default=0.0, help="Max sends per second (0 = unpaced)")
+    parser.add_argument("--max-retries", type=int, default=3, help="Retries on HTTP 429")
+    parser.add_argument("--out", help="JSONL of rendered payloads (dry run) or per-send results")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    templates = load_templates(args.templates)
+    only = set(args.only.split(",")) if args.only else None
+    items = iter_payloads(args.guests, templates, only=only, language=args.language)
+    out_file = open(args.out, "w", encoding="utf-8") if args.out else None
+    started = time.perf_counter()
+    try:
+        if args.dry_run:
+            ok, invalid = {}, {}
+            for name, payload, error in items:
+                target = invalid if error else ok
+                target[name] = target.get(name, 0) + 1
+                if out_file:
+                    out_file.write(json.dumps({"template": name, "error": error, "payload": payload}) + "\n")
+                if error:
+                    print(f"[invalid] {name}: {error}")
+            elapsed = time.perf_counter() - started
+            print(f"{'template':30} {'valid':>8} {'invalid':>8}")
+            for name in sorted(set(ok) | set(invalid)):
+                print(f"{name:30} {ok.get(name, 0):>8} {invalid.get(name, 0):>8}")
+            print(f"Rendered {sum(ok.values()) + sum(invalid.values())} payloads in {elapsed:.2f}s")
+            return
+
+        if not aiohttp:
+            raise SystemExit("aiohttp not installed. Run: python -m pip install --user aiohttp")
+        if not args.phone_id or not args.token:
+            raise SystemExit("Missing --phone-id/WA_PHONE_ID or --token/WA_TOKEN")
+        url = f"{args.graph_url.rstrip('/')}/{args.phone_id}/messages"
+        stats, invalid = Stats(), {}
+        asyncio.run(send_all(items, url, args.token, args.concurrency, args.rate, args.max_retries, stats, invalid, out_file))
+        elapsed = time.perf_counter() - started
+        print_rows(stats.rows(elapsed), label_title="template", width=30)
+        if invalid:
+            print("Skipped invalid payloads: " + ", ".join(f"{k}={v}" for k, v in sorted(invalid.items())))
+    finally:
+        if out_file:
+            out_file.close()
+
+
+if __name__ == "__main__":
+    main()
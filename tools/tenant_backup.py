@@ -0,0 +1,537 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+try:
+    import zstandard as zstd
+except Exception:
+    zstd = None
+
+from db_profile import tenant_tables
+from seed_demo_data import connect
+from tracing import add_trace_args, span, start_from_args
+
+FORMAT = 1
+MANIFEST = "manifest.json"
+COPY_BUFFER = 1 << 20
+
+
+def require_zstd():
+    if zstd is None:
+        raise SystemExit("zstandard not installed. Run: python -m pip install --user zstandard")
+
+
+class Digest:
+    """File-like pass-through that hashes and counts every byte on its way to (or from) another file object."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.sha = hashlib.sha256()
+        self.bytes = 0
+
+    def write(self, data):
+        self.sha.update(data)
+        self.bytes += len(data)
+        return self.inner.write(data)
+
+    def read(self, size=-1):
+        data = self.inner.read(size if size and size > 0 else COPY_BUFFER)
+        self.sha.update(data)
+        self.bytes += len(data)
+        return data
+
+
+def filter_column(table):
+    return "Id" if table == "Tenants" else "TenantId"
+
+
+def tenant_filter(table, owners, tenant):
+    """WHERE condition for one tenant's rows; tables without TenantId go through their owner's rows."""
+    if table in owners:
+        col, parent, parent_col = owners[table]
+        return f'"{col}" IN (SELECT "{parent_col}" FROM public."{parent}" WHERE {tenant_filter(parent, owners, tenant)})'
+    return f'"{filter_column(table)}" = {int(tenant)}'
+
+
+def table_columns(conn, table):
+    """[(name, type)] in attribute order, leaving out generated columns (COPY FROM cannot write them)."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT a.attname, format_type(a.atttypid, a.atttypmod) FROM pg_attribute a "
+            "WHERE a.attrelid = %s::regclass AND a.attnum > 0 AND NOT a.attisdropped AND a.attgenerated = '' "
+            "ORDER BY a.attnum", [f'public."{table}"'])
+        return [list(r) for r in cur.fetchall()]
+
+
+def fk_edges(conn, tables):
+    """Single-column foreign keys between the given tables as [child, column, parent, parent_column]."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT ch.relname, a.attname, pa.relname, af.attname FROM pg_constraint c "
+            "JOIN pg_class ch ON ch.oid = c.conrelid JOIN pg_class pa ON pa.oid = c.confrelid "
+            "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1] "
+            "JOIN pg_attribute af ON af.attrelid = c.confrelid AND af.attnum = c.confkey[1] "
+            "WHERE c.contype = 'f' AND array_length(c.conkey, 1) = 1 AND c.connamespace = 'public'::regnamespace")
+        edges = [list(r) for r in cur.fetchall() if r[0] in tables and r[2] in tables]
+    # TenantId is not always declared as a foreign key; treat it as one so remapping and ordering see it
+    declared = {(e[0], e[1]) for e in edges}
+    for table, cols in tables.items():
+        if table != "Tenants" and "TenantId" in cols and (table, "TenantId") not in declared:
+            edges.append([table, "TenantId", "Tenants", "Id"])
+    return sorted(edges)
+
+
+def owned_tables(conn, tables):
+    """Tables without a TenantId that belong to tenant tables through a NOT NULL foreign key, transitively
+    (FlowSteps -> ConversationFlows, BroadcastRecipients -> BroadcastMessages), as {child: [column, parent, parent_column]}.
+
+    Both cascade from their parent, so a --replace that skipped them would silently lose them. ON DELETE
+    CASCADE keys are preferred as the owner when a table has several."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT ch.relname, a.attname, pa.relname, af.attname FROM pg_constraint c "
+            "JOIN pg_class ch ON ch.oid = c.conrelid JOIN pg_class pa ON pa.oid = c.confrelid "
+            "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1] "
+            "JOIN pg_attribute af ON af.attrelid = c.confrelid AND af.attnum = c.confkey[1] "
+            "WHERE c.contype = 'f' AND array_length(c.conkey, 1) = 1 AND a.attnotnull AND ch.relkind IN ('r', 'p') "
+            "AND c.connamespace = 'public'::regnamespace AND NOT EXISTS (SELECT 1 FROM pg_attribute t "
+            "WHERE t.attrelid = c.conrelid AND t.attname = 'TenantId' AND NOT t.attisdropped) "
+            "ORDER BY c.confdeltype <> 'c', ch.relname, a.attname")
+        candidates = cur.fetchall()
+    owners, known = {}, set(tables)
+    grew = True
+    while grew:
+        grew = False
+        for child, col, parent, parent_col in candidates:
+            if child not in known and parent in known:
+                owners[child] = [col, parent, parent_col]
+                known.add(child)
+                grew = True
+    return owners
+
+
+def dependency_levels(tables, edges):
+    """Topological levels: every table only references tables in earlier levels (self-references are ignored)."""
+    parents = {t: {p for c, _, p, _ in edges if c == t and p != t} for t in tables}
+    levels, done = [], set()
+    while len(done) < len(tables):
+        level = sorted(t for t in tables if t not in done and parents[t] <= done)
+        if not level:
+            # A reference cycle: load the rest together and rely on --disable-triggers or deferred constraints
+            level = sorted(t for t in tables if t not in done)
+            print(f"Warning: reference cycle between {', '.join(level)}; loading them in one level")
+        levels.append(level)
+        done.update(level)
+    return levels
+
+
+def resolve_tenant(conn, slug_or_id):
+    with conn.cursor() as cur:
+        if str(slug_or_id).isdigit():
+            cur.execute('SELECT "Id", "Slug" FROM public."Tenants" WHERE "Id" = %s', [int(slug_or_id)])
+        else:
+            cur.execute('SELECT "Id", "Slug" FROM public."Tenants" WHERE "Slug" = %s', [slug_or_id])
+        row = cur.fetchone()
+    if not row:
+        raise SystemExit(f"No tenant {slug_or_id}")
+    return row
+
+
+def last_migration(conn):
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('public.\"__EFMigrationsHistory\"') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return None
+        cur.execute('SELECT max("MigrationId") FROM public."__EFMigrationsHistory"')
+        return cur.fetchone()[0]
+
+
+def mb(n):
+    return n / 1e6
+
+
+def rate(n, seconds):
+    return mb(n) / seconds if seconds > 0 else 0.0
+
+
+def dump_table(conn_str, snapshot, tenant, table, columns, owners, path, level):
+    """COPY one table's tenant rows in binary format through zstd into path, inside the exported snapshot."""
+    conn = connect(conn_str)
+    try:
+        conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+        cols = ", ".join(f'"{c}"' for c, _ in columns)
+        started = time.perf_counter()
+        with conn.cursor() as cur, open(path, "wb") as fh:
+            cur.execute("SET TRANSACTION SNAPSHOT %s", [snapshot])
+            packed = Digest(fh)
+            writer = zstd.ZstdCompressor(level=level).stream_writer(packed, closefd=False)
+            raw = Digest(writer)
+            with span(table, "backup"):
+                cur.copy_expert(f'COPY (SELECT {cols} FROM public."{table}" WHERE {tenant_filter(table, owners, tenant)}) '
+                                "TO STDOUT (FORMAT binary)", raw, size=COPY_BUFFER)
+            writer.flush(zstd.FLUSH_FRAME)
+            rows = cur.rowcount
+        conn.rollback()
+    finally:
+        conn.close()
+    return {"rows": rows, "raw_bytes": raw.bytes, "raw_sha256": raw.sha.hexdigest(), "zst_bytes": packed.bytes,
+            "zst_sha256": packed.sha.hexdigest(), "seconds": round(time.perf_counter() - started, 3)}
+
+
+def backup(conn_str, tenant_arg, out, jobs, level, only):
+    require_zstd()
+    coord = connect(conn_str)
+    # The coordinator keeps its transaction open so every worker reads the same snapshot
+    coord.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    try:
+        with coord.cursor() as cur:
+            cur.execute("SELECT pg_export_snapshot(), current_setting('server_version')")
+            snapshot, server_version = cur.fetchone()
+        tenant, slug = resolve_tenant(coord, tenant_arg)
+        names = set(tenant_tables(coord, only)) | {"Tenants"}
+        owners = owned_tables(coord, names)
+        names = sorted(names | set(owners))
+        tables = {t: table_columns(coord, t) for t in names}
+        edges = fk_edges(coord, {t: [c for c, _ in cols] for t, cols in tables.items()})
+        levels = dependency_levels(tables, edges)
+        migration = last_migration(coord)
+
+        out = out or f"tenant_backup_{slug}_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        os.makedirs(out, exist_ok=True)
+        print(f"Backing up tenant {slug} ({tenant}): {len(tables)} tables in {len(levels)} dependency levels -> {out}")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            futures = {t: pool.submit(dump_table, conn_str, snapshot, tenant, t, tables[t], owners, os.path.join(out, f"{t}.copy.zst"), level)
+                       for t in names}
+            results = {t: f.result() for t, f in futures.items()}
+        elapsed = time.perf_counter() - started
+    finally:
+        coord.rollback()
+        coord.close()
+
+    manifest = {
+        "format": FORMAT,
+        "tenant": tenant,
+        "slug": slug,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "server_version": server_version,
+        "migration": migration,
+        "compression": {"codec": "zstd", "level": level},
+        "levels": levels,
+        "edges": edges,
+        "owners": owners,
+        "tables": {t: dict(results[t], file=f"{t}.copy.zst", columns=tables[t]) for t in names},
+    }
+    with open(os.path.join(out, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    report("Backup", manifest["tables"], elapsed)
+    return out
+
+
+def read_manifest(archive):
+    path = os.path.join(archive, MANIFEST)
+    if not os.path.exists(path):
+        raise SystemExit(f"No {MANIFEST} in {archive}")
+    with open(path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("format") != FORMAT:
+        raise SystemExit(f"Unsupported archive format {manifest.get('format')}")
+    return manifest
+
+
+def verify_files(archive, manifest, decompress=False):
+    """Check every file's zstd sha256 (cheap); with decompress also the raw COPY stream sha256."""
+    bad = []
+    for table, meta in sorted(manifest["tables"].items()):
+        path = os.path.join(archive, meta["file"])
+        if not os.path.exists(path):
+            bad.append(f"{table}: missing {meta['file']}")
+            continue
+        sha = hashlib.sha256()
+        with open(path, "rb") as fh:
+            for block in iter(lambda: fh.read(COPY_BUFFER), b""):
+                sha.update(block)
+        if sha.hexdigest() != meta["zst_sha256"]:
+            bad.append(f"{table}: compressed checksum mismatch")
+            continue
+        if decompress:
+            with open(path, "rb") as fh:
+                raw = Digest(zstd.ZstdDecompressor().stream_reader(fh))
+                while raw.read(COPY_BUFFER):
+                    pass
+            if raw.sha.hexdigest() != meta["raw_sha256"] or raw.bytes != meta["raw_bytes"]:
+                bad.append(f"{table}: COPY stream checksum mismatch")
+    return bad
+
+
+def check_schema(conn, manifest):
+    """Binary COPY needs identical column types; extra target columns are fine (they take their defaults)."""
+    problems = []
+    for table, meta in sorted(manifest["tables"].items()):
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass(%s) IS NOT NULL", [f'public."{table}"'])
+            if not cur.fetchone()[0]:
+                problems.append(f"{table}: table missing")
+                continue
+        target = dict(table_columns(conn, table))
+        for col, typ in meta["columns"]:
+            if col not in target:
+                problems.append(f"{table}.{col}: column missing")
+            elif target[col] != typ:
+                problems.append(f"{table}.{col}: {typ} in archive, {target[col]} in target")
+    return problems
+
+
+class Restore:
+    """Loads an archive level by level; within a level each table gets its own connection and transaction.
+
+    Staged restores (--replace, --target-tenant, --slug, --remap) COPY into a scratch schema first and
+    publish everything in one transaction at the end, so a failure never leaves a half-replaced tenant."""
+
+    def __init__(self, conn_str, archive, manifest, target_tenant=None, slug=None, remap=False, disable_triggers=False, replace=False):
+        self.conn_str = conn_str
+        self.archive = archive
+        self.manifest = manifest
+        self.source = manifest["tenant"]
+        self.target = target_tenant if target_tenant is not None else self.source
+        self.slug = slug
+        self.remap = remap
+        self.disable_triggers = disable_triggers
+        self.replace = replace
+        self.staged = replace or remap or self.target != self.source or slug is not None
+        self.owners = manifest.get("owners", {})
+        self.schema = f"tenant_restore_{os.getpid()}"
+        self.mapped = set()
+        self.tenant_exists = False
+
+    def session(self):
+        conn = connect(self.conn_str)
+        if self.disable_triggers:
+            with conn.cursor() as cur:
+                cur.execute("SET session_replication_role = replica")
+        return conn
+
+    def prepare(self, conn):
+        with conn.cursor() as cur:
+            cur.execute('SELECT 1 FROM public."Tenants" WHERE "Id" = %s', [self.target])
+            self.tenant_exists = cur.fetchone() is not None
+            if self.tenant_exists and not self.staged:
+                raise SystemExit(f"Tenant {self.target} already exists; use --replace, --target-tenant or --remap")
+            if self.staged:
+                cur.execute(f'CREATE SCHEMA "{self.schema}"')
+                cur.execute(f'CREATE UNLOGGED TABLE "{self.schema}"."m_Tenants" (old bigint PRIMARY KEY, new bigint NOT NULL)')
+                cur.execute(f'INSERT INTO "{self.schema}"."m_Tenants" VALUES (%s, %s)', [self.source, self.target])
+        conn.commit()
+        if self.staged:
+            self.mapped.add("Tenants")
+
+    def load(self, table):
+        meta = self.manifest["tables"][table]
+        cols = ", ".join(f'"{c}"' for c, _ in meta["columns"])
+        started = time.perf_counter()
+        conn = self.session()
+        try:
+            with conn.cursor() as cur, open(os.path.join(self.archive, meta["file"]), "rb") as fh:
+                raw = Digest(zstd.ZstdDecompressor().stream_reader(fh))
+                dest = f'"{self.schema}"."s_{table}"' if self.staged else f'public."{table}"'
+                if self.staged:
+                    cur.execute(f'CREATE UNLOGGED TABLE {dest} (LIKE public."{table}")')
+                with span(table, "restore"):
+                    cur.copy_expert(f"COPY {dest} ({cols}) FROM STDIN (FORMAT binary)", raw, size=COPY_BUFFER)
+                if raw.sha.hexdigest() != meta["raw_sha256"]:
+                    raise RuntimeError(f"{table}: COPY stream checksum mismatch, rolled back")
+                mapped = self.rewrite(cur, table, meta, dest, cols) if self.staged else False
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        return {"rows": meta["rows"], "raw_bytes": raw.bytes, "zst_bytes": meta["zst_bytes"], "mapped": mapped,
+                "seconds": round(time.perf_counter() - started, 3)}
+
+    def rewrite(self, cur, table, meta, stage, cols):
+        """Map the staged rows onto the target tenant (and new Ids with --remap); True if an Id map was built."""
+        names = [c for c, _ in meta["columns"]]
+        seq = None
+        if table == "Tenants":
+            cur.execute(f'UPDATE {stage} SET "Id" = %s', [self.target])
+            if self.slug:
+                cur.execute(f'UPDATE {stage} SET "Slug" = %s', [self.slug])
+        else:
+            if self.remap and "Id" in names:
+                cur.execute("SELECT pg_get_serial_sequence(%s, 'Id')", [f'public."{table}"'])
+                seq = cur.fetchone()[0]
+            if seq:
+                # The map is built first so self-references can use it too; committed maps serve later levels
+                cur.execute(f'CREATE UNLOGGED TABLE "{self.schema}"."m_{table}" (old bigint PRIMARY KEY, new bigint NOT NULL)')
+                cur.execute(f'INSERT INTO "{self.schema}"."m_{table}" SELECT "Id", nextval(%s) FROM {stage}', [seq])
+            for child, col, parent, parent_col in self.manifest["edges"]:
+                if child != table or parent_col != "Id" or col not in names:
+                    continue
+                if parent in self.mapped or (parent == table and seq):
+                    cur.execute(f'UPDATE {stage} s SET "{col}" = m.new FROM "{self.schema}"."m_{parent}" m WHERE s."{col}" = m.old')
+            if seq:
+                cur.execute(f'UPDATE {stage} s SET "Id" = m.new FROM "{self.schema}"."m_{table}" m WHERE s."Id" = m.old')
+        return table != "Tenants" and bool(seq)
+
+    def publish(self):
+        """Move every staged table into public in one transaction, deleting the old rows first with --replace.
+
+        The existing Tenants row is updated in place rather than deleted: deleting it would cascade into
+        tables the archive does not cover."""
+        if not self.staged:
+            return
+        levels = self.manifest["levels"]
+        conn = self.session()
+        try:
+            with conn.cursor() as cur:
+                if self.replace and self.tenant_exists:
+                    # Children first so foreign keys between tenant tables never block the delete
+                    for level in reversed(levels):
+                        for table in level:
+                            if table != "Tenants":
+                                with span(table, "delete"):
+                                    cur.execute(f'DELETE FROM public."{table}" WHERE {tenant_filter(table, self.owners, self.target)}')
+                for level in levels:
+                    for table in level:
+                        names = [c for c, _ in self.manifest["tables"][table]["columns"]]
+                        cols = ", ".join(f'"{c}"' for c in names)
+                        stage = f'"{self.schema}"."s_{table}"'
+                        with span(table, "publish"):
+                            if table != "Tenants" or not self.tenant_exists:
+                                cur.execute(f'INSERT INTO public."{table}" ({cols}) OVERRIDING SYSTEM VALUE SELECT {cols} FROM {stage}')
+                            elif self.replace:
+                                rest = ", ".join(f'"{c}"' for c in names if c != "Id")
+                                cur.execute(f'UPDATE public."Tenants" SET ({rest}) = (SELECT {rest} FROM {stage}) WHERE "Id" = %s', [self.target])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def sync_sequences(self, conn):
+        # Explicit Ids bypass the identity sequences; move them past the restored rows
+        with conn.cursor() as cur:
+            for table, meta in self.manifest["tables"].items():
+                if "Id" not in [c for c, _ in meta["columns"]]:
+                    continue
+                cur.execute("SELECT pg_get_serial_sequence(%s, 'Id')", [f'public."{table}"'])
+                seq = cur.fetchone()[0]
+                if seq:
+                    cur.execute(f'SELECT setval(%s, GREATEST((SELECT max("Id") FROM public."{table}"), 1))', [seq])
+        conn.commit()
+
+    def cleanup(self, conn):
+        if self.staged:
+            with conn.cursor() as cur:
+                cur.execute(f'DROP SCHEMA IF EXISTS "{self.schema}" CASCADE')
+            conn.commit()
+
+
+def restore(conn_str, archive, jobs, replace, target_tenant, slug, remap, disable_triggers, force):
+    require_zstd()
+    manifest = read_manifest(archive)
+    with span("verify", "restore"):
+        bad = verify_files(archive, manifest)
+    if bad:
+        raise SystemExit("Archive is damaged:\n  " + "\n  ".join(bad))
+    conn = connect(conn_str)
+    run = Restore(conn_str, archive, manifest, target_tenant, slug, remap, disable_triggers, replace)
+    try:
+        migration = last_migration(conn)
+        if migration != manifest["migration"]:
+            print(f"Warning: archive taken at migration {manifest['migration']}, target is at {migration}")
+        problems = check_schema(conn, manifest)
+        if problems and not force:
+            raise SystemExit("Target schema does not match the archive:\n  " + "\n  ".join(problems))
+        run.prepare(conn)
+        print(f"Restoring tenant {manifest['slug']} ({run.source}) as {run.target} from {archive}"
+              + (" with new Ids" if remap else "") + f", {len(manifest['levels'])} levels, {jobs} jobs")
+        started = time.perf_counter()
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            for i, level in enumerate(manifest["levels"]):
+                with span(f"level {i}", "restore", tables=len(level)):
+                    # Biggest tables first so one large table does not start last
+                    order = sorted(level, key=lambda t: -manifest["tables"][t]["raw_bytes"])
+                    results.update(zip(order, pool.map(run.load, order)))
+                # Maps are committed by now, so the next level can rewrite its references through them
+                run.mapped.update(t for t in level if results[t]["mapped"])
+        with span("publish", "restore"):
+            run.publish()
+        if not remap:
+            run.sync_sequences(conn)
+        elapsed = time.perf_counter() - started
+    finally:
+        run.cleanup(conn)
+        conn.close()
+    report("Restore", results, elapsed)
+
+
+def report(label, tables, elapsed):
+    width = max([len(t) for t in tables] + [5])
+    print(f"{'table':<{width}} {'rows':>10} {'raw MB':>9} {'zst MB':>9} {'ratio':>6} {'s':>7} {'MB/s':>8}")
+    for table, r in sorted(tables.items(), key=lambda kv: -kv[1]["raw_bytes"]):
+        ratio = r["raw_bytes"] / r["zst_bytes"] if r["zst_bytes"] else 0
+        print(f"{table:<{width}} {r['rows']:>10} {mb(r['raw_bytes']):>9.2f} {mb(r['zst_bytes']):>9.2f} {ratio:>6.1f} "
+              f"{r['seconds']:>7.2f} {rate(r['raw_bytes'], r['seconds']):>8.1f}")
+    raw = sum(r["raw_bytes"] for r in tables.values())
+    packed = sum(r["zst_bytes"] for r in tables.values())
+    rows = sum(max(r["rows"], 0) for r in tables.values())
+    print(f"{label}: {rows} rows, {mb(raw):.2f} MB raw / {mb(packed):.2f} MB zstd in {elapsed:.2f}s "
+          f"= {rate(raw, elapsed):.1f} MB/s raw, {rate(packed, elapsed):.1f} MB/s on disk")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-tenant logical backup (binary COPY + zstd, checksummed) and parallel restore")
+    parser.add_argument("command", choices=["backup", "restore", "verify"])
+    parser.add_argument("--conn", default=os.environ.get("STAYBOT_CONN"), help="Postgres connection string (or set STAYBOT_CONN)")
+    parser.add_argument("--tenant", help="backup: tenant slug or Id")
+    parser.add_argument("--archive", help="Archive directory (backup default: tenant_backup_<slug>_<timestamp>)")
+    parser.add_argument("--tables", default="", help="backup: only these comma-separated tables (Tenants is always included)")
+    parser.add_argument("--jobs", type=int, default=4, help="Parallel connections")
+    parser.add_argument("--level", type=int, default=3, help="backup: zstd level")
+    parser.add_argument("--replace", action="store_true", help="restore: replace the target tenant's rows (atomically, via a staging schema)")
+    parser.add_argument("--target-tenant", type=int, help="restore: load the rows under this tenant Id instead")
+    parser.add_argument("--slug", help="restore: new slug for the Tenants row (needed to clone next to the original)")
+    parser.add_argument("--remap", action="store_true", help="restore: give every row a fresh Id from its sequence and rewrite references")
+    parser.add_argument("--disable-triggers", action="store_true", help="restore: session_replication_role=replica (superuser; skips FK checks)")
+    parser.add_argument("--force", action="store_true", help="restore: continue despite schema differences")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    if args.command == "verify":
+        require_zstd()
+        if not args.archive:
+            raise SystemExit("verify needs --archive")
+        manifest = read_manifest(args.archive)
+        bad = verify_files(args.archive, manifest, decompress=True)
+        for line in bad:
+            print(line)
+        print(f"{len(manifest['tables']) - len(bad)}/{len(manifest['tables'])} tables OK")
+        if bad:
+            raise SystemExit(1)
+        return
+
+    if not args.conn:
+        raise SystemExit("Missing --conn or STAYBOT_CONN")
+    if args.command == "backup":
+        if not args.tenant:
+            raise SystemExit("backup needs --tenant")
+        only = [t.strip() for t in args.tables.split(",") if t.strip()] or None
+        backup(args.conn, args.tenant, args.archive, args.jobs, args.level, only)
+    else:
+        if not args.archive:
+            raise SystemExit("restore needs --archive")
+        restore(args.conn, args.archive, args.jobs, args.replace, args.target_tenant, args.slug, args.remap, args.disable_triggers, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Chrome trace-event spans for the tools/ scripts.
+
+`--trace out.json` writes a file that loads in chrome://tracing, https://ui.perfetto.dev or speedscope.
+Connections from seed_demo_data.connect get a span per SQL statement; scripts add spans around their
+own steps with `span()` or `@traced()`. `--trace-profile` also dumps cProfile stats next to the trace
+and `--trace-memory` adds a tracemalloc counter track plus the top allocation sites.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import hashlib
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+TRACE = None
+
+
+class Tracer:
+    def __init__(self, path, profile=False, memory=False):
+        self.path = path
+        self.events = []
+        self.statements = {}
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.profiler = None
+        self.memory = memory
+        if profile:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+        if memory:
+            import tracemalloc
+            tracemalloc.start(10)
+        self.name = os.path.basename(sys.argv[0]) or "python"
+        self.events.append({"ph": "M", "name": "process_name", "pid": self.pid, "tid": 0, "args": {"name": self.name}})
+
+    def now_us(self):
+        return (time.perf_counter() - self.origin) * 1e6
+
+    def complete(self, name, cat, start_us, args=None):
+        end = self.now_us()
+        event = {"ph": "X", "name": name, "cat": cat, "ts": round(start_us, 1), "dur": round(end - start_us, 1), "pid": self.pid, "tid": threading.get_ident()}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+        if self.memory:
+            import tracemalloc
+            current, peak = tracemalloc.get_traced_memory()
+            self.events.append({"ph": "C", "name": "python heap (MB)", "ts": round(end, 1), "pid": self.pid, "tid": 0,
+                                "args": {"current": round(current / 1e6, 3), "peak": round(peak / 1e6, 3)}})
+
+    def statement(self, sql):
+        text = " ".join(str(sql).split())
+        digest = hashlib.sha1(text.encode("utf-8", "replace")).hexdigest()[:12]
+        self.statements.setdefault(digest, text[:500])
+        words = text.split()
+        verb = words[0].upper() if words else "SQL"
+        # Name the span after the verb and first relation so the viewer groups like statements
+        table = next((w.split(".")[-1].strip('"(') for prev, w in zip(words, words[1:]) if prev.upper() in ("FROM", "INTO", "UPDATE", "TABLE", "COPY")), "")
+        return f"{verb} {table}".strip(), digest
+
+    def save(self):
+        self.complete(self.name, "command", 0.0, {"argv": sys.argv[1:]})
+        other = {"statements": self.statements}
+        if self.profiler:
+            import pstats
+            self.profiler.disable()
+            self.profiler.dump_stats(self.path + ".prof")
+            stats = pstats.Stats(self.profiler)
+            top = sorted(stats.stats.items(), key=lambda kv: -kv[1][3])[:25]
+            other["profile_top_cumulative"] = [
+                {"function": f"{fn}:{line}({name})", "calls": nc, "tottime_s": round(tt, 4), "cumtime_s": round(ct, 4)}
+                for (fn, line, name), (cc, nc, tt, ct, callers) in top]
+        if self.memory:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            other["memory_top"] = [{"site": str(s.traceback[0]), "kb": round(s.size / 1024, 1), "count": s.count}
+                                   for s in snapshot.statistics("lineno")[:25]]
+            tracemalloc.stop()
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms", "otherData": other}, f)
+        print(f"Trace written: {self.path} ({len(self.events)} events)" + (f", profile: {self.path}.prof" if self.profiler else ""))
+
+
+def start(path, profile=False, memory=False):
+    global TRACE
+    if TRACE is None and path:
+        TRACE = Tracer(path, profile, memory)
+        atexit.register(TRACE.save)
+    return TRACE
+
+
+def add_trace_args(parser):
+    parser.add_argument("--trace", help="Write a Chrome trace (chrome://tracing, Perfetto) of SQL statements and steps to this JSON file")
+    parser.add_argument("--trace-profile", action="store_true", help="With --trace: also record cProfile stats (<trace>.prof)")
+    parser.add_argument("--trace-memory", action="store_true", help="With --trace: also track tracemalloc heap usage")
+
+
+def start_from_args(args):
+    return start(getattr(args, "trace", None), getattr(args, "trace_profile", False), getattr(args, "trace_memory", False))
+
+
+@contextmanager
+def span(name, cat="step", **args):
+    if TRACE is None:
+        yield
+        return
+    started = TRACE.now_us()
+    try:
+        yield
+    finally:
+        TRACE.complete(name, cat, started, args or None)
+
+
+def traced(cat="step"):
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*a, **kw):
+            with span(fn.__name__, cat):
+                return fn(*a, **kw)
+        return wrapper
+    return decorate
+
+
+def wrap_methods(obj, names, cat):
+    """Span every call to the named methods of one object (for third-party clients we don't own)."""
+    if TRACE is None:
+        return obj
+    for name in names:
+        method = getattr(obj, name, None)
+        if method is not None:
+            setattr(obj, name, traced(cat)(method))
+    return obj
+
+
+_CURSOR_CLASSES = {}
+
+
+def tracing_cursor(base):
+    if base not in _CURSOR_CLASSES:
+        class TracingCursor(base):
+            def _run(self, fn, sql, *rest):
+                if TRACE is None:
+                    return fn(sql, *rest)
+                name, digest = TRACE.statement(sql)
+                started = TRACE.now_us()
+                try:
+                    return fn(sql, *rest)
+                finally:
+                    TRACE.complete(name, "sql", started, {"sql_hash": digest, "rows": self.rowcount})
+
+            def execute(self, query, vars=None):
+                return self._run(super().execute, query, vars)
+
+            def executemany(self, query, vars_list):
+                return self._run(super().executemany, query, vars_list)
+
+            def copy_expert(self, sql, file, size=8192):
+                return self._run(super().copy_expert, sql, file, size)
+
+        _CURSOR_CLASSES[base] = TracingCursor
+    return _CURSOR_CLASSES[base]
+
+
+def instrument(conn):
+    """Route a psycopg2 connection's cursors through TracingCursor when tracing is on."""
+    if TRACE is not None and conn is not None:
+        import psycopg2.extensions
+        conn.cursor_factory = tracing_cursor(conn.cursor_factory or psycopg2.extensions.cursor)
+    return conn
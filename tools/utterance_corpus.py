@@ -0,0 +1,449 @@
+import os
+import io
+import re
+import glob
+import json
+import mmap
+import time
+import random
+import sqlite3
+import secrets
+import argparse
+import hashlib
+
+import log_scrub
+from logdump import DEFAULT_ROOT, find_dumps, iter_files, rel
+from seed_demo_data import connect
+from tracing import add_trace_args, span, start_from_args
+
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+# What the API logs per inbound message (WhatsAppService / MessageRoutingService). Console and file
+# providers prefix these differently, so only the message text is matched.
+LOG_MARKERS = (b"Processing message '", b"Adding inbound message to context", b"Intent classification - Intent:", b"Saved intent classification '")
+LOG_INBOUND = re.compile(r"Adding inbound message to context\. ConversationId=(\d+), Body='(.*)'\s*$")
+LOG_PROCESSING = re.compile(r"MessageRoutingService: Processing message '(.*)' for tenant (\d+)\s*$")
+LOG_SAVED = re.compile(r"Saved inbound message (\d+) to database")
+LOG_INTENT = re.compile(r"Intent classification - Intent: (\w+)")
+LOG_INTENT_SAVED = re.compile(r"Saved intent classification '([^']+)' for message (\d+)")
+
+# QA and smoke-test inputs: "Guest: ..." transcript lines in tests/*.txt, ChatbotQA eval cases, and the
+# messageText payloads of the curl scripts labelled by their "TEST n: LATE_CHECKOUT - '...'" banners.
+GUEST_LINE = re.compile(r"^(?:\[xUnit\.net [^\]]*\])?\s*Guest: (.+?)\s*$")
+SCRIPT_TEST = re.compile(r"TEST \d+: ([A-Z][A-Z_ ]+?) - '")
+SCRIPT_MESSAGE = re.compile(r"\"messageText\":\s*\"((?:[^\"\\]|\\.)*)\"")
+
+# Free-text introductions the log rules (JSON fields, template parameters) cannot see
+INTRODUCTION = re.compile(rb"\b(?:[Mm]y name is|[Tt]his is|[Ii]t's|[Ii] am|I'm)\s+(?P<v>[A-Z][a-z'-]+(?: [A-Z][a-z'-]+)?)")
+TOKEN = re.compile(r"\b(?:PHONE|EMAIL|NAME|BEARER|META_TOKEN|JWT|CONN_SECRET|PASSWORD|SAS)_[0-9a-f]{10}\b")
+UNLABELED = "UNLABELED"
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE intents (intent TEXT PRIMARY KEY, utterances INTEGER NOT NULL, weight INTEGER NOT NULL);
+CREATE TABLE utterances (
+    id INTEGER PRIMARY KEY, intent TEXT NOT NULL, text TEXT NOT NULL, weight INTEGER NOT NULL,
+    cum INTEGER NOT NULL, variants INTEGER NOT NULL, labels TEXT NOT NULL, sources TEXT NOT NULL
+);
+CREATE INDEX ix_utterances_intent_cum ON utterances (intent, cum);
+"""
+
+
+class Collected:
+    """Raw utterances: normalized text -> counts per label and source, plus the first spelling seen."""
+
+    def __init__(self):
+        self.items = {}
+
+    def add(self, text, label, source, weight=1):
+        text = " ".join(text.split())
+        if not text:
+            return
+        key = text.lower()
+        item = self.items.setdefault(key, {"text": text, "labels": {}, "sources": {}, "weight": 0})
+        item["weight"] += weight
+        label = (label or UNLABELED).upper()
+        item["labels"][label] = item["labels"].get(label, 0) + weight
+        item["sources"][source] = item["sources"].get(source, 0) + weight
+
+
+def mine_logs(paths, collected):
+    """Inbound messages from API logs, paired with the intent logged after them.
+
+    The Id-based lines (Saved inbound message N / Saved intent classification 'X' for message N) are
+    exact; the plain 'Intent classification' line goes to the latest unlabelled message in the same file."""
+    files = messages = 0
+    for path in iter_files(paths, nested_dumps=False):
+        if log_scrub.is_binary(path) or not os.path.getsize(path):
+            continue
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if not any(mm.find(marker) >= 0 for marker in LOG_MARKERS):
+                continue
+            lines = mm[:].decode("utf-8", "replace").splitlines()
+        files += 1
+        pending, by_id = [], {}
+        for line in lines:
+            m = LOG_INBOUND.search(line) or LOG_PROCESSING.search(line)
+            if m:
+                text = m.group(2) if m.re is LOG_INBOUND else m.group(1)
+                # Both lines are logged for the same message; keep one
+                if not (pending and pending[-1]["text"] == text and pending[-1]["label"] is None):
+                    pending.append({"text": text, "label": None})
+                continue
+            m = LOG_SAVED.search(line)
+            if m and pending:
+                by_id[m.group(1)] = pending[-1]
+                continue
+            m = LOG_INTENT_SAVED.search(line)
+            if m and m.group(2) in by_id:
+                by_id[m.group(2)]["label"] = m.group(1)
+                continue
+            m = LOG_INTENT.search(line)
+            if m:
+                for message in reversed(pending):
+                    if message["label"] is None:
+                        message["label"] = m.group(1)
+                        break
+        for message in pending:
+            collected.add(message["text"], message["label"], "logs")
+        messages += len(pending)
+    return files, messages
+
+
+def mine_db(conn_str, collected, since_days=None):
+    """Inbound text messages and the IntentClassification the API saved with them."""
+    conn = connect(conn_str)
+    rows = 0
+    try:
+        with conn.cursor(name="utterances") as cur:
+            cur.itersize = 20000
+            sql = ('SELECT "Body", "IntentClassification", count(*) FROM public."Messages" '
+                   'WHERE "Direction" = \'Inbound\' AND "MessageType" = \'text\' AND COALESCE("Body", \'\') <> \'\'')
+            params = []
+            if since_days:
+                sql += ' AND "CreatedAt" >= now() - make_interval(days => %s)'
+                params.append(since_days)
+            cur.execute(sql + ' GROUP BY 1, 2', params)
+            for body, intent, count in cur:
+                collected.add(body, intent, "db", count)
+                rows += count
+    finally:
+        conn.close()
+    return rows
+
+
+def mine_tests(root, collected):
+    """QA transcripts, eval cases and smoke-test scripts. Each distinct text counts once: repeated runs
+    of the same suite say nothing about how often guests send it."""
+    found = {}
+    for path in sorted(glob.glob(os.path.join(root, "tests", "*.txt"))):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                m = GUEST_LINE.match(line)
+                if m:
+                    found.setdefault(m.group(1), None)
+    for path in sorted(glob.glob(os.path.join(root, "tests", "**", "*.jsonl"), recursive=True)):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    case = json.loads(line)
+                    if case.get("guest_message"):
+                        found.setdefault(case["guest_message"], None)
+    for path in sorted(glob.glob(os.path.join(root, "*.sh")) + glob.glob(os.path.join(root, "*.ps1"))):
+        label = None
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                m = SCRIPT_TEST.search(line)
+                if m:
+                    label = m.group(1).strip().replace(" ", "_")
+                for m in SCRIPT_MESSAGE.finditer(line):
+                    text = json.loads(f'"{m.group(1)}"')
+                    if found.get(text) is None:
+                        found[text] = label
+    for text, label in found.items():
+        collected.add(text, label, "tests")
+    return len(found)
+
+
+def scrub(text):
+    """log_scrub's rules plus free-text introductions; the same key gives the same pseudonyms as scrubbed dumps."""
+    raw = text.encode("utf-8")
+    out = io.BytesIO()
+    counts, _ = log_scrub.scrub_range(raw, 0, len(raw), out)
+    cleaned = out.getvalue()
+    names = 0
+    for m in reversed(list(INTRODUCTION.finditer(cleaned))):
+        a, b = m.span("v")
+        cleaned = cleaned[:a] + log_scrub.pseudonym("name", cleaned[a:b]) + cleaned[b:]
+        names += 1
+    if names:
+        counts["name"] = counts.get("name", 0) + names
+    return cleaned.decode("utf-8", "replace"), counts
+
+
+def shingle_key(text):
+    """What near-duplicates share: lower case, pseudonyms by type, digits folded (room 12 ~ room 305)."""
+    text = TOKEN.sub(lambda m: m.group(0).rsplit("_", 1)[0], text)
+    text = re.sub(r"\d+", "0", text.lower())
+    return re.sub(r"\W+", " ", text).strip()
+
+
+def shingles(text, k):
+    key = shingle_key(text)
+    grams = {key[i:i + k] for i in range(max(1, len(key) - k + 1))}
+    return np.array([int.from_bytes(hashlib.blake2b(g.encode(), digest_size=4).digest(), "little") for g in grams], dtype=np.uint64)
+
+
+def minhash(texts, perms, k, seed, batch=1 << 20):
+    """(len(texts), perms) uint32 MinHash signatures: (a*x + b) mod p over the shingle hashes, reduced per text."""
+    prime = np.uint64((1 << 61) - 1)
+    rng = np.random.default_rng(seed)
+    # a, b < 2^31 and x < 2^32 keep a*x + b below 2^63: no overflow in uint64
+    a = rng.integers(1, 1 << 31, perms, dtype=np.uint64)
+    b = rng.integers(0, 1 << 31, perms, dtype=np.uint64)
+    sigs = np.empty((len(texts), perms), dtype=np.uint32)
+    grams = [shingles(t, k) for t in texts]
+    start = 0
+    while start < len(texts):
+        end, size = start, 0
+        while end < len(texts) and (end == start or size + len(grams[end]) <= batch):
+            size += len(grams[end])
+            end += 1
+        flat = np.concatenate(grams[start:end])
+        lengths = np.array([len(g) for g in grams[start:end]])
+        hashed = ((flat[:, None] * a[None, :] + b[None, :]) % prime).astype(np.uint32)
+        sigs[start:end] = np.minimum.reduceat(hashed, np.concatenate(([0], np.cumsum(lengths)[:-1])), axis=0)
+        start = end
+    return sigs
+
+
+def near_duplicate_groups(sigs, bands, threshold):
+    """Union-find over LSH band collisions whose estimated Jaccard clears threshold; returns a root per row."""
+    n, perms = sigs.shape
+    rows = perms // bands
+    parent = np.arange(n)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    mix = np.random.default_rng(7).integers(1, 1 << 63, rows, dtype=np.uint64)
+    pairs = 0
+    for band in range(bands):
+        keys = (sigs[:, band * rows:(band + 1) * rows].astype(np.uint64) * mix).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        firsts = np.repeat(order[starts], np.diff(np.r_[starts, n]))
+        same = order != firsts
+        if not same.any():
+            continue
+        a, b = firsts[same], order[same]
+        similar = (sigs[a] == sigs[b]).mean(axis=1) >= threshold
+        for i, j in zip(a[similar], b[similar]):
+            ri, rj = find(i), find(j)
+            if ri != rj:
+                parent[max(ri, rj)] = min(ri, rj)
+                pairs += 1
+    return np.array([find(i) for i in range(n)]), pairs
+
+
+def build_clusters(items, roots):
+    """One corpus row per near-duplicate group: the most frequent spelling, summed weight, majority label."""
+    groups = {}
+    for item, root in zip(items, roots):
+        groups.setdefault(int(root), []).append(item)
+    clusters = []
+    for members in groups.values():
+        members.sort(key=lambda m: (-m["weight"], m["text"]))
+        labels, sources = {}, {}
+        for m in members:
+            for k, v in m["labels"].items():
+                labels[k] = labels.get(k, 0) + v
+            for k, v in m["sources"].items():
+                sources[k] = sources.get(k, 0) + v
+        named = {k: v for k, v in labels.items() if k != UNLABELED}
+        intent = max(sorted(named), key=named.get) if named else UNLABELED
+        clusters.append({"text": members[0]["text"], "intent": intent, "weight": sum(m["weight"] for m in members),
+                         "variants": len(members), "labels": labels, "sources": sources})
+    return clusters
+
+
+def write_corpus(path, clusters, meta):
+    """SQLite, rebuilt whole: utterances ordered by intent with a running weight, so a weighted draw
+    within an intent is one index seek (intent, cum > r)."""
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    db = sqlite3.connect(tmp)
+    db.executescript(SCHEMA)
+    intents = {}
+    rows = []
+    for c in sorted(clusters, key=lambda c: (c["intent"], -c["weight"], c["text"])):
+        total = intents.setdefault(c["intent"], [0, 0])
+        total[0] += 1
+        total[1] += c["weight"]
+        rows.append((c["intent"], c["text"], c["weight"], total[1], c["variants"],
+                     json.dumps(c["labels"], sort_keys=True), json.dumps(c["sources"], sort_keys=True)))
+    db.executemany("INSERT INTO utterances (intent, text, weight, cum, variants, labels, sources) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    db.executemany("INSERT INTO intents VALUES (?, ?, ?)", [(k, v[0], v[1]) for k, v in sorted(intents.items())])
+    db.executemany("INSERT INTO meta VALUES (?, ?)", [(k, json.dumps(v)) for k, v in sorted(meta.items())])
+    db.commit()
+    db.execute("VACUUM")
+    db.close()
+    os.replace(tmp, path)
+    return intents
+
+
+class Corpus:
+    """Read side for samplers: intent weights up front, utterances fetched by weighted index seek."""
+
+    def __init__(self, path):
+        if not os.path.isfile(path):
+            raise SystemExit(f"No corpus at {path}; run: python tools/utterance_corpus.py mine")
+        self.db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        self.intents = {r[0]: r[1] for r in self.db.execute("SELECT intent, weight FROM intents ORDER BY intent")}
+
+    def mix(self, only=None, overrides=None, include_unlabeled=False):
+        weights = {k: v for k, v in self.intents.items() if include_unlabeled or k != UNLABELED}
+        if only:
+            weights = {k: v for k, v in weights.items() if k in only}
+        for k, v in (overrides or {}).items():
+            if k in self.intents:
+                weights[k] = v
+        return {k: v for k, v in weights.items() if v > 0}
+
+    def draw(self, intent, rng):
+        r = rng.randrange(self.intents[intent])
+        return self.db.execute("SELECT text FROM utterances WHERE intent = ? AND cum > ? ORDER BY cum LIMIT 1", (intent, r)).fetchone()[0]
+
+    def phrases(self):
+        """{intent: (texts, cumulative weights)} for callers that keep the whole corpus in memory."""
+        out = {}
+        for intent, text, cum in self.db.execute("SELECT intent, text, cum FROM utterances ORDER BY intent, cum"):
+            texts, cums = out.setdefault(intent, ([], []))
+            texts.append(text)
+            cums.append(cum)
+        return out
+
+    def close(self):
+        self.db.close()
+
+
+def parse_mix(value):
+    out = {}
+    for part in (value or "").split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            out[k.strip().upper()] = float(v)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mine inbound guest utterances into a scrubbed, de-duplicated, intent-labelled corpus for load and QA runs")
+    parser.add_argument("command", choices=["mine", "stats", "sample"])
+    parser.add_argument("paths", nargs="*", help="mine: log files/directories with API output (default: every dump)")
+    parser.add_argument("--root", default=DEFAULT_ROOT)
+    parser.add_argument("--corpus", help="Corpus file (default: <root>/utterance_corpus.sqlite)")
+    parser.add_argument("--conn", default=os.environ.get("STAYBOT_CONN"), help="mine: also read inbound Messages (or set STAYBOT_CONN)")
+    parser.add_argument("--since-days", type=int, help="mine: only Messages from the last N days")
+    parser.add_argument("--no-tests", action="store_true", help="mine: leave out tests/ transcripts and the test scripts")
+    parser.add_argument("--key", default=os.environ.get("STAYBOT_SCRUB_KEY"), help="mine: HMAC key for pseudonyms, as for log_scrub (or set STAYBOT_SCRUB_KEY)")
+    parser.add_argument("--perms", type=int, default=64, help="mine: MinHash permutations")
+    parser.add_argument("--bands", type=int, default=16, help="mine: LSH bands (perms must divide evenly)")
+    parser.add_argument("--shingle", type=int, default=4, help="mine: character shingle length")
+    parser.add_argument("--threshold", type=float, default=0.7, help="mine: estimated Jaccard at which two utterances are one")
+    parser.add_argument("--n", type=int, default=20, help="sample: utterances to draw")
+    parser.add_argument("--intents", help="sample: comma-separated subset of intents")
+    parser.add_argument("--mix", help="sample: override intent weights, e.g. DINING=5,MAINTENANCE=1")
+    parser.add_argument("--include-unlabeled", action="store_true", help="sample: also draw utterances without an intent")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="sample: JSON lines {intent, messageText}")
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    root = os.path.abspath(args.root)
+    path = os.path.abspath(args.corpus or os.path.join(root, "utterance_corpus.sqlite"))
+
+    if args.command == "mine":
+        if np is None:
+            raise SystemExit("numpy not installed. Run: python -m pip install --user numpy")
+        if args.perms % args.bands:
+            raise SystemExit("--perms must be a multiple of --bands")
+        log_scrub.init_worker(args.key.encode() if args.key else secrets.token_bytes(32))
+        if not args.key:
+            print("No --key/STAYBOT_SCRUB_KEY: using a random key, so pseudonyms will differ from other runs")
+        started = time.perf_counter()
+        raw = Collected()
+        with span("logs", "mine"):
+            files, logged = mine_logs([os.path.abspath(p) for p in args.paths] or find_dumps(root), raw)
+        print(f"logs:  {logged} inbound message(s) in {files} file(s)")
+        if args.conn:
+            with span("db", "mine"):
+                print(f"db:    {mine_db(args.conn, raw, args.since_days)} inbound message(s)")
+        if not args.no_tests:
+            with span("tests", "mine"):
+                print(f"tests: {mine_tests(root, raw)} distinct utterance(s)")
+        if not raw.items:
+            raise SystemExit("No guest utterances found")
+
+        with span("scrub", "mine"):
+            scrubbed, replaced = Collected(), {}
+            for item in raw.items.values():
+                text, counts = scrub(item["text"])
+                for kind, n in counts.items():
+                    replaced[kind] = replaced.get(kind, 0) + n
+                for label, n in item["labels"].items():
+                    scrubbed.add(text, label, "_", n)
+                entry = scrubbed.items[" ".join(text.split()).lower()]
+                entry["sources"].pop("_")
+                for source, n in item["sources"].items():
+                    entry["sources"][source] = entry["sources"].get(source, 0) + n
+        items = list(scrubbed.items.values())
+        with span("minhash", "mine"):
+            sigs = minhash([i["text"] for i in items], args.perms, args.shingle, args.seed)
+            roots, merges = near_duplicate_groups(sigs, args.bands, args.threshold)
+        clusters = build_clusters(items, roots)
+        meta = {"built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "perms": args.perms, "bands": args.bands,
+                "shingle": args.shingle, "threshold": args.threshold, "raw": len(raw.items), "scrubbed": len(items),
+                "replaced": replaced, "key_id": hashlib.sha256(log_scrub.KEY).hexdigest()[:8] if args.key else None}
+        intents = write_corpus(path, clusters, meta)
+        print(f"\n{len(raw.items)} distinct raw -> {len(items)} after scrubbing -> {len(clusters)} after near-duplicate merge "
+              f"({merges} merges); replaced {replaced or 'nothing'}")
+        print(f"{'intent':<28} {'utterances':>10} {'weight':>8}")
+        for intent, (n, w) in sorted(intents.items(), key=lambda kv: -kv[1][1]):
+            print(f"{intent:<28} {n:>10} {w:>8}")
+        print(f"Wrote {rel(path, root)} ({os.path.getsize(path) / 1024:.0f} KB) in {time.perf_counter() - started:.2f}s")
+        return
+
+    corpus = Corpus(path)
+    try:
+        if args.command == "stats":
+            meta = {k: json.loads(v) for k, v in corpus.db.execute("SELECT key, value FROM meta")}
+            print(json.dumps(meta, indent=2, sort_keys=True))
+            print(f"\n{'intent':<28} {'utterances':>10} {'weight':>8}  top utterance")
+            for intent, n, w in corpus.db.execute("SELECT intent, utterances, weight FROM intents ORDER BY weight DESC"):
+                top = corpus.db.execute("SELECT text FROM utterances WHERE intent = ? ORDER BY weight DESC LIMIT 1", (intent,)).fetchone()[0]
+                print(f"{intent:<28} {n:>10} {w:>8}  {top[:60]}")
+            return
+        only = {i.strip().upper() for i in args.intents.split(",")} if args.intents else None
+        weights = corpus.mix(only, parse_mix(args.mix), args.include_unlabeled)
+        if not weights:
+            raise SystemExit("No intents left to sample")
+        rng = random.Random(args.seed)
+        names = list(weights)
+        for intent in rng.choices(names, [weights[n] for n in names], k=args.n):
+            text = corpus.draw(intent, rng)
+            print(json.dumps({"intent": intent, "messageText": text}, ensure_ascii=False) if args.json else f"{intent}\t{text}")
+    finally:
+        corpus.close()
+
+
+if __name__ == "__main__":
+    main()
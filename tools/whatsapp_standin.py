@@ -0,0 +1,242 @@
+import os
+import time
+import json
+import uuid
+import random
+import asyncio
+import argparse
+
+from tracing import add_trace_args, start_from_args
+
+try:
+    from aiohttp import web
+except Exception:
+    web = None
+
+# Body parameter counts for the templates the test_all_templates*.sh / test_riboville_*.sh
+# scripts send; every one of them also carries a single url button (base64 portal param).
+KNOWN_TEMPLATES = {
+    "pre_arrival_welcome_v03": 4,
+    "pre_arrival_welcome_v04": 4,
+    "checkin_day_ready_v01": 4,
+    "checkin_day_ready_v04": 4,
+    "welcome_settled_v05": 1,
+    "mid_stay_checkup_v04": 3,
+    "pre_checkout_reminder_v03": 4,
+    "post_stay_survey_v03": 3,
+}
+
+
+def graph_error(status, code, message, details=None):
+    body = {
+        "error": {
+            "message": f"(#{code}) {message}",
+            "type": "OAuthException",
+            "code": code,
+            "error_data": {"messaging_product": "whatsapp", "details": details or message},
+            "fbtrace_id": uuid.uuid4().hex[:24],
+        }
+    }
+    return status, body
+
+
+def validate_message(payload, templates=None, strict_templates=True):
+    """Return None if payload is a valid Cloud API send, else a (status, error body) pair."""
+    templates = KNOWN_TEMPLATES if templates is None else templates
+    if not isinstance(payload, dict):
+        return graph_error(400, 100, "Invalid parameter", "Request body must be a JSON object")
+    if payload.get("messaging_product") != "whatsapp":
+        return graph_error(400, 100, "Invalid parameter", "messaging_product must be 'whatsapp'")
+    to = str(payload.get("to") or "").lstrip("+")
+    if not to.isdigit() or not 8 <= len(to) <= 15:
+        return graph_error(400, 131009, "Parameter value is not valid", f"'to' is not a valid phone number: {payload.get('to')!r}")
+    kind = payload.get("type", "text")
+    if kind == "text":
+        if not isinstance(payload.get("text"), dict) or not payload["text"].get("body"):
+            return graph_error(400, 131008, "Required parameter is missing", "text.body is required")
+        return None
+    if kind != "template":
+        return None if isinstance(payload.get(kind), dict) else graph_error(400, 131008, "Required parameter is missing", f"{kind} object is required")
+
+    tpl = payload.get("template")
+    if not isinstance(tpl, dict) or not tpl.get("name"):
+        return graph_error(400, 131008, "Required parameter is missing", "template.name is required")
+    if not isinstance(tpl.get("language"), dict) or not tpl["language"].get("code"):
+        return graph_error(400, 131008, "Required parameter is missing", "template.language.code is required")
+    name = tpl["name"]
+    if strict_templates and name not in templates:
+        return graph_error(404, 132001, "Template name does not exist in the translation", f"template name ({name}) does not exist in {tpl['language']['code']}")
+
+    body_params = 0
+    for comp in tpl.get("components") or []:
+        ctype = comp.get("type") if isinstance(comp, dict) else None
+        if ctype not in ("header", "body", "button"):
+            return graph_error(400, 131009, "Parameter value is not valid", f"Unknown component type {ctype!r}")
+        params = comp.get("parameters") or []
+        for p in params:
+            if not isinstance(p, dict) or p.get("type") not in ("text", "payload", "currency", "date_time", "image", "document", "video"):
+                return graph_error(400, 131009, "Parameter value is not valid", f"Invalid {ctype} parameter {p!r}")
+            if p["type"] == "text" and not str(p.get("text") or "").strip():
+                return graph_error(400, 131008, "Required parameter is missing", f"Empty text parameter in {ctype} component")
+        if ctype == "body":
+            body_params += len(params)
+        elif ctype == "button":
+            if comp.get("sub_type") not in ("url", "quick_reply", "copy_code"):
+                return graph_error(400, 131009, "Parameter value is not valid", f"Invalid button sub_type {comp.get('sub_type')!r}")
+            if not str(comp.get("index", "")).isdigit():
+                return graph_error(400, 131009, "Parameter value is not valid", "Button index must be a digit string")
+    expected = templates.get(name)
+    if expected is not None and body_params != expected:
+        return graph_error(400, 132000, "Number of parameters does not match the expected number of params",
+                           f"body: number of localizable_params ({body_params}) does not match the expected number of params ({expected})")
+    return None
+
+
+class StandIn:
+    """State and fault injection for one stand-in instance."""
+
+    def __init__(self, mps=80.0, pair_interval=0.0, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0,
+                 strict_templates=True, max_records=100000, record_path=None, seed=None):
+        self.mps = mps
+        self.pair_interval = pair_interval
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.strict_templates = strict_templates
+        self.max_records = max_records
+        self.record_file = open(record_path, "a", encoding="utf-8") if record_path else None
+        self.rng = random.Random(seed)
+        self.buckets = {}     # phone_id -> (tokens, last refill)
+        self.last_to = {}     # (phone_id, to) -> last accepted send
+        self.accepted = []
+        self.counts = {}
+        self.started = time.monotonic()
+
+    def count(self, key):
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    def take_token(self, phone_id, now):
+        # Per phone-number-id token bucket sized to one second of throughput, like Cloud API's mps cap
+        if not self.mps:
+            return True
+        tokens, last = self.buckets.get(phone_id, (self.mps, now))
+        tokens = min(self.mps, tokens + (now - last) * self.mps)
+        if tokens < 1:
+            self.buckets[phone_id] = (tokens, now)
+            return False
+        self.buckets[phone_id] = (tokens - 1, now)
+        return True
+
+    async def handle_send(self, request):
+        phone_id = request.match_info["phone_id"]
+        if self.latency_ms or self.jitter_ms:
+            await asyncio.sleep(max(0.0, self.latency_ms + self.rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000.0)
+        if not request.headers.get("Authorization", "").startswith("Bearer "):
+            return self.reply("auth", *graph_error(401, 190, "Invalid OAuth access token", "Missing Bearer token"))
+        try:
+            payload = await request.json()
+        except (ValueError, UnicodeDecodeError):
+            return self.reply("invalid", *graph_error(400, 100, "Invalid parameter", "Body is not valid JSON"))
+        error = validate_message(payload, strict_templates=self.strict_templates)
+        if error:
+            return self.reply("invalid", *error)
+
+        now = time.monotonic()
+        to = str(payload["to"]).lstrip("+")
+        # Pair limit first: a send it rejects never reaches the throughput bucket, so it must not spend a token
+        if self.pair_interval and now - self.last_to.get((phone_id, to), -1e9) < self.pair_interval:
+            return self.reply("pair_limited", *graph_error(429, 131056, "(Business Account, Consumer Account) pair rate limit hit",
+                                                           "Message failed to send because there were too many messages sent from this phone number to the same phone number in a short period of time"))
+        if not self.take_token(phone_id, now):
+            return self.reply("throttled", *graph_error(429, 130429, "Rate limit hit", "Cloud API message throughput has been reached"))
+        if self.error_rate and self.rng.random() < self.error_rate:
+            return self.reply("error", *graph_error(500, 131000, "Something went wrong", "Injected failure"))
+
+        self.last_to[(phone_id, to)] = now
+        wamid = "wamid." + uuid.uuid4().hex
+        record = {
+            "id": wamid, "phone_id": phone_id, "to": to, "type": payload.get("type", "text"),
+            "template": (payload.get("template") or {}).get("name"), "received_at": time.time(), "payload": payload,
+        }
+        if len(self.accepted) < self.max_records:
+            self.accepted.append(record)
+        if self.record_file:
+            self.record_file.write(json.dumps(record) + "\n")
+        self.count("accepted:" + (record["template"] or record["type"]))
+        return web.json_response({
+            "messaging_product": "whatsapp",
+            "contacts": [{"input": payload["to"], "wa_id": to}],
+            "messages": [{"id": wamid, "message_status": "accepted"}],
+        })
+
+    def reply(self, outcome, status, body):
+        self.count(outcome)
+        return web.json_response(body, status=status)
+
+    async def handle_messages(self, request):
+        since = int(request.query.get("since", 0))
+        template = request.query.get("template")
+        rows = [r for r in self.accepted[since:] if not template or r["template"] == template]
+        return web.json_response({"total": len(self.accepted), "messages": rows})
+
+    async def handle_stats(self, request):
+        elapsed = time.monotonic() - self.started
+        accepted = sum(v for k, v in self.counts.items() if k.startswith("accepted:"))
+        return web.json_response({"elapsed_s": elapsed, "accepted": accepted, "accepted_per_s": accepted / elapsed if elapsed else 0.0, "counts": self.counts})
+
+    async def handle_reset(self, request):
+        self.accepted.clear()
+        self.counts.clear()
+        self.buckets.clear()
+        self.last_to.clear()
+        self.started = time.monotonic()
+        return web.json_response({"reset": True})
+
+
+def make_app(standin):
+    app = web.Application(client_max_size=1024 * 1024)
+    app.router.add_post("/{version:v\\d+\\.\\d+}/{phone_id}/messages", standin.handle_send)
+    app.router.add_post("/{phone_id}/messages", standin.handle_send)
+    app.router.add_get("/_standin/messages", standin.handle_messages)
+    app.router.add_get("/_standin/stats", standin.handle_stats)
+    app.router.add_delete("/_standin/messages", standin.handle_reset)
+
+    async def close_record(app):
+        if standin.record_file:
+            standin.record_file.close()
+
+    app.on_cleanup.append(close_record)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the WhatsApp Cloud API /{phone_id}/messages endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("WA_STANDIN_PORT", "8089")))
+    parser.add_argument("--mps", type=float, default=80.0, help="Messages/sec per phone number id before HTTP 429 / 130429 (0 = unlimited)")
+    parser.add_argument("--pair-interval", type=float, default=0.0, help="Min seconds between sends to the same recipient before HTTP 429 / 131056")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Added latency per request")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on the added latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of valid sends answered with HTTP 500 / 131000")
+    parser.add_argument("--allow-unknown-templates", action="store_true", help="Accept template names outside KNOWN_TEMPLATES")
+    parser.add_argument("--max-records", type=int, default=100000, help="Accepted messages kept in memory for /_standin/messages")
+    parser.add_argument("--record", help="Also append every accepted message to this JSONL file")
+    parser.add_argument("--seed", type=int, default=None)
+    add_trace_args(parser)
+    args = parser.parse_args()
+    start_from_args(args)
+
+    if not web:
+        raise SystemExit("aiohttp not installed. Run: python -m pip install --user aiohttp")
+
+    standin = StandIn(
+        mps=args.mps, pair_interval=args.pair_interval, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, strict_templates=not args.allow_unknown_templates,
+        max_records=args.max_records, record_path=args.record, seed=args.seed,
+    )
+    print(f"WhatsApp Cloud API stand-in on http://{args.host}:{args.port}/v22.0/<phone_id>/messages (mps={args.mps}, pair_interval={args.pair_interval}s)")
+    web.run_app(make_app(standin), host=args.host, port=args.port, print=None)
+
+
+if __name__ == "__main__":
+    main()